@@ -9,19 +9,18 @@ import plotly.express as px
 import plotly.graph_objects as go
 import srsly
 import streamlit as st
-from attrs import asdict
-from attrs.filters import exclude
-from icecream import ic
 
 # sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from src.data_extraction import (
     Asset,
-    compute_perf,
     date_to_str,
     get_current_asset_data,
+    load_details,
+    perf_matrix,
 )
 from src.portfolio import Portfolio
+from src.refresher import QuoteRefresher
 
 # page config
 st.set_page_config(
@@ -41,8 +40,30 @@ ptf_name = st.text_input(
     key="ptf_name",
 )
 
-# Load it
-portfolio = Portfolio(ptf_name)
+# Load it once, it is then updated in place when operations are added or removed
+if (
+    st.session_state.get("portfolio") is None
+    or st.session_state["portfolio"].name != ptf_name
+):
+    st.session_state["portfolio"] = Portfolio(ptf_name)
+portfolio = st.session_state["portfolio"]
+
+
+@st.cache_resource
+def quote_refresher() -> QuoteRefresher:
+    """Refresher of the quotes of all the portfolios in the background,
+    one by server process, shared by the sessions"""
+    refresher = QuoteRefresher()
+    refresher.start()
+    return refresher
+
+
+# The assets of the displayed portfolio are refreshed more often
+refresher = quote_refresher()
+refresher.add({isin: asset.url for isin, asset in portfolio.dict_of_assets.items()})
+refresher.mark_hot(portfolio.dict_of_assets)
+# Quotes refreshed in the background since the previous rerun
+portfolio.refresh_quotes()
 st.session_state["name_isin"] = {
     (a.name, a.isin) for a in portfolio.dict_of_assets.values()
 }
@@ -95,7 +116,7 @@ with st.form("sidebar"):
             st.write(f"Asset: {asset}")
             asset_obj = Asset.from_boursorama(get_current_asset_data(asset))
             st.header(f"Name: {asset_obj.name}")
-            asset_as_dict = asdict(asset_obj, filter=exclude("_quotations"))
+            asset_as_dict = asset_obj.to_dict(details=True)
             asset_as_dict["tradeDate"] = date_to_str(asset_as_dict["tradeDate"])
             if len(asset_as_dict["lastDividende"]) > 0:
                 asset_as_dict["lastDividende"]["date"] = date_to_str(
@@ -123,22 +144,20 @@ with st.form("sidebar"):
             with historic_chart:
                 # plot historical chart
                 st.subheader(f"Historical prices {asset_as_dict['currency']}")
-                perf_dict = pd.DataFrame(
-                    [
-                        {
-                            key: compute_perf(asset_obj.quotations[key])
-                            for key in asset_obj.quotations
-                        }
-                    ]
-                ).T
+                perf_dict = perf_matrix([asset_obj]).T
                 perf_dict.columns = ["Performance"]
-                st.dataframe(perf_dict)
+                st.dataframe(
+                    perf_dict,
+                    column_config={
+                        "Performance": st.column_config.NumberColumn(format="%.2f%%")
+                    },
+                )
                 st.write(
                     "You can view the chart in full screen and zoom in the period by selecting the wanted period."
                 )
                 st.plotly_chart(
                     plot_historical_chart(
-                        asset_obj.quotations["inception"],
+                        asset_obj.quotations.daily("inception"),
                         asset_as_dict["name"],
                         asset_as_dict["isin"],
                     )
@@ -156,10 +175,7 @@ with details_col:
         # Update jsonl
         srsly.write_jsonl(
             portfolio.jsonl_ptf_path,
-            [
-                asdict(a, filter=exclude("_quotations"))
-                for a in portfolio.dict_of_assets.values()
-            ],
+            [a.to_dict() for a in portfolio.dict_of_assets.values()],
         )
 
     with st.expander("Followed assets"):
@@ -168,7 +184,7 @@ with details_col:
             [
                 {
                     k: v
-                    for k, v in asdict(a).items()
+                    for k, v in a.to_dict().items()
                     if k
                     not in [
                         "tradeDate",
@@ -206,11 +222,13 @@ with details_col:
                 srsly.write_jsonl(
                     portfolio.jsonl_ptf_path,
                     [
-                        asdict(portfolio.dict_of_assets[a])
+                        portfolio.dict_of_assets[a].to_dict()
                         for a in portfolio.dict_of_assets
                         if a in set(chain.from_iterable(keep_isin))
                     ],
                 )
+                # Reload the followed assets
+                st.session_state["portfolio"] = None
                 st.rerun()
 
     # If there are some operations, display summary and stats about the portfolio
@@ -220,7 +238,14 @@ with details_col:
         st.dataframe(
             portfolio.assets_summary.round(2),
             hide_index=True,
-            column_config={"operations": None},
+            column_config={
+                "operations": None,
+                **{
+                    column: st.column_config.NumberColumn(format="%.2f%%")
+                    for column in portfolio.assets_summary.columns
+                    if column.startswith("Perf ")
+                },
+            },
         )
 
         # Portfolio summary
@@ -243,6 +268,12 @@ with details_col:
             "liquidités": "cash",
             "autres": "other",
         }
+        # The details are lazy: read one by one by total_assets_comp, each missing
+        # composition would be requested in turn. They are requested concurrently.
+        load_details(
+            [portfolio.dict_of_assets[isin] for isin in portfolio.assets_summary["isin"]],
+            portfolio.max_workers,
+        )
         total_assets_comp = [
             {
                 "name": asset_types.get(d["name"].lower(), d["name"]),
@@ -281,7 +312,9 @@ with operations_col:
     st.dataframe(portfolio.operations_df, hide_index=True)
 
     # Operation tabs
-    add_row, del_row = st.tabs(["Add operation", "Remove operation"])
+    add_row, del_row, import_rows = st.tabs(
+        ["Add operation", "Remove operation", "Import operations"]
+    )
     # Add operation
     with add_row:
         with st.empty().container():
@@ -363,31 +396,21 @@ with operations_col:
             if all([operation_on_asset is not None, operation_type is not None]):
                 st.session_state["invalid_operation"] = 0
 
-            # Append operation to csv
+            # Add the operation to the store
             if st.button(
                 "Add operation", disabled=st.session_state.get("invalid_operation", 1)
             ):
-                portfolio.operations_df.loc[len(portfolio.operations_df.operation)] = {
-                    "name": operation_on_asset[0],
-                    "isin": operation_on_asset[1],
-                    "date": operation_date.isoformat(),
-                    "operation": operation_type,
-                    "quantity": argB,
-                    "value": argA,
-                    "fees": taxes_fees,
-                }
-                portfolio.operations_df.to_csv(
-                    portfolio.csv_ptf_path,
-                    index=False,
-                    columns=[
-                        col
-                        for col in portfolio.operations_df.columns
-                        if not col.startswith("id")
-                    ],
+                portfolio.add_operation(
+                    {
+                        "name": operation_on_asset[0],
+                        "isin": operation_on_asset[1],
+                        "date": operation_date.isoformat(),
+                        "operation": operation_type,
+                        "quantity": argB,
+                        "value": argA,
+                        "fees": taxes_fees,
+                    }
                 )
-                # elif operation_type in ['Dividend', 'Split']:
-
-                # duckdb.sql(f'COPY operations TO {csv_ptf_path}')
                 st.rerun()
 
     # Delete row
@@ -397,7 +420,7 @@ with operations_col:
                 row_number = st.number_input(
                     "Row number",
                     min_value=1,
-                    max_value=len(portfolio.operations_df.operation),
+                    max_value=int(portfolio.operations_df["id"].max()),
                     placeholder="Row number to remove",
                 )
             except Exception as e:
@@ -407,25 +430,33 @@ with operations_col:
             delete_row = st.form_submit_button("Delete row")
             if delete_row:
                 # Keep all the operations except the n_th
-                duckdb.sql(
-                    f"""
-                 WITH row_nb_table AS (
-                 select row_number() over(order by date, isin, name) as id,
-                 * from '{portfolio.csv_ptf_path}'
-                 ORDER BY  date, name, isin DESC
-                 )
-                 Select
-                 rnt.name,
-                 rnt.isin,
-                 rnt.date,
-                 rnt.operation,
-                 rnt.quantity,
-                 rnt.value
-                 rnt.fees
-                 from row_nb_table rnt
-                 Left JOIN '{portfolio.csv_ptf_path}'
-                 using (isin, date, operation, quantity,value,fees)
-                 where rnt.id != {row_number}
-                 """
-                ).write_csv(portfolio.csv_ptf_path)
+                portfolio.remove_operation(row_number)
                 st.rerun()
+
+    # Import the operations of a broker export
+    with import_rows:
+        with st.form("import_operations"):
+            export_file = st.file_uploader(
+                "Broker export (csv or parquet)", type=["csv", "parquet"]
+            )
+            date_format = st.text_input(
+                "Date format",
+                value="%d/%m/%Y",
+                help='strptime format of the dates, e.g. "%d/%m/%Y" or "%Y-%m-%d"',
+            )
+            if st.form_submit_button("Import operations") and export_file is not None:
+                try:
+                    report = portfolio.import_operations(
+                        export_file, date_format=date_format
+                    )
+                    st.write(
+                        f"{report.imported} operations imported, {report.skipped} "
+                        f"already imported, {report.rejected} rejected "
+                        f"in {report.seconds:.1f}s"
+                    )
+                    if report.rejected:
+                        st.write(report.reasons)
+                        st.dataframe(report.rejected_rows)
+                except (ValueError, ImportError) as e:
+                    print(e)
+                    st.write(str(e))
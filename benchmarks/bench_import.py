@@ -0,0 +1,97 @@
+"""Import of a large broker export in the operations store: a csv export with
+French headers, decimal commas and day-first dates, and the same export in
+parquet, both read in chunks.
+Run from the project root: python benchmarks/bench_import.py --operations 100000"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from src.operations_import import import_operations
+from src.operations_store import OperationsStore
+from synthetic import synthetic_assets, synthetic_operations
+
+FRENCH_COLUMNS = {
+    "date": "Date",
+    "name": "Libellé",
+    "isin": "Code ISIN",
+    "operation": "Sens",
+    "quantity": "Quantité",
+    "value": "Cours",
+    "fees": "Frais",
+}
+FRENCH_OPERATIONS = {
+    "Buy": "Achat",
+    "Sell": "Vente",
+    "Dividend": "Dividende",
+    "Split": "Division",
+}
+
+
+def broker_export(n_isins: int, n_operations: int) -> "pd.DataFrame":
+    operations = synthetic_operations(synthetic_assets(n_isins), n_operations)
+    operations["isin"] = "FR" + operations["isin"].str[2:]
+    operations["date"] = operations["date"].str[8:10] + "/" + operations[
+        "date"
+    ].str[5:7] + "/" + operations["date"].str[0:4]
+    operations["operation"] = operations["operation"].map(FRENCH_OPERATIONS)
+    return operations.drop(columns="id").rename(columns=FRENCH_COLUMNS)
+
+
+def run(path: str, store_path: str, chunksize: int, traced: bool):
+    """Report of an import in a new store and its peak of traced memory (MiB).
+    The memory is traced in a separate run: tracing slows the import down."""
+    store = OperationsStore(store_path)
+    if traced:
+        tracemalloc.start()
+    report = import_operations(path, store, date_format="%d/%m/%Y", chunksize=chunksize)
+    peak = tracemalloc.get_traced_memory()[1] / 2**20 if traced else None
+    tracemalloc.stop()
+    return report, peak
+
+
+def read_by_isin(store_path: str, reads: int) -> float:
+    """Seconds to read the operations of an isin, reads isins in turn.
+    The store has no isin index (see OperationsStore)."""
+    store = OperationsStore(store_path)
+    isins = store.read()["isin"].unique()
+    start = time.perf_counter()
+    for i in range(reads):
+        store.read(isin=isins[i % len(isins)])
+    return (time.perf_counter() - start) / reads
+
+
+def bench(name: str, path: str, directory: str, chunksize: int, reads: int):
+    store_path = os.path.join(directory, f"{name}.duckdb")
+    report, _ = run(path, store_path, chunksize, False)
+    _, peak = run(path, os.path.join(directory, f"{name}_traced.duckdb"), chunksize, True)
+    print(
+        f"{name:<10} {report.imported:>8} imported {report.rejected:>6} rejected "
+        f"{report.seconds:>8.2f}s {report.rows / report.seconds:>10.0f} rows/s "
+        f"{peak:>8.1f} MiB peak "
+        f"{1000 * read_by_isin(store_path, reads):>8.1f} ms by isin"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--operations", type=int, default=100_000)
+    parser.add_argument("--isins", type=int, default=200)
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    parser.add_argument("--reads", type=int, default=50, help="reads by isin")
+    args = parser.parse_args()
+
+    export = broker_export(args.isins, args.operations)
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "export.csv")
+        export.to_csv(csv_path, sep=";", decimal=",", index=False)
+        parquet_path = os.path.join(directory, "export.parquet")
+        export.to_parquet(parquet_path, row_group_size=args.chunksize)
+        size = os.path.getsize(csv_path) / 2**20
+        print(f"{args.operations} operations, csv of {size:.1f} MiB")
+        del export
+        bench("csv", csv_path, directory, args.chunksize, args.reads)
+        bench("parquet", parquet_path, directory, args.chunksize, args.reads)
@@ -0,0 +1,61 @@
+"""Memory of the quote history of many assets: the former dataframes of every
+calendar day (date objects), one copy by period, against the Quotations arrays
+(int32 days of the trading days, float64 closes).
+Run from the project root: python benchmarks/bench_memory.py --assets 1000 --years 20"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from src.data_extraction import Quotations, quotations_by_period
+from src.periods import period_bounds, period_names
+from synthetic import synthetic_quotes
+
+
+def period_dataframes(quotes: pd.DataFrame) -> dict:
+    """Quotes of every calendar day, dated with date objects, like the former
+    get_historical_data, copied in one dataframe by period"""
+    dates = pd.date_range(quotes["date"].min(), date.today(), freq="D")
+    df = pd.DataFrame({"date": dates.date}).merge(
+        quotes.assign(date=pd.to_datetime(quotes["date"]).dt.date),
+        how="left",
+        on="date",
+    )
+    df = df.ffill()
+    dataframes = {}
+    for period in period_names():
+        start, end = period_bounds(period)
+        mask = (df["date"] >= (start or date.min)) & (df["date"] <= (end or date.max))
+        dataframes[period] = df.loc[mask, ["date", "c"]]
+    return dataframes
+
+
+def measure(name: str, build, all_quotes: list):
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = [build(quotes) for quotes in all_quotes]
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+    print(f"{name:<30} {size:>10.1f} MiB {elapsed:>8.2f}s")
+    return kept
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--assets", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    all_quotes = [synthetic_quotes(rng, args.years) for _ in range(args.assets)]
+    print(f"{args.assets} assets, {args.years} years of trading days")
+    measure("period dataframes (former)", period_dataframes, all_quotes)
+    quotations = measure("Quotations", quotations_by_period, all_quotes)
+    assert all(isinstance(q, Quotations) for q in quotations)
@@ -0,0 +1,58 @@
+"""Many portfolios holding mostly the same assets: assets and quotations loaded
+once for all the portfolios, and summaries computed in one process or in a pool
+of processes.
+Run from the project root: python benchmarks/bench_multi_portfolio.py --portfolios 24"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from src.multi_portfolio import MultiPortfolio
+from synthetic import synthetic_assets, synthetic_operations
+
+
+def bench(name: str, assets: dict, operations: dict, processes: int):
+    multi = MultiPortfolio(
+        dict_of_assets=assets, operations=operations, processes=processes
+    )
+    start = time.perf_counter()
+    # Discard the printed IRR errors
+    with contextlib.redirect_stdout(io.StringIO()):
+        multi.portfolio_summaries
+        multi.consolidated
+    elapsed = time.perf_counter() - start
+    print(f"{name:<25} {elapsed:>8.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--portfolios", type=int, default=24)
+    parser.add_argument("--universe", type=int, default=100, help="isins in total")
+    parser.add_argument("--isins", type=int, default=40, help="isins by portfolio")
+    parser.add_argument("--operations", type=int, default=4000)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    universe = synthetic_assets(args.universe, args.years)
+    isins = list(universe)
+    operations = {}
+    for i in range(args.portfolios):
+        held = rng.choice(isins, args.isins, replace=False)
+        operations[f"ptf{i}"] = synthetic_operations(
+            {isin: universe[isin] for isin in held}, args.operations, seed=i
+        )
+    loads = sum(ops["isin"].nunique() for ops in operations.values())
+    shared = len(set().union(*(set(ops["isin"]) for ops in operations.values())))
+    print(
+        f"{args.portfolios} portfolios: {loads} asset loads one portfolio at a time, "
+        f"{shared} shared"
+    )
+    bench("one process", universe, operations, 1)
+    bench(f"{args.processes} processes", universe, operations, args.processes)
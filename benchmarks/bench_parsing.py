@@ -0,0 +1,84 @@
+"""Parse throughput of the asset pages recorded from boursorama, by parser backend,
+compared to the former parsing of the whole page by BeautifulSoup.
+Run from the project root: python benchmarks/bench_parsing.py
+The recorded test pages are small, --padding adds unrelated markup (KiB) to each
+page to get the size of the real pages (about 300 KiB)."""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import srsly
+from bs4 import BeautifulSoup
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from src.http_client import FIXTURES_DIR
+from src.page_parser import BACKENDS, parse_asset_page, parse_last_dividend
+
+FILLER = '<div class="c-block"><p class="c-text">Lorem ipsum dolor sit amet</p></div>\n'
+
+
+def asset_pages(fixtures_dir: str, padding: int) -> list:
+    """(html, url) of the recorded pages with an asset faceplate"""
+    pages = []
+    for path in sorted(Path(fixtures_dir).glob("*.json")):
+        fixture = srsly.read_json(path)
+        content = fixture.get("content", "")
+        if fixture["status_code"] != 200 or "data-faceplate-symbol" not in content:
+            continue
+        filler = FILLER * (padding * 1024 // len(FILLER))
+        pages.append(
+            (content.replace("<main", filler + "<main", 1), fixture["final_url"])
+        )
+    return pages
+
+
+def bench(name: str, func, pages: list, repeat: int):
+    size = sum(len(html.encode("utf-8")) for html, _ in pages) * repeat / 2**20
+    start = time.perf_counter()
+    # Discard the printed parsing errors (e.g. a dividend without date)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            for html, url in pages:
+                func(html, url)
+    elapsed = time.perf_counter() - start
+    calls = repeat * len(pages)
+    print(
+        f"{name:<25} {calls:>6} pages {elapsed:>8.3f}s "
+        f"{1000 * elapsed / calls:>8.2f} ms/page {calls / elapsed:>8.1f} pages/s "
+        f"{size / elapsed:>8.1f} MiB/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument(
+        "--fixtures", default=FIXTURES_DIR, help="recorded responses directory"
+    )
+    parser.add_argument("--padding", type=int, default=0, help="KiB added to each page")
+    args = parser.parse_args()
+
+    pages = asset_pages(args.fixtures, args.padding)
+    print(f"{len(pages)} pages of {args.padding} KiB padding")
+    # Parse only, without the lookups of the former parser
+    bench(
+        "whole page (former)",
+        lambda html, url: BeautifulSoup(json.dumps(html), "lxml"),
+        pages,
+        args.repeat,
+    )
+    for backend in BACKENDS:
+        bench(
+            f"targeted {backend}",
+            lambda html, url: (
+                parse_asset_page(html, url, backend),
+                parse_last_dividend(html, backend),
+            ),
+            pages,
+            args.repeat,
+        )
@@ -0,0 +1,105 @@
+"""Wall time and peak memory of the Portfolio analytics on synthetic portfolios.
+Run from the project root: python benchmarks/bench_portfolio.py --sizes 10:1000 100:10000
+Up to a million operations: python benchmarks/bench_portfolio.py --sizes 1000:1000000"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from src.portfolio import Portfolio
+from synthetic import synthetic_assets, synthetic_operations
+
+# (number of isins, number of operations)
+DEFAULT_SIZES = ["10:1000", "100:10000", "1000:100000"]
+
+
+def measure(stage: str, func) -> dict:
+    """Run func, return its wall time (s), its peak traced memory (MiB)
+    and the number of lines it printed (e.g. IRR errors)"""
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        func()
+    elapsed = time.perf_counter() - start
+    peak = (
+        (tracemalloc.get_traced_memory()[1] - start_memory) / 2**20
+        if tracemalloc.is_tracing()
+        else float("nan")
+    )
+    return {
+        "stage": stage,
+        "wall time (s)": elapsed,
+        "peak memory (MiB)": peak,
+        "printed lines": len(output.getvalue().splitlines()),
+    }
+
+
+def bench_portfolio(n_isins: int, n_operations: int, years: int) -> list:
+    assets = synthetic_assets(n_isins, years)
+    operations_df = synthetic_operations(assets, n_operations)
+    portfolio = Portfolio(
+        f"synthetic_{n_isins}_{n_operations}",
+        dict_of_assets=assets,
+        operations_df=operations_df,
+    )
+    stages = [
+        ("assets_summary", lambda: portfolio.assets_summary),
+        ("valuation", lambda: portfolio.valuation),
+        ("nav", lambda: portfolio.nav),
+        ("asset_values", lambda: portfolio.asset_values),
+        ("portfolio_summary", lambda: portfolio.portfolio_summary),
+        (
+            "get_cashflow_df",
+            lambda: portfolio.get_cashflow_df(
+                pd.concat(portfolio.assets_summary["operations"].tolist()),
+                portfolio.asset_values,
+                "inception",
+            ),
+        ),
+    ]
+    results = []
+    for stage, func in stages:
+        result = measure(stage, func)
+        result.update({"isins": n_isins, "operations": n_operations})
+        results.append(result)
+        print(
+            f"{n_isins:>6} isins {n_operations:>8} operations  {stage:<18}"
+            f"{result['wall time (s)']:>10.3f}s {result['peak memory (MiB)']:>10.1f} MiB"
+            f"{result['printed lines']:>8} printed lines",
+            flush=True,
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="isins:operations pairs, default: %(default)s",
+    )
+    parser.add_argument("--years", type=int, default=5, help="years of quotes")
+    parser.add_argument(
+        "--no-memory", action="store_true", help="do not trace memory (faster)"
+    )
+    parser.add_argument("--output", help="csv file to save the results")
+    args = parser.parse_args()
+
+    if not args.no_memory:
+        tracemalloc.start()
+    results = []
+    for size in args.sizes:
+        n_isins, n_operations = map(int, size.split(":"))
+        results.extend(bench_portfolio(n_isins, n_operations, args.years))
+    if args.output:
+        pd.DataFrame(results).to_csv(args.output, index=False)
@@ -0,0 +1,49 @@
+"""Scraping throughput on the recorded boursorama responses, without network.
+Run from the project root: python benchmarks/bench_scraping.py"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from src.data_extraction import get_current_asset_data, get_historical_data
+from src.http_client import client
+from src.quote_store import QuoteStore
+
+QUERIES = ["air liquide", "AI", "FR0000120073", "CW8", "LU1681043599", "FR0010177378"]
+SYMBOLS = ["1rPAI", "1rTCW8", "MP-184677"]
+
+
+def bench(name: str, func, args: list, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for arg in args:
+            func(arg)
+    elapsed = time.perf_counter() - start
+    calls = repeat * len(args)
+    print(
+        f"{name:<25} {calls:>6} calls {elapsed:>8.3f}s "
+        f"{1000 * elapsed / calls:>8.2f} ms/call {calls / elapsed:>8.1f} calls/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--fixtures", default=None, help="recorded responses directory")
+    args = parser.parse_args()
+
+    client.set_mode("replay", args.fixtures)
+    # Bypass the AssetCache (get_current_asset_data.__wrapped__) to measure the
+    # scraping itself
+    bench("get_current_asset_data", get_current_asset_data.__wrapped__, QUERIES, args.repeat)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # A new store for each call: every call downloads and stores the history
+        def cold_historical_data(symbol: str):
+            store = QuoteStore(os.path.join(tmp_dir, f"{time.perf_counter_ns()}.duckdb"))
+            get_historical_data(symbol, store)
+
+        bench("get_historical_data cold", cold_historical_data, SYMBOLS, args.repeat)
+        store = QuoteStore(os.path.join(tmp_dir, "warm.duckdb"))
+        bench("get_historical_data warm", lambda s: get_historical_data(s, store), SYMBOLS, args.repeat)
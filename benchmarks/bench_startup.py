@@ -0,0 +1,81 @@
+"""Cold start of a short-lived process: import time of the modules and time to
+the first portfolio summary, each measured in a fresh python process.
+Run from the project root: python benchmarks/bench_startup.py --repeat 5"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MODULES = ["src.data_extraction", "src.portfolio", "src.multi_portfolio", "src.report"]
+# Libraries which should be imported by their first use only
+HEAVY = ["streamlit", "requests", "bs4", "lxml", "srsly", "icecream", "plotly"]
+
+IMPORT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "loaded": [m for m in {heavy} if m in sys.modules],
+}}))
+"""
+
+# The synthetic assets stand for the assets of the metadata cache and the quote
+# store, their generation is not timed
+FIRST_SUMMARY = """
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+from src.portfolio import Portfolio
+imported = time.perf_counter() - start
+sys.path.append("benchmarks")
+from synthetic import synthetic_assets, synthetic_operations
+assets = synthetic_assets({isins}, {years})
+operations = synthetic_operations(assets, {operations})
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    portfolio = Portfolio("bench", dict_of_assets=assets, operations_df=operations)
+    portfolio.assets_summary
+    portfolio.portfolio_summary
+print(json.dumps({{"seconds": imported + time.perf_counter() - start}}))
+"""
+
+
+def run(code: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median_seconds(code: str, repeat: int) -> tuple[float, dict]:
+    results = [run(code) for _ in range(repeat)]
+    return statistics.median(r["seconds"] for r in results), results[-1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--isins", type=int, default=20)
+    parser.add_argument("--operations", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'import':<35} {'median':>8}  heavy libraries loaded")
+    for module in MODULES:
+        seconds, result = median_seconds(
+            IMPORT.format(module=module, heavy=HEAVY), args.repeat
+        )
+        print(f"{module:<35} {seconds:>7.2f}s  {', '.join(result['loaded']) or '-'}")
+    seconds, _ = median_seconds(
+        FIRST_SUMMARY.format(
+            isins=args.isins, years=args.years, operations=args.operations
+        ),
+        args.repeat,
+    )
+    print(
+        f"{f'first summary ({args.isins} isins, {args.operations} ops)':<35} "
+        f"{seconds:>7.2f}s"
+    )
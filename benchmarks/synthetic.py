@@ -0,0 +1,108 @@
+"""Synthetic assets, quotes and operation ledgers to benchmark the Portfolio class"""
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from src.data_extraction import DATE_FORMAT, Asset, quotations_by_period
+
+OPERATIONS = np.array(["Buy", "Sell", "Dividend", "Split"])
+# Probabilities of Buy, Sell, Dividend, Split
+OPERATION_WEIGHTS = [0.6, 0.2, 0.19, 0.01]
+SPLIT_RATIOS = np.array([2.0, 3.0, 1.1, 0.5])
+
+
+def synthetic_quotes(rng: np.random.Generator, years: int) -> pd.DataFrame:
+    """Daily close prices (c) of a random walk, one row per weekday
+    until today, like the trading days of get_historical_data"""
+    today = date.today()
+    dates = pd.date_range(today - timedelta(days=365 * years), today, freq="B")
+    closes = rng.uniform(10, 500) * np.exp(
+        np.cumsum(rng.normal(0.0002, 0.01, len(dates)))
+    )
+    return pd.DataFrame({"date": dates.date, "c": closes.round(4)})
+
+
+def synthetic_assets(n_isins: int, years: int = 5, seed: int = 0) -> dict:
+    """Dict of n_isins Asset objects, with their quotations already loaded"""
+    rng = np.random.default_rng(seed)
+    assets = {}
+    for i in range(n_isins):
+        isin = f"XS{i:010d}"
+        quotes = synthetic_quotes(rng, years)
+        assets[isin] = Asset(
+            "trackers" if i % 2 else "stock",
+            isin,
+            f"SYN{i}",
+            "EUR",
+            f"Synthetic asset {i}",
+            quotes["c"].iloc[-1],
+            "+0.00%",
+            date.today(),
+            f"https://www.boursorama.com/cours/SYN{i}/",
+            None,
+            None,
+            [{"name": "stock", "value": 100}],
+            {},
+            quotations_by_period(quotes),
+        )
+    return assets
+
+
+def synthetic_operations(
+    assets: dict, n_operations: int, seed: int = 0
+) -> pd.DataFrame:
+    """Ledger of n_operations Buy, Sell, Dividend and Split operations
+    on the assets, formatted like Portfolio.load_operations"""
+    rng = np.random.default_rng(seed)
+    isins = np.array(list(assets))
+    op_isins = isins[rng.integers(0, len(isins), n_operations)]
+    # First operation of each asset is a buy
+    op_isins[: len(isins)] = isins[: min(len(isins), n_operations)]
+    operations = rng.choice(OPERATIONS, n_operations, p=OPERATION_WEIGHTS)
+    operations[: len(isins)] = "Buy"
+
+    quantities = np.where(
+        operations == "Buy",
+        rng.integers(10, 100, n_operations),
+        rng.integers(1, 10, n_operations),
+    ).astype(float)
+    values = np.empty(n_operations)
+    dates = np.empty(n_operations, dtype="datetime64[D]")
+    for isin in isins:
+        mask = op_isins == isin
+        quotes = assets[isin].quotations["inception"]
+        # The first buy happens in the first year of quotes
+        positions = rng.integers(0, len(quotes), mask.sum())
+        positions[0] = rng.integers(0, min(365, len(quotes)))
+        positions.sort()
+        dates[mask] = quotes["date"].to_numpy()[positions]
+        # Trades are not done at the close price
+        values[mask] = quotes["c"].to_numpy()[positions] * rng.uniform(
+            0.98, 1.02, mask.sum()
+        )
+    is_dividend = operations == "Dividend"
+    values[is_dividend] *= rng.uniform(0.01, 0.03, is_dividend.sum())
+    is_split = operations == "Split"
+    values[is_split] = rng.choice(SPLIT_RATIOS, is_split.sum())
+    quantities[is_dividend | is_split] = np.nan
+
+    operations_df = pd.DataFrame(
+        {
+            "name": [assets[isin].name for isin in op_isins],
+            "isin": op_isins,
+            "date": pd.to_datetime(dates).strftime(DATE_FORMAT),
+            "operation": operations,
+            "quantity": quantities,
+            "value": values.round(2),
+            "fees": np.where(np.isin(operations, ["Buy", "Sell"]), 1.0, 0.0),
+        }
+    )
+    operations_df = operations_df.sort_values(
+        ["date", "isin", "name"], kind="stable", ignore_index=True
+    )
+    operations_df.insert(0, "id", np.arange(1, n_operations + 1))
+    return operations_df
@@ -0,0 +1,213 @@
+import functools
+import re
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from threading import Event, Lock
+from typing import Callable
+
+from attrs import define, field
+
+ISIN = re.compile(r"[A-Z]{2}[A-Z0-9]{9}[0-9]")
+
+
+@define
+class MemoryCache:
+    """Results kept in memory by this process, returned as copies like
+    st.cache_data. The arguments must be hashable."""
+
+    _results: dict = field(factory=dict, init=False)
+    _lock: Lock = field(factory=Lock, init=False)
+
+    def wrap(self, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+            with self._lock:
+                if key in self._results:
+                    return deepcopy(self._results[key])
+            result = func(*args, **kwargs)
+            with self._lock:
+                self._results[key] = result
+            return deepcopy(result)
+
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+def canonical_query(query: str) -> str:
+    """Key of an asset query: an ISIN in upper case, an url without its trailing
+    slash, a name or a symbol in lower case with single spaces"""
+    query = query.strip()
+    if query.startswith("https://"):
+        return query.rstrip("/")
+    query = " ".join(query.replace("%20", " ").split())
+    if ISIN.fullmatch(query.upper()):
+        return query.upper()
+    return query.lower()
+
+
+def lookup_arguments(args: tuple, kwargs: dict) -> tuple:
+    """Key of the arguments of a lookup other than its query, () without any"""
+    return (args, tuple(sorted(kwargs.items()))) if args or kwargs else ()
+
+
+@define
+class AssetCache:
+    """Results of the asset lookups (get_current_asset_data) shared by the
+    threads and sessions of this process, by canonical ISIN.
+    The queries ("MC", "mc", "lvmh", the ISIN or the url of an asset) are aliases of
+    the ISIN of their result, so an asset is scraped once whatever its query.
+    At most max_entries assets are kept, the least recently used are evicted,
+    and an asset is scraped again after ttl seconds.
+    Concurrent lookups of a same query wait for the first one.
+    The other arguments of a lookup (e.g. its parser) are part of its keys."""
+
+    max_entries: int = 1024
+    ttl: float = 900
+    # Aliases kept by asset on average
+    aliases_by_entry: int = 4
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    evictions: int = field(default=0, init=False)
+    # (isin, arguments) -> (data, time it was stored), the most recently used last
+    _entries: OrderedDict = field(factory=OrderedDict, init=False)
+    # (canonical query, arguments) -> isin, the most recently used last
+    _aliases: OrderedDict = field(factory=OrderedDict, init=False)
+    # (canonical query, arguments) -> Event set when its lookup is done
+    _pending: dict = field(factory=dict, init=False)
+    _lock: Lock = field(factory=Lock, init=False)
+
+    def _get(self, key: tuple, now: float):
+        """Cached data of a (canonical query, arguments) key, None if unknown or
+        expired"""
+        query, arguments = key
+        isin = query if ISIN.fullmatch(query) else self._aliases.get(key)
+        if isin is None or (isin, arguments) not in self._entries:
+            return None
+        data, stored = self._entries[isin, arguments]
+        if now - stored > self.ttl:
+            del self._entries[isin, arguments]
+            return None
+        self._entries.move_to_end((isin, arguments))
+        if key in self._aliases:
+            self._aliases.move_to_end(key)
+        return data
+
+    def get(self, query: str, now: float = None, arguments: tuple = ()):
+        """Copy of the cached data of an asset query, None if it is not cached.
+        arguments: the other arguments of the lookup, see lookup_arguments"""
+        now = time.time() if now is None else now
+        with self._lock:
+            data = self._get((canonical_query(query), arguments), now)
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return deepcopy(data)
+
+    def put(self, query: str, data: dict, now: float = None, arguments: tuple = ()):
+        """Cache the data of an asset, found with query and arguments"""
+        now = time.time() if now is None else now
+        isin = canonical_query(data["isin"])
+        with self._lock:
+            self._entries[isin, arguments] = (data, now)
+            self._entries.move_to_end((isin, arguments))
+            for alias in {query, data.get("url") or query}:
+                key = canonical_query(alias)
+                if key != isin:
+                    self._aliases[key, arguments] = isin
+                    self._aliases.move_to_end((key, arguments))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            while len(self._aliases) > self.max_entries * self.aliases_by_entry:
+                self._aliases.popitem(last=False)
+
+    def wrap(self, func: Callable) -> Callable:
+        """Cache a lookup function whose first argument is an asset query"""
+
+        @functools.wraps(func)
+        def wrapper(query: str, *args, **kwargs):
+            arguments = lookup_arguments(args, kwargs)
+            key = (canonical_query(query), arguments)
+            while True:
+                with self._lock:
+                    data = self._get(key, time.time())
+                    if data is not None:
+                        self.hits += 1
+                        return deepcopy(data)
+                    pending = self._pending.get(key)
+                    if pending is None:
+                        self.misses += 1
+                        self._pending[key] = Event()
+                        break
+                # Cached by the pending lookup, unless it failed
+                pending.wait()
+            try:
+                data = func(query, *args, **kwargs)
+                self.put(query, data, arguments=arguments)
+            finally:
+                with self._lock:
+                    self._pending.pop(key).set()
+            return deepcopy(data)
+
+        return wrapper
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "aliases": len(self._aliases),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+
+
+@define
+class NoCache:
+    def wrap(self, func: Callable) -> Callable:
+        return func
+
+    def clear(self):
+        pass
+
+
+_backend = AssetCache()
+# Functions wrapped by the current backend
+_wrapped: dict = {}
+
+
+def get_cache_backend():
+    return _backend
+
+
+def set_cache_backend(backend):
+    """Cache of the cached functions: AssetCache (default), MemoryCache or NoCache,
+    or any object with wrap(func) and clear() methods"""
+    global _backend
+    _backend = backend
+    _wrapped.clear()
+
+
+def cached(func: Callable) -> Callable:
+    """Cache the results of a function with the current cache backend,
+    chosen when the function is called (see set_cache_backend)"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if func not in _wrapped:
+            _wrapped[func] = _backend.wrap(func)
+        return _wrapped[func](*args, **kwargs)
+
+    return wrapper
@@ -1,38 +1,26 @@
-import json
-import re
-from datetime import date, datetime, timedelta
-from itertools import chain
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from datetime import date, datetime
 from typing import Iterable
 
-import duckdb
+import numpy as np
 import pandas as pd
-import requests
-import streamlit as st
-from attrs import define, field
-from bs4 import BeautifulSoup
-from bs4.element import Tag
+from attrs import define, field, fields
+from src.cache import AssetCache, cached, get_cache_backend
+from src.metadata_cache import MetadataCache
+from src.page_parser import (
+    DEFAULT_BACKEND,
+    parse_asset_page,
+    parse_composition,
+    parse_last_dividend,
+)
+from src.periods import period_bounds, period_names
+from src.quote_store import QuoteStore, default_quote_store
 
 DATE_FORMAT = "%Y-%m-%d"
-TODAY = date.today()
-map_period_to_filter = {
-    "inception": "",
-    f"{TODAY.year-1}": f"where date >='{TODAY.year-1}-01-01' and date <'{TODAY.year}-01-01'",
-    "ytd": f"where date >='{TODAY.year}-01-01' and date <'{TODAY.year+1}-01-01'",
-    "1week": f"""WHERE date >= '{str(TODAY-timedelta(weeks=1))}'
-    AND date <= '{str(TODAY)}' """,
-    "1month": f"""WHERE date >= '{str(TODAY-timedelta(30))}'
-    AND date <= '{str(TODAY)}' """,
-    "3months": f"""WHERE date >= '{str(TODAY-timedelta(91))}'
-    AND date <= '{str(TODAY)}' """,
-    "6months": f"""WHERE date >= '{str(TODAY-timedelta(184))}'
-    AND date <= '{str(TODAY)}' """,
-    "1year": f"""WHERE date >= '{str(date(year=TODAY.year-1,month=TODAY.month, day=TODAY.day))}'
-    AND date <= '{str(TODAY)}' """,
-    "3years": f"""WHERE date >= '{str(date(year=TODAY.year-3,month=TODAY.month, day=TODAY.day))}'
-    AND date <= '{str(TODAY)}' """,
-    "5years": f"""WHERE date >= '{str(date(year=TODAY.year-5,month=TODAY.month, day=TODAY.day))}'
-    AND date <= '{str(TODAY)}' """,
-}
+EPOCH = date(1970, 1, 1)
 
 
 def date_to_str(date: datetime) -> str:
@@ -62,20 +50,100 @@ def replace_stringify_date_objects_iterable(iterable: Iterable) -> Iterable:
 
 
 def compute_perf(df: pd.DataFrame):
-    """Compute the performance of an asset given a dataframe"""
-    min_value = duckdb.sql(
-        """
-    SELECT date, c from df
-    where date = (select min(date) from df )
-     """
-    ).fetchall()[0]
-    max_value = duckdb.sql(
-        """
-    SELECT date, c from df
-    where date = (select max(date) from df)
-     """
-    ).fetchall()[0]
-    return f"{100*((max_value[1]/min_value[1])-1):.2f}%"
+    """Compute the performance of an asset given a dataframe.
+    See perf_matrix to compute the performances of several assets and periods."""
+    dates = df["date"].to_numpy()
+    closes = df["c"].to_numpy()
+    return f"{100*((closes[dates.argmax()]/closes[dates.argmin()])-1):.2f}%"
+
+
+def day_numbers(dates: np.ndarray) -> np.ndarray:
+    """Number of days since 1970-01-01 of datetime64 dates"""
+    return dates.astype("datetime64[D]").astype(np.int64)
+
+
+def day_dates(days: np.ndarray) -> np.ndarray:
+    """datetime64 dates of day numbers"""
+    return days.astype("datetime64[D]").astype("datetime64[us]")
+
+
+def _readonly_days(days: np.ndarray) -> np.ndarray:
+    """Contiguous read-only int32 day numbers, from day numbers or datetime64 dates"""
+    days = np.asarray(days)
+    if np.issubdtype(days.dtype, np.datetime64):
+        days = day_numbers(days)
+    days = np.array(days, dtype=np.int32, order="C")
+    days.flags.writeable = False
+    return days
+
+
+def _readonly_closes(closes: np.ndarray) -> np.ndarray:
+    closes = np.array(closes, dtype=np.float64, order="C")
+    closes.flags.writeable = False
+    return closes
+
+
+@define
+class Quotations(Mapping):
+    """Close prices of an asset on its trading days, sorted by day.
+    days are int32 day numbers (days since 1970-01-01) and closes float64,
+    both in contiguous read-only arrays (copies of the given arrays).
+    The quotations of a period are found by binary search and returned as a
+    dataframe (date, c) whose closes view the array, without copy.
+    See daily for the quotations of every calendar day."""
+
+    days: np.ndarray = field(converter=_readonly_days)
+    closes: np.ndarray = field(converter=_readonly_closes)
+
+    @property
+    def dates(self) -> np.ndarray:
+        return day_dates(self.days)
+
+    def slice(self, period: str) -> slice:
+        """Positions of the quotations of a period, computed at call time"""
+        start, end = period_bounds(period)
+        return slice(
+            (
+                np.searchsorted(self.days, (start - EPOCH).days, side="left")
+                if start
+                else None
+            ),
+            (
+                np.searchsorted(self.days, (end - EPOCH).days, side="right")
+                if end
+                else None
+            ),
+        )
+
+    def daily(self, period: str = "inception") -> pd.DataFrame:
+        """Quotations (date, c) of every calendar day of a period until today,
+        a day without quotation takes the close of the previous quotation.
+        For the charts and the joins on days, built on demand."""
+        start, end = period_bounds(period)
+        today = (date.today() - EPOCH).days
+        first = int(self.days[0]) if len(self.days) else today + 1
+        if start:
+            first = max(first, (start - EPOCH).days)
+        last = min(today, (end - EPOCH).days) if end else today
+        days = np.arange(first, last + 1, dtype=np.int32)
+        previous = np.searchsorted(self.days, days, side="right") - 1
+        return pd.DataFrame({"date": day_dates(days), "c": self.closes[previous]})
+
+    def __getitem__(self, period: str) -> pd.DataFrame:
+        period_slice = self.slice(period)
+        return pd.DataFrame(
+            {
+                "date": day_dates(self.days[period_slice]),
+                "c": self.closes[period_slice],
+            },
+            copy=False,
+        )
+
+    def __iter__(self):
+        return iter(period_names())
+
+    def __len__(self):
+        return len(period_names())
 
 
 @define
@@ -93,7 +161,9 @@ class Asset:
     - url (str): the url used to scrap the asset
     - referenceIndex (str): the index of reference of the asset
     - morningstarCategory (str): the morningstar category associated to the asset
-    - lastDividende (dict): a dict containing the date and the value of the last dividende
+    - assetsComposition (list): the composition of the asset, loaded when read
+    - lastDividende (dict): a dict containing the date and the value of the last
+    dividende, loaded when read
     - quotations: the historical quotations of the asset
     """
     asset: str
@@ -107,10 +177,15 @@ class Asset:
     url: str
     referenceIndex: str
     morningstarCategory: str
-    assetsComposition: dict
+    # None until loaded
+    _assetsComposition: list = None
     # sectors: list
-    lastDividende: dict = field(repr=replace_stringify_date_objects_iterable)
-    _quotations: list = None
+    _lastDividende: dict = field(
+        default=None, repr=replace_stringify_date_objects_iterable
+    )
+    _quotations: Quotations = None
+    # Cache of the loaded composition and last dividend
+    _metadata_cache: MetadataCache = field(default=None, repr=False)
 
     def __hash__(self):
         return hash(self.isin)
@@ -135,232 +210,253 @@ class Asset:
             data["url"],
             data["referenceIndex"],
             data["morningstarCategory"],
-            data["assetsComposition"],
+            assetsComposition=data.get("assetsComposition"),
             # data['sectors'],
-            data["lastDividende"],
+            lastDividende=data.get("lastDividende"),
         )
 
+    def to_dict(self, details: bool = False) -> dict:
+        """Data of the asset, like get_current_asset_data.
+        With details, the composition and the last dividend are loaded if needed,
+        otherwise they are None until loaded."""
+        data = {
+            a.name.lstrip("_"): deepcopy(getattr(self, a.name))
+            for a in fields(Asset)
+            if a.name not in ["_quotations", "_metadata_cache"]
+        }
+        if details:
+            data["assetsComposition"] = deepcopy(self.assetsComposition)
+            data["lastDividende"] = deepcopy(self.lastDividende)
+        return data
+
+    def load_details(self):
+        details = get_asset_details(self.url, self.asset)
+        self._assetsComposition = details["assetsComposition"]
+        self._lastDividende = details["lastDividende"]
+        if self._metadata_cache is not None:
+            self._metadata_cache.put(self.isin, details)
+
     @property
-    def quotations(self, filter=map_period_to_filter):
+    def assetsComposition(self) -> list:
+        if self._assetsComposition is None:
+            self.load_details()
+        return self._assetsComposition
+
+    @property
+    def lastDividende(self) -> dict:
+        if self._lastDividende is None:
+            self.load_details()
+        return self._lastDividende
+
+    @property
+    def quotations(self):
         """Return quotations"""
         if self._quotations is None:
-            historical_data_df = get_historical_data(self.symbol)
-            # close prices : c
-            # Create dataframes for each period and store them in a dict
-            self._quotations = {
-                period: duckdb.sql(
-                    f"""
-                select CAST(date AS DATE) date, c
-                from historical_data_df
-                {map_period_to_filter.get(period, '')}
-                ORDER BY date"""
-                ).df()
-                for period in map_period_to_filter
-            }
-
+            self._quotations = quotations_by_period(get_historical_data(self.symbol))
         return self._quotations
 
 
-def unicode_escape(s: str) -> str:
-    """Remove unicode sequences from a string s"""
-    return s.encode("utf8").decode("unicode_escape")
+def quotations_by_period(historical_data_df: pd.DataFrame) -> Quotations:
+    """Store the days and the close prices (c) of the historical data,
+    to get the quotations of each period.
+    The days are the day numbers (d) if given, else the days of the dates."""
+    if "d" in historical_data_df:
+        historical_data_df = historical_data_df.sort_values("d")
+        days = historical_data_df["d"].to_numpy()
+    else:
+        historical_data_df = historical_data_df.sort_values("date")
+        days = pd.to_datetime(historical_data_df["date"]).to_numpy()
+    return Quotations(days, historical_data_df["c"].to_numpy())
 
 
-def extract_chart_data(soup: BeautifulSoup, id_: str) -> dict:
-    """Extract amChartData key from source code"""
-    try:
-        # Find the id in source code
-        portfolio = soup.find_all("div", id=id_)
-        # Extract the tags, remove NavigableString objects
-        tags = list(
-            chain.from_iterable(
-                unicode_escape(x.get_text()).strip().split("\n")
-                for x in portfolio[0].parent.contents
-                if isinstance(x, Tag)
-            )
+def perf_matrix(
+    assets: Iterable[Asset], periods: list = None, formatted: bool = False
+) -> pd.DataFrame:
+    """Performance (%) of each asset (rows, indexed by isin) over each period (columns,
+    period_names() by default), between the closes at the start (or the first
+    quotation) and at the end of the period, like compute_perf on Quotations.daily.
+    All the quotations are searched at once: they are concatenated and sorted by
+    (asset, day) keys. NaN when an asset has no quotation in a period.
+    formatted: return strings like compute_perf, e.g. "12.34%"."""
+    assets = list(assets)
+    periods = period_names() if periods is None else list(periods)
+    quotations = [asset.quotations for asset in assets]
+    lengths = np.array([len(q.days) for q in quotations], dtype=np.int64)
+    perf = np.full((len(assets), len(periods)), np.nan)
+    if lengths.sum() > 0:
+        # key = asset index * stride + shifted day number, sorted by construction
+        stride, shift = 2**32, 2**31
+        keys = np.repeat(np.arange(len(assets)) * stride, lengths) + shift
+        keys += np.concatenate([q.days for q in quotations])
+        closes = np.concatenate([q.closes for q in quotations])
+        bounds = [period_bounds(period) for period in periods]
+        start_days = np.array(
+            [(start - EPOCH).days + shift if start else 0 for start, _ in bounds]
         )
-        am_chart_data = [tag for tag in tags if '"amChartData"' in tag].pop()
-        # Extract content
-        return json.loads(
-            "{" + re.search(r'"amChartData":\[\{"name":.+\]\}', am_chart_data).group()
-        )["amChartData"]
-    except IndexError as e:
-        print(e)
-        return None
+        end_days = np.array(
+            [(end - EPOCH).days + shift if end else stride - 1 for _, end in bounds]
+        )
+        asset_keys = (np.arange(len(assets)) * stride)[:, None]
+        asset_starts = np.r_[0, np.cumsum(lengths)[:-1]][:, None]
+        # Last quotations on or before the start and the end of the periods
+        first = np.searchsorted(keys, asset_keys + start_days, side="right") - 1
+        first = np.maximum(first, asset_starts)
+        last = np.searchsorted(keys, asset_keys + end_days, side="right") - 1
+        found = (last >= first) & (lengths[:, None] > 0)
+        perf[found] = 100 * (closes[last[found]] / closes[first[found]] - 1)
+    perf_df = pd.DataFrame(perf, index=[asset.isin for asset in assets], columns=periods)
+    if formatted:
+        return perf_df.map(lambda x: f"{x:.2f}%")
+    return perf_df
 
 
-@st.cache_data
-def get_current_asset_data(asset: str) -> dict:
+@cached
+def get_current_asset_data(asset: str, parser: str = DEFAULT_BACKEND) -> dict:
     """From an ISIN or a asset name, returns a dictionary containing:
     - its symbol on boursorama.com
     - the latest price of the eassety
     - its daily variation
     - its financial exchange place code
     - its trade Date
-    - store the url in a new key"""
+    - store the url in a new key
+    Only the faceplate, info lists and dividend blocks of the pages are parsed,
+    with the parser backend (see src.page_parser.BACKENDS)."""
+    # requests is imported by the first scrape only
+    from src import http_client
+
     if asset.startswith("https://"):
-        r = requests.get(asset)
+        r = http_client.get(asset)
     else:
         asset = asset.replace(" ", "%20")
-        r = requests.get(f"https://www.boursorama.com/recherche/{asset}/")
-    url_split = r.url.split("/")
-    soup = BeautifulSoup(json.dumps(r.content.decode("utf-8")), "lxml").body
-    data = {}
+        r = http_client.get(f"https://www.boursorama.com/recherche/{asset}/")
     try:
-        symbol = url_split[-2]
-        relevant_tag = next(
-            iter(soup.select(f'div[data-faceplate-symbol*="{symbol}"]'))
-        )
-        name = (
-            relevant_tag.select('a[title*="Cours"]')[0]
-            .get_text()
-            .replace("\\n", "")
-            .strip()
-        )
-        # Remove irrelevent starting characters, and complete the string if data-ist-init is a class
-        data = (
-            json.loads(relevant_tag["data-ist-init"].replace('\\"', "") + '"}')
-            if relevant_tag.has_attr("data-ist-init")
-            else {}
-        )
-        if len(data) == 0:
-            date_ = relevant_tag.find_all("div", class_='\\"c-faceplate__real-time\\"')[
-                0
-            ]
-            data["symbol"] = symbol
-
-            data["tradeDate"] = datetime.strptime(
-                re.search(r"[0-3][0-9]/[01][0-9]/[0-9]{4}", date_.get_text()).group(),
-                "%d/%m/%Y",
-            )
-        else:
-
-            data["tradeDate"] = datetime.strptime(data["tradeDate"], "%Y-%m-%d")
-        data["variation"] = relevant_tag.select("span[c-instrument--variation]")[
-            0
-        ].get_text()
-        data["latest"] = (
-            relevant_tag.select("span[c-instrument--last]")[0]
-            .get_text()
-            .replace(" ", "")
-        )
-        data["isin"] = (
-            relevant_tag.find_all("h2", class_='\\"c-faceplate__isin\\"')[0]
-            .get_text()
-            .split(" ")[0]
-        )
-
-        data["asset"] = (
-            url_split[url_split.index("cours") - 1] if "bourse" in r.url else "stock"
-        )
-        data["name"] = unicode_escape(name)
-        data["url"] = r.url
-        data["currency"] = (
-            relevant_tag.find_all("span", class_='\\"c-faceplate__price-currency\\"')
-            .pop()
-            .get_text()
-            .strip()
-        )
-        map_attributes = {
-            "indice de référence": "referenceIndex",
-            "catégorie morningstar": "morningstarCategory",
-            "amChartData": "AssetsComposition",
-        }
-        # Init entries with null values
-        for v in map_attributes.values():
-            data[v] = None
-        if "bourse" in r.url:
-            additional_info = soup.find_all("p", class_='\\"c-list-info__heading')
-            for i in additional_info:
-                attr = map_attributes.get(
-                    unicode_escape(i.get_text()).strip().lower(),
-                    unicode_escape(i.get_text()).strip(),
-                )
-                for v in i.next_siblings:
-                    v = unicode_escape(v.get_text()).strip()
-                    if "?" in v or len(v) < 1:
-                        continue
-                    elif data.get(attr, None) is None:
-                        data[attr] = v
-                    elif isinstance(data[attr], str):
-                        data[attr] = [data[attr]] + [v]
-                    else:
-                        data[attr].append(v)
-
-        # Composition
-        url_split.insert(-2, "composition")
-        composition_request = requests.get("/".join(url_split))
-        if composition_request.status_code == 200:
-            soup = BeautifulSoup(
-                json.dumps(composition_request.content.decode("utf-8")), "lxml"
-            ).body
-            data["assetsComposition"] = extract_chart_data(soup, '\\"portfolio\\"')
-            # data['sectors'] = extract_chart_data(soup,'\\"sector\\"' )
-        else:
-            data["assetsComposition"] = [{"name": data["asset"], "value": 100}]
-            # data['sectors'] = [{'name': unicode_escape([link for link in soup.select('a[c-list-info__value]')][0].get_text()),
-            #                  'value':100}]
-        last_dividende = soup.find_all("p", string=re.compile("dernier dividende"))
-        data["lastDividende"] = {}
-        if len(last_dividende) > 1:
-            amount = False
-            for p_tag in last_dividende:
-                for sibling in p_tag.next_siblings:
-                    if isinstance(sibling, Tag) and sibling.name == "p":
-                        if sibling.attrs["class"] in [
-                            ['\\"c-list-info__value'],
-                            '\\"c-list-info__value',
-                        ]:
-                            if not amount:
-                                data["lastDividende"]["amount"] = unicode_escape(
-                                    sibling.get_text()
-                                ).strip()
-                                amount = True
-                                continue
-                            try:
-                                data["lastDividende"]["date"] = datetime.strptime(
-                                    unicode_escape(sibling.get_text()).strip(),
-                                    "%d.%m.%y",
-                                )
-                            except ValueError as e:
-                                print(e)
-                                data["lastDividende"]["date"] = unicode_escape(
-                                    sibling.get_text()
-                                ).strip()
-
-        data = {k: (v.strip() if isinstance(v, str) else v) for k, v in data.items()}
-        return data
-    except StopIteration as e:
+        data = parse_asset_page(r.content.decode("utf-8"), r.url, parser)
+    except ValueError as e:
         print(e)
         raise ValueError(
             f"{asset}: No asset found. Try with another name or the ISIN of your asset."
         )
+    if data["asset"] == "stock":
+        # Stocks have no composition page, their last dividend is on their page
+        data["assetsComposition"] = [{"name": data["asset"], "value": 100}]
+        data["lastDividende"] = parse_last_dividend(r.content.decode("utf-8"), parser)
+    # The composition and the last dividend of the other assets are requested
+    # when they are read, see Asset
+    return data
 
 
-def get_historical_data(bourso_ticker: str) -> pd.DataFrame:
-    """Use the API of boursorama to get the historical quotes of the asset"""
-    req = requests.get(
-        f"https://www.boursorama.com/bourse/action/graph/ws/GetTicksEOD?symbol={bourso_ticker}&length=7300&period=0"
-    )
-    df = pd.DataFrame(req.json()["d"]["QuoteTab"])
-    # convert to datetime object
-    df["date"] = pd.to_datetime(df["d"], unit="D").dt.date
-    # ensure to get all the dates since inception. to avoid missing values in charts
-    start_date = df["date"].min()
-    all_dates = {
-        "date": [
-            start_date + timedelta(days=x) for x in range((TODAY - start_date).days + 1)
-        ]
+def scrape_asset_data(query: str) -> dict:
+    """Scrape an asset, bypassing the cache of get_current_asset_data whose data
+    may be up to its ttl old, and refresh the AssetCache of the process with it"""
+    data = get_current_asset_data.__wrapped__(query)
+    backend = get_cache_backend()
+    if isinstance(backend, AssetCache):
+        backend.put(query, data)
+    return data
+
+
+def get_asset_details(url: str, asset: str, parser: str = DEFAULT_BACKEND) -> dict:
+    """Composition and last dividend of an asset, from its composition page
+    (from its page if it has none)"""
+    from src import http_client
+
+    url_split = url.split("/")
+    url_split.insert(-2, "composition")
+    composition_request = http_client.get("/".join(url_split))
+    if composition_request.status_code == 200:
+        dividend_page = composition_request.content.decode("utf-8")
+        composition = parse_composition(dividend_page)
+    else:
+        dividend_page = http_client.get(url).content.decode("utf-8")
+        composition = None
+    return {
+        "assetsComposition": composition or [{"name": asset, "value": 100}],
+        "lastDividende": parse_last_dividend(dividend_page, parser),
     }
-    date_df = pd.DataFrame.from_dict(all_dates)
-    date_df["date"] = pd.to_datetime(date_df["date"]).dt.date
-    # merge the two dateframes
-    df = pd.merge(date_df, df, how="left", on="date")
-    # forward fill missing values
-    df = df.ffill()
 
+
+def load_assets(
+    queries: dict, max_workers: int = 8, cache: MetadataCache = None
+) -> tuple[dict, dict]:
+    """Scrape several assets concurrently.
+    queries maps an ISIN to the string used to find it (an url, an ISIN...),
+    so each asset is requested only once.
+    With a cache, the assets whose cached fields are all fresh are not scraped,
+    the others are scraped from their cached url (see scrape_asset_data) and cached.
+    Returns a dict of Asset objects and a dict of the loading time (s) of each asset"""
+
+    def load(isin: str, query: str) -> tuple[Asset, float]:
+        start = time.perf_counter()
+        if cache is None:
+            data = get_current_asset_data(query)
+        else:
+            data, stale = cache.get(isin)
+            if data is None or stale:
+                # Cached as fresh: not from the cache of get_current_asset_data
+                data = scrape_asset_data(data["url"] if data else query)
+                cache.put(isin, data)
+        asset = Asset.from_boursorama(data)
+        asset._metadata_cache = cache
+        return asset, time.perf_counter() - start
+
+    assets, timings = {}, {}
+    if len(queries) == 0:
+        return assets, timings
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(queries)))) as pool:
+        futures = {
+            isin: pool.submit(load, isin, query) for isin, query in queries.items()
+        }
+        for isin, future in futures.items():
+            assets[isin], timings[isin] = future.result()
+    return assets, timings
+
+
+def load_details(assets: Iterable[Asset], max_workers: int = 8):
+    """Load the composition and the last dividend of the assets whose details are
+    not loaded yet concurrently, instead of one by one when they are read"""
+    missing = [
+        asset
+        for asset in assets
+        if asset._assetsComposition is None or asset._lastDividende is None
+    ]
+    if len(missing) == 0:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as pool:
+        list(pool.map(lambda asset: asset.load_details(), missing))
+
+
+def get_historical_data(
+    bourso_ticker: str, store: QuoteStore = default_quote_store
+) -> pd.DataFrame:
+    """Use the API of boursorama to get the historical quotes of the asset,
+    one row by trading day (d: day number, date: datetime64).
+    Quotes are kept in a local store, only the days missing since the last stored
+    day are requested."""
+    today_date = date.today()
+    today = (today_date - EPOCH).days
+    last_day = store.last_day(bourso_ticker)
+    if last_day is None:
+        length = 7300
+    elif last_day < today:
+        # Request the last stored day again, its quote may have been intraday
+        length = today - last_day + 1
+    else:
+        length = 0
+    if length > 0:
+        from src import http_client
+
+        req = http_client.get(
+            f"https://www.boursorama.com/bourse/action/graph/ws/GetTicksEOD?symbol={bourso_ticker}&length={length}&period=0"
+        )
+        quote_tab = req.json()["d"]
+        if quote_tab:
+            store.write(bourso_ticker, pd.DataFrame(quote_tab["QuoteTab"]))
+    df = store.read(bourso_ticker)
+    # Trading days only, see Quotations.daily for every calendar day
+    df["date"] = pd.to_datetime(df["d"], unit="D")
     return df
 
+
 if __name__ == '__main__':
     air_liquide = ['air liquide', 'FR0000120073']
     lvmh = ['mc', 'lvmh', 'FR0000121014']
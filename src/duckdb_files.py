@@ -0,0 +1,36 @@
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import duckdb
+
+# Seconds waited for a duckdb file locked by another process
+LOCK_TIMEOUT = 10
+
+
+def is_lock_error(error: Exception) -> bool:
+    return isinstance(error, duckdb.IOException) and "Could not set lock" in str(error)
+
+
+@contextmanager
+def connect(path: str, timeout: float = LOCK_TIMEOUT):
+    """Short-lived connection to a duckdb file, closed when leaving the block.
+    A process locks the file while it is connected: the connection is retried
+    until timeout seconds if another process (e.g. the app, the refresher or a
+    report) is connected."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while True:
+        try:
+            connection = duckdb.connect(path)
+            break
+        except duckdb.IOException as e:
+            if not is_lock_error(e) or time.monotonic() >= deadline:
+                raise
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+    try:
+        yield connection
+    finally:
+        connection.close()
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import random
+import re
+import time
+from pathlib import Path
+from threading import Lock
+from urllib.parse import urlsplit
+
+import requests
+import srsly
+from attrs import define, field
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# (connect, read) timeouts in seconds
+TIMEOUT = (5, 30)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# live: request boursorama, record: request boursorama and save the responses,
+# replay: answer with the saved responses, without network
+MODES = ("live", "record", "replay")
+FIXTURES_DIR = str(Path(__file__).parent.parent / "tests" / "fixtures" / "boursorama")
+
+
+def fixture_path(fixtures_dir: str, url: str) -> Path:
+    """Path of the file storing the response to url.
+    The length of the GetTicksEOD requests is ignored, the recorded history is
+    replayed whatever the number of requested days."""
+    url = re.sub(r"length=\d+&?", "", url)
+    split_url = urlsplit(url)
+    slug = re.sub(r"[^0-9A-Za-z]+", "_", f"{split_url.path}?{split_url.query}")
+    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
+    return Path(fixtures_dir) / f"{slug.strip('_')[:100]}_{digest}.json"
+
+
+def save_response(fixtures_dir: str, response: requests.Response):
+    """Save a response, with the url it was requested from"""
+    requested_url = (
+        response.history[0].request.url if response.history else response.request.url
+    )
+    path = fixture_path(fixtures_dir, requested_url)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    srsly.write_json(
+        path,
+        {
+            "url": requested_url,
+            "final_url": response.url,
+            "status_code": response.status_code,
+            "headers": {"Content-Type": response.headers.get("Content-Type", "")},
+            "content": response.content.decode("utf-8"),
+        },
+    )
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport answering requests with the responses saved in fixtures_dir"""
+
+    def __init__(self, fixtures_dir: str):
+        super().__init__()
+        self.fixtures_dir = fixtures_dir
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        path = fixture_path(self.fixtures_dir, request.url)
+        if not path.is_file():
+            raise FileNotFoundError(f"No recorded response for {request.url} ({path})")
+        fixture = srsly.read_json(path)
+        response = requests.Response()
+        response.status_code = fixture["status_code"]
+        response.headers = CaseInsensitiveDict(fixture["headers"])
+        response._content = fixture["content"].encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = fixture["final_url"]
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+@define
+class RateLimiter:
+    """Ensure consecutive requests to a same host are spaced by min_interval seconds"""
+
+    min_interval: float = 0.2
+    _next_slot: dict = field(factory=dict, init=False)
+    _lock: Lock = field(factory=Lock, init=False)
+
+    def wait(self, host: str):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+@define
+class HttpClient:
+    """Shared http client used for every request to boursorama:
+    - keep-alive connections, pooled per host
+    - per-host rate limiting
+    - retries with a jittered exponential backoff on 429 and 5xx responses
+    - timeouts on every request
+    In record mode, the responses are saved in fixtures_dir,
+    in replay mode, the saved responses are returned without any network access.
+    The mode defaults to the BOURSORAMA_HTTP_MODE environment variable."""
+
+    mode: str = field(factory=lambda: os.environ.get("BOURSORAMA_HTTP_MODE", "live"))
+    fixtures_dir: str = field(
+        factory=lambda: os.environ.get("BOURSORAMA_FIXTURES", FIXTURES_DIR)
+    )
+    timeout: tuple = TIMEOUT
+    retries: int = 3
+    backoff_factor: float = 0.5
+    pool_size: int = 16
+    rate_limiter: RateLimiter = field(factory=RateLimiter)
+    _session: requests.Session = field(default=None, init=False)
+    # Concurrent first requests build a single session
+    _session_lock: Lock = field(factory=Lock, init=False)
+
+    @property
+    def session(self) -> requests.Session:
+        with self._session_lock:
+            if self._session is None:
+                self._session = self.new_session()
+            return self._session
+
+    def new_session(self) -> requests.Session:
+        # Without retries: they are made by get, through the rate limiter
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=0,
+        )
+        if self.mode == "replay":
+            adapter = ReplayAdapter(self.fixtures_dir)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def set_mode(self, mode: str, fixtures_dir: str = None):
+        if mode not in MODES:
+            raise ValueError(f"{mode}: unknown mode, choose among {MODES}")
+        self.mode = mode
+        if fixtures_dir is not None:
+            self.fixtures_dir = fixtures_dir
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def retry_delay(self, attempt: int, response: requests.Response = None) -> float:
+        """Seconds before the next attempt: the Retry-After header of the response
+        if any, else a jittered exponential backoff"""
+        retry_after = None if response is None else response.headers.get("Retry-After")
+        if retry_after is not None and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff_factor * 2**attempt + random.uniform(0, self.backoff_factor)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GET request, retried on 429 and 5xx responses, connection errors and
+        timeouts. Every attempt waits for the rate limiter of the host."""
+        host = urlsplit(url).netloc
+        kwargs.setdefault("timeout", self.timeout)
+        attempts = 1 if self.mode == "replay" else self.retries + 1
+        for attempt in range(attempts):
+            if self.mode != "replay":
+                self.rate_limiter.wait(host)
+            last_attempt = attempt == attempts - 1
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+                time.sleep(self.retry_delay(attempt))
+                continue
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                break
+            response.close()
+            time.sleep(self.retry_delay(attempt, response))
+        if self.mode == "record":
+            save_response(self.fixtures_dir, response)
+        return response
+
+
+client = HttpClient()
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """GET request through the shared client"""
+    return client.get(url, **kwargs)
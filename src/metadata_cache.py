@@ -0,0 +1,214 @@
+import json
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from threading import Lock
+from typing import Iterable, Iterator
+
+import duckdb
+import pandas as pd
+from attrs import define, field
+
+from src.duckdb_files import connect
+
+# Fields of the asset data used to build an Asset object
+ASSET_FIELDS = [
+    "asset",
+    "isin",
+    "symbol",
+    "currency",
+    "name",
+    "latest",
+    "variation",
+    "tradeDate",
+    "url",
+    "referenceIndex",
+    "morningstarCategory",
+    "assetsComposition",
+    "lastDividende",
+]
+# Fields loaded only when read (see Asset), they are not scraped again when stale
+LAZY_FIELDS = ["assetsComposition", "lastDividende"]
+# Fields of the quote of an asset, refreshed during a trading day
+QUOTE_FIELDS = ["latest", "variation", "tradeDate"]
+# Time to live of the fields that change during a trading day,
+# the other fields are kept STATIC_TTL
+FIELD_TTLS = {
+    "latest": timedelta(minutes=15),
+    "variation": timedelta(minutes=15),
+    "tradeDate": timedelta(minutes=15),
+    "lastDividende": timedelta(days=1),
+}
+STATIC_TTL = timedelta(days=7)
+
+
+def encode(value) -> str:
+    """JSON of a field value, dates are tagged to be decoded as dates"""
+
+    def default(obj):
+        if isinstance(obj, datetime):
+            return {"__datetime__": obj.isoformat()}
+        if isinstance(obj, date):
+            return {"__date__": obj.isoformat()}
+        raise TypeError(f"{type(obj)} is not JSON serializable")
+
+    return json.dumps(value, default=default, ensure_ascii=False)
+
+
+def utc_datetime(timestamp: float) -> datetime:
+    """Naive UTC datetime of a timestamp"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def decode(text: str):
+    def object_hook(obj: dict):
+        if "__datetime__" in obj:
+            return datetime.fromisoformat(obj["__datetime__"])
+        if "__date__" in obj:
+            return date.fromisoformat(obj["__date__"])
+        return obj
+
+    return json.loads(text, object_hook=object_hook)
+
+
+@define
+class MetadataCache:
+    """On-disk cache of the asset data scraped from boursorama, by isin.
+    Each field has its own update time and time to live: the name or the
+    composition of an asset are kept for days, its latest price for minutes."""
+
+    path: str = "data/metadata.duckdb"
+    ttls: dict = field(factory=lambda: dict(FIELD_TTLS))
+    static_ttl: timedelta = STATIC_TTL
+    # The asset_metadata table was created by this cache
+    _created: bool = field(default=False, init=False)
+    _lock: Lock = field(factory=Lock, init=False)
+
+    @contextmanager
+    def connection(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Connection to the file, closed after each operation so that other
+        processes can use the cache"""
+        with connect(self.path) as connection:
+            if not self._created:
+                connection.execute(
+                    """
+                    create table if not exists asset_metadata (
+                    isin VARCHAR,
+                    field VARCHAR,
+                    value VARCHAR,
+                    updated DOUBLE,
+                    PRIMARY KEY (isin, field))"""
+                )
+                self._created = True
+            yield connection
+
+    def ttl(self, field_name: str) -> timedelta:
+        return self.ttls.get(field_name, self.static_ttl)
+
+    def get(self, isin: str, now: float = None) -> tuple:
+        """Cached data of an asset and the set of its stale fields.
+        The data is None when a field is missing. The lazy fields are left out of
+        the data when they are missing or stale, to be loaded again when read."""
+        now = time.time() if now is None else now
+        with self._lock, self.connection() as connection:
+            rows = connection.execute(
+                "select field, value, updated from asset_metadata where isin = ?",
+                [isin],
+            ).fetchall()
+        cached = {field_name: (value, updated) for field_name, value, updated in rows}
+        fields = [f for f in ASSET_FIELDS if f not in LAZY_FIELDS]
+        if any(field_name not in cached for field_name in fields):
+            return None, set(fields)
+
+        def is_stale(field_name: str) -> bool:
+            updated = cached[field_name][1]
+            return now - updated > self.ttl(field_name).total_seconds()
+
+        data = {field_name: decode(cached[field_name][0]) for field_name in fields}
+        for field_name in LAZY_FIELDS:
+            if field_name in cached and not is_stale(field_name):
+                value = decode(cached[field_name][0])
+                if value is not None:
+                    data[field_name] = value
+        return data, {field_name for field_name in fields if is_stale(field_name)}
+
+    def quotes(self, isins: Iterable[str]) -> dict:
+        """Cached quote fields of assets by isin, whatever their age,
+        read in one query. The assets without cached quote are left out."""
+        with self._lock, self.connection() as connection:
+            rows = connection.execute(
+                f"""select isin, field, value from asset_metadata
+                where list_contains(?, isin)
+                and field in ({', '.join('?' * len(QUOTE_FIELDS))})""",
+                [list(isins), *QUOTE_FIELDS],
+            ).fetchall()
+        quotes = {}
+        for isin, field_name, value in rows:
+            quotes.setdefault(isin, {})[field_name] = decode(value)
+        return {
+            isin: quote
+            for isin, quote in quotes.items()
+            if len(quote) == len(QUOTE_FIELDS)
+        }
+
+    def put(self, isin: str, data: dict, updated: float = None, replace: bool = True):
+        """Store the fields of the data of an asset, updated now by default.
+        replace=False stores only the fields missing from the cache."""
+        updated = time.time() if updated is None else updated
+        fields_df = pd.DataFrame(
+            [
+                (field_name, encode(data[field_name]), updated)
+                for field_name in ASSET_FIELDS
+                if field_name in data
+            ],
+            columns=["field", "value", "updated"],
+        )
+        with self._lock, self.connection() as connection:
+            connection.register("fields_df", fields_df)
+            connection.begin()
+            # duckdb cannot delete and insert a same key in one transaction:
+            # update the stored fields, then insert the new ones
+            if replace:
+                connection.execute(
+                    """update asset_metadata set value = f.value, updated = f.updated
+                    from fields_df f
+                    where asset_metadata.isin = ? and asset_metadata.field = f.field""",
+                    [isin],
+                )
+            connection.execute(
+                """insert into asset_metadata
+                select ? as isin, field, value, updated from fields_df
+                where field not in (select field from asset_metadata where isin = ?)""",
+                [isin, isin],
+            )
+            connection.commit()
+            connection.unregister("fields_df")
+
+    def seed(self, assets: Iterable[dict], updated: float):
+        """Store the fields missing from the cache of asset dicts saved at the
+        updated time (e.g. the modification time of a jsonl file). The cached
+        fields are kept: the file may have been saved from older data.
+        The lazy fields saved before they were loaded (None) are not stored.
+        Dates saved as timestamps by srsly are restored."""
+        for data in assets:
+            if not data.get("isin"):
+                continue
+            data = {
+                field_name: value
+                for field_name, value in data.items()
+                if not (field_name in LAZY_FIELDS and value is None)
+            }
+            if isinstance(data.get("tradeDate"), (int, float)):
+                data["tradeDate"] = utc_datetime(data["tradeDate"])
+            dividend = data.get("lastDividende")
+            if isinstance(dividend, dict) and isinstance(
+                dividend.get("date"), (int, float)
+            ):
+                data["lastDividende"] = {
+                    **dividend,
+                    "date": utc_datetime(dividend["date"]),
+                }
+            self.put(data["isin"], data, updated, replace=False)
+
+
+default_metadata_cache = MetadataCache()
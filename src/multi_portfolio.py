@@ -0,0 +1,223 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+import pandas as pd
+from attrs import define, evolve, field
+
+from src.data_extraction import load_assets
+from src.metadata_cache import MetadataCache, default_metadata_cache
+from src.portfolio import Portfolio
+
+# Fields of a Portfolio computed by its summaries, sent back by the workers
+COMPUTED_FIELDS = [
+    "_asset_lines",
+    "_assets_summary",
+    "_valuation",
+    "_portfolio_summary",
+    "irr_failures",
+]
+
+# Assets shared by the portfolios computed in a worker process
+_worker_assets: dict = {}
+
+
+def _init_worker(assets: dict):
+    global _worker_assets
+    _worker_assets = assets
+
+
+def summarize(portfolio: Portfolio) -> dict:
+    """Compute the summaries of a portfolio, return its computed fields"""
+    portfolio.portfolio_summary
+    return {name: getattr(portfolio, name) for name in COMPUTED_FIELDS}
+
+
+def _summarize_in_worker(name: str, operations_df: pd.DataFrame) -> dict:
+    return summarize(
+        Portfolio(
+            name,
+            dict_of_assets=_worker_assets,
+            operations_df=operations_df,
+            metadata_cache=None,
+        )
+    )
+
+
+def portfolio_names(directory: str = "data/operations") -> list:
+    """Names of the portfolios with an operations store or csv file"""
+    paths = [*Path(directory).glob("*.duckdb"), *Path(directory).glob("*.csv")]
+    return sorted({path.stem for path in paths})
+
+
+def asset_queries(portfolios: Iterable[Portfolio]) -> dict:
+    """Union of the asset queries of the portfolios (see Portfolio.asset_queries),
+    so each asset is scraped once"""
+    queries = {}
+    for portfolio in portfolios:
+        for isin, query in portfolio.asset_queries().items():
+            queries.setdefault(isin, query)
+    return queries
+
+
+@define
+class MultiPortfolio:
+    """Portfolios loaded together: the assets of all their operations are scraped
+    once and their quotations loaded once, then shared by the portfolios.
+    The summaries of the portfolios are computed in a pool of processes."""
+
+    # All the portfolios of data/operations when not given
+    names: list = None
+    max_workers: int = 8
+    # Processes computing the summaries, one by cpu by default.
+    # With 1, the summaries are computed in this process.
+    processes: int = None
+    # Assets and operations (by portfolio name) are loaded from the portfolio
+    # files when not given
+    dict_of_assets: dict = None
+    operations: dict = None
+    metadata_cache: MetadataCache = default_metadata_cache
+    portfolios: dict = field(factory=dict, init=False)
+    load_timings: dict = field(factory=dict, init=False)
+
+    def __attrs_post_init__(self):
+        if self.names is None:
+            self.names = (
+                list(self.operations)
+                if self.operations is not None
+                else portfolio_names()
+            )
+        assets = {} if self.dict_of_assets is None else self.dict_of_assets
+        for name in self.names:
+            self.portfolios[name] = Portfolio(
+                name,
+                self.max_workers,
+                dict_of_assets=assets,
+                operations_df=(self.operations or {}).get(name),
+                metadata_cache=self.metadata_cache,
+            )
+        if self.dict_of_assets is not None:
+            return
+        loaded, self.load_timings = load_assets(
+            asset_queries(self.portfolios.values()),
+            self.max_workers,
+            self.metadata_cache,
+        )
+        # The portfolios share the dict of the assets
+        assets.update(loaded)
+        self.dict_of_assets = assets
+        self.load_quotations()
+
+    def load_quotations(self):
+        """Load the quotations of all the assets once, concurrently"""
+        if len(self.dict_of_assets) == 0:
+            return
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_workers, len(self.dict_of_assets)))
+        ) as pool:
+            list(pool.map(lambda asset: asset.quotations, self.dict_of_assets.values()))
+
+    def compute(self):
+        """Compute the summaries of the portfolios not computed yet,
+        in parallel processes"""
+        names = [
+            name
+            for name, portfolio in self.portfolios.items()
+            if portfolio._portfolio_summary is None and len(portfolio.operations_df)
+        ]
+        processes = min(self.processes or os.cpu_count() or 1, len(names))
+        if processes <= 1:
+            for name in names:
+                summarize(self.portfolios[name])
+            return
+        # Without the metadata cache, whose lock cannot be sent to the workers
+        assets = {
+            isin: evolve(asset, metadata_cache=None)
+            for isin, asset in self.dict_of_assets.items()
+        }
+        with ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_worker, initargs=(assets,)
+        ) as pool:
+            futures = {
+                name: pool.submit(
+                    _summarize_in_worker, name, self.portfolios[name].operations_df
+                )
+                for name in names
+            }
+            for name, future in futures.items():
+                for field_name, value in future.result().items():
+                    setattr(self.portfolios[name], field_name, value)
+
+    @property
+    def portfolio_summaries(self) -> pd.DataFrame:
+        """Summary of each portfolio, indexed by portfolio name"""
+        self.compute()
+        summaries = [
+            portfolio.portfolio_summary.assign(portfolio=name)
+            for name, portfolio in self.portfolios.items()
+            if portfolio.portfolio_summary is not None
+        ]
+        if not summaries:
+            return pd.DataFrame()
+        return pd.concat(summaries).set_index("portfolio")
+
+    @property
+    def consolidated(self) -> pd.DataFrame:
+        """Owned assets of all the portfolios, one line by isin, with the
+        portfolios holding them"""
+        self.compute()
+        lines = [
+            portfolio.assets_summary.assign(portfolio=name)
+            for name, portfolio in self.portfolios.items()
+            if portfolio.assets_summary is not None
+        ]
+        if not lines:
+            return pd.DataFrame()
+        consolidated = (
+            pd.concat(lines, ignore_index=True)
+            .groupby("isin", sort=False)
+            .agg(
+                name=("name", "first"),
+                asset=("asset", "first"),
+                currency=("currency", "first"),
+                latest=("latest", "first"),
+                quantity=("quantity", "sum"),
+                valuation=("valuation", "sum"),
+                **{
+                    column: (column, "sum")
+                    for column in [
+                        "total dividends",
+                        "Total invested amount",
+                        "Capital gain",
+                    ]
+                },
+                portfolios=("portfolio", list),
+            )
+            .reset_index()
+        )
+        consolidated["Capital gain (%)"] = (
+            100 * consolidated["Capital gain"] / consolidated["Total invested amount"]
+        )
+        consolidated["proportion (%)"] = round(
+            100 * consolidated["valuation"] / consolidated["valuation"].sum(), 2
+        )
+        return consolidated
+
+    @property
+    def nav(self) -> pd.DataFrame:
+        """Daily net asset value (date, value) of all the portfolios"""
+        self.compute()
+        navs = [
+            portfolio.nav
+            for portfolio in self.portfolios.values()
+            if len(portfolio.operations_df)
+        ]
+        if not navs:
+            return None
+        return (
+            pd.concat(navs)
+            .groupby("date", sort=True)["value"]
+            .sum(min_count=1)
+            .reset_index()
+        )
@@ -0,0 +1,277 @@
+import re
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterator, Union
+
+import numpy as np
+import pandas as pd
+from attrs import define, field
+
+from src.operations_store import OPERATION_COLUMNS, OperationsStore
+
+# Lowercased column names of the broker exports -> column of the operations
+COLUMN_ALIASES = {
+    "name": "name",
+    "nom": "name",
+    "libellé": "name",
+    "libelle": "name",
+    "valeur": "name",
+    "isin": "isin",
+    "code isin": "isin",
+    "date": "date",
+    "date d'opération": "date",
+    "date operation": "date",
+    "date d'exécution": "date",
+    "operation": "operation",
+    "opération": "operation",
+    "type": "operation",
+    "sens": "operation",
+    "quantity": "quantity",
+    "quantité": "quantity",
+    "quantite": "quantity",
+    "qty": "quantity",
+    "value": "value",
+    "price": "value",
+    "prix": "value",
+    "cours": "value",
+    "montant unitaire": "value",
+    "fees": "fees",
+    "frais": "fees",
+    "commission": "fees",
+    "courtage": "fees",
+}
+REQUIRED_COLUMNS = ["isin", "date", "operation", "value"]
+# Lowercased operation types of the broker exports -> operation
+OPERATION_ALIASES = {
+    "buy": "Buy",
+    "achat": "Buy",
+    "sell": "Sell",
+    "vente": "Sell",
+    "dividend": "Dividend",
+    "dividende": "Dividend",
+    "coupon": "Dividend",
+    "split": "Split",
+    "division": "Split",
+}
+ISIN = r"^[A-Z]{2}[A-Z0-9]{9}[0-9]$"
+# Rejected rows kept in the report, the others are only counted
+MAX_REJECTED_ROWS = 100
+
+
+@define
+class ImportReport:
+    """Result of an import: counts of the imported, skipped (already stored) and
+    rejected rows, the rejected rows by reason and a sample of them with their
+    line in the file."""
+
+    imported: int = 0
+    skipped: int = 0
+    rejected: int = 0
+    reasons: dict = field(factory=dict)
+    rejected_rows: pd.DataFrame = None
+    seconds: float = 0.0
+
+    @property
+    def rows(self) -> int:
+        return self.imported + self.skipped + self.rejected
+
+
+def resolve_columns(columns: list, column_map: dict = None) -> dict:
+    """Renaming of the columns of an export to the operation columns.
+    column_map (export column -> operation column) takes precedence over
+    the known aliases. Raise a ValueError when a required column is missing."""
+    renames = {}
+    for column in columns:
+        target = (column_map or {}).get(column) or COLUMN_ALIASES.get(
+            str(column).strip().lower()
+        )
+        if target in OPERATION_COLUMNS and target not in renames.values():
+            renames[column] = target
+    missing = [c for c in REQUIRED_COLUMNS if c not in renames.values()]
+    if missing:
+        raise ValueError(
+            f"Missing columns {missing} in {list(columns)}, "
+            "give their names with column_map"
+        )
+    return renames
+
+
+def _unique_map(values: pd.Series, function) -> pd.Series:
+    """function applied once by distinct value of a column (e.g. the few
+    operation types or isins of an export), missing values stay missing"""
+    codes, uniques = pd.factorize(values)
+    results = np.array([function(v) for v in uniques] + [None], dtype=object)
+    return pd.Series(results[codes], index=values.index)
+
+
+def _number(text) -> float:
+    text = re.sub(r"[\s€$]", "", str(text))
+    if "," in text:
+        # Thousands separators before a decimal point, or a decimal comma
+        text = text.replace(",", "") if "." in text else text.replace(",", ".")
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def to_number(values: pd.Series) -> pd.Series:
+    """Numbers of a column, with decimal commas and spaces or commas as thousands
+    separators (e.g. "1 234,5" or "1,234.5"). Invalid numbers are NaN."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype("float64")
+    return _unique_map(values, _number).astype("float64")
+
+
+def _split_ratio(text) -> float:
+    match = re.fullmatch(r"\s*(\d+)\s*[:/]\s*(\d+)\s*", str(text))
+    return int(match.group(1)) / int(match.group(2)) if match else np.nan
+
+
+def normalize(
+    chunk: pd.DataFrame, renames: dict, date_format: str = "ISO8601"
+) -> pd.DataFrame:
+    """Operations of a chunk of an export, with a "reason" column: empty for valid
+    rows, the first failed check otherwise"""
+    chunk = chunk.rename(columns=renames)
+    operations = pd.DataFrame(index=chunk.index)
+    operations["isin"] = _unique_map(chunk["isin"], lambda v: str(v).strip().upper())
+    name = (
+        _unique_map(chunk["name"], lambda v: str(v).strip())
+        if "name" in chunk
+        else pd.Series(None, index=chunk.index, dtype=object)
+    )
+    operations["name"] = name.mask(name.fillna("") == "", operations["isin"])
+    # Dates are parsed at once, the store casts them to DATE
+    operations["date"] = pd.to_datetime(
+        chunk["date"], format=date_format, errors="coerce"
+    ).astype("datetime64[us]")
+    operations["operation"] = _unique_map(
+        chunk["operation"], lambda v: OPERATION_ALIASES.get(str(v).strip().lower())
+    )
+    operations["quantity"] = (
+        to_number(chunk["quantity"]) if "quantity" in chunk else np.nan
+    )
+    operations["value"] = to_number(chunk["value"])
+    is_split = operations["operation"] == "Split"
+    if is_split.any() and not pd.api.types.is_numeric_dtype(chunk["value"]):
+        operations.loc[is_split, "value"] = operations.loc[is_split, "value"].fillna(
+            _unique_map(chunk.loc[is_split, "value"], _split_ratio).astype("float64")
+        )
+    operations["fees"] = (
+        to_number(chunk["fees"]).fillna(0.0) if "fees" in chunk else 0.0
+    )
+    is_trade = operations["operation"].isin(["Buy", "Sell"])
+    is_isin = _unique_map(
+        operations["isin"], lambda v: re.match(ISIN, v) is not None
+    ).astype(bool)
+    checks = [
+        (~is_isin, "invalid isin"),
+        (operations["date"].isna(), "invalid date"),
+        (operations["operation"].isna(), "unknown operation"),
+        (is_trade & ~(operations["quantity"] > 0), "invalid quantity"),
+        (is_trade & ~(operations["value"] >= 0), "invalid value"),
+        (~is_trade & ~(operations["value"] > 0), "invalid value"),
+        (~(operations["fees"] >= 0), "invalid fees"),
+    ]
+    operations["reason"] = np.select(
+        [condition.fillna(True).to_numpy(dtype=bool) for condition, _ in checks],
+        [reason for _, reason in checks],
+        default="",
+    )
+    return operations[[*OPERATION_COLUMNS, "reason"]]
+
+
+def separator(source: Union[str, Path, BinaryIO], encoding: str = None) -> str:
+    """Separator of a csv file or binary file object, the most frequent of
+    ",;\\t|" in its header"""
+    if isinstance(source, (str, Path)):
+        with open(source, encoding=encoding or "utf-8", errors="replace") as f:
+            header = f.readline()
+    else:
+        position = source.tell()
+        header = source.readline().decode(encoding or "utf-8", errors="replace")
+        source.seek(position)
+    return max(",;\t|", key=header.count)
+
+
+def read_chunks(
+    source: Union[str, Path, BinaryIO],
+    chunksize: int = 50_000,
+    file_format: str = None,
+    **csv_options,
+) -> Iterator[pd.DataFrame]:
+    """Chunks of rows of a csv or parquet export, a path or a binary file object
+    (format from the file extension when not given), the file is never loaded
+    at once. csv_options are passed to pandas.read_csv (e.g. sep=";" or
+    encoding="latin-1")."""
+    file_format = file_format or Path(str(getattr(source, "name", source))).suffix[1:]
+    if file_format.lower() == "parquet":
+        # Imported only for parquet exports, pyarrow is the optional "parquet" extra
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError(
+                "pyarrow is required to import parquet exports: "
+                "pip install pyarrow, or poetry install --extras parquet"
+            ) from e
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        if "sep" not in csv_options:
+            csv_options["sep"] = separator(source, csv_options.get("encoding"))
+        yield from pd.read_csv(
+            source, chunksize=chunksize, dtype=str, skipinitialspace=True, **csv_options
+        )
+
+
+def import_operations(
+    source: Union[str, Path, BinaryIO],
+    store: OperationsStore,
+    column_map: dict = None,
+    date_format: str = "ISO8601",
+    chunksize: int = 50_000,
+    skip_existing: bool = True,
+    file_format: str = None,
+    **csv_options,
+) -> ImportReport:
+    """Import the operations of a broker export in the store, chunk by chunk.
+    Invalid rows are rejected and reported, the valid rows of each chunk are
+    inserted at once. With skip_existing, the rows already in the store before the
+    import are skipped, so an export can be imported again after new operations.
+    date_format is a strptime format, e.g. "%d/%m/%Y" for French exports."""
+    start = time.perf_counter()
+    report = ImportReport()
+    existing_until = store.last_id() if skip_existing and store.exists else None
+    renames, samples, line = None, [], 0
+    for chunk in read_chunks(source, chunksize, file_format, **csv_options):
+        if renames is None:
+            renames = resolve_columns(list(chunk.columns), column_map)
+        operations = normalize(chunk, renames, date_format)
+        # Line of the row in a csv file, after the header line
+        operations.index = pd.RangeIndex(line + 2, line + 2 + len(chunk))
+        line += len(chunk)
+        rejected = operations["reason"] != ""
+        if rejected.any():
+            report.rejected += int(rejected.sum())
+            for reason, count in operations.loc[rejected, "reason"].value_counts().items():
+                report.reasons[reason] = report.reasons.get(reason, 0) + int(count)
+            kept = MAX_REJECTED_ROWS - sum(len(s) for s in samples)
+            if kept > 0:
+                samples.append(
+                    chunk.loc[rejected.to_numpy()]
+                    .iloc[:kept]
+                    .set_axis(operations.index[rejected][:kept])
+                    .assign(reason=operations.loc[rejected, "reason"].iloc[:kept])
+                )
+        valid = operations.loc[~rejected, OPERATION_COLUMNS]
+        if len(valid):
+            added = store.add_many(valid, existing_until)
+            report.imported += added
+            report.skipped += len(valid) - added
+    report.rejected_rows = (
+        pd.concat(samples).rename_axis("line") if samples else pd.DataFrame()
+    )
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,189 @@
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from typing import Iterator
+
+import duckdb
+import pandas as pd
+from attrs import define, field
+
+from src.duckdb_files import connect
+
+OPERATION_COLUMNS = ["name", "isin", "date", "operation", "quantity", "value", "fees"]
+# Version of the schema of the stores, those of a previous version are migrated
+# once (see OperationsStore.migrate)
+SCHEMA_VERSION = 2
+
+
+@define
+class OperationsStore:
+    """On-disk store of the operations of a portfolio, in a duckdb file.
+    Operations have stable ids and are indexed by date only: an operation is
+    added or removed without rewriting the others, and there is no index on isin,
+    whose few distinct values would slow the bulk imports down more than they
+    would speed the reads of an isin up.
+    The database file is created by the first added operation. If it does not
+    exist, the operations of the former csv file (csv_path) are imported."""
+
+    path: str
+    csv_path: str = None
+    # The store was created or migrated by this instance
+    _ready: bool = field(default=False, init=False)
+    _lock: Lock = field(factory=Lock, init=False)
+
+    @contextmanager
+    def connection(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Connection to the file, closed after each operation so that other
+        processes can use the store"""
+        if not self._ready and not Path(self.path).is_file():
+            self.create()
+        with connect(self.path) as connection:
+            if not self._ready:
+                self.migrate(connection)
+                self._ready = True
+            yield connection
+
+    def schema_version(self, connection: duckdb.DuckDBPyConnection = None) -> int:
+        """Version of the schema of the store, 1 before it was versioned"""
+        if connection is None:
+            with self._lock, self.connection() as connection:
+                return self.schema_version(connection)
+        versioned = connection.execute(
+            "select count(*) from duckdb_tables() where table_name = 'schema_version'"
+        ).fetchone()[0]
+        if not versioned:
+            return 1
+        return connection.execute("select max(version) from schema_version").fetchone()[0]
+
+    @staticmethod
+    def set_schema_version(connection: duckdb.DuckDBPyConnection, version: int):
+        connection.execute(
+            """create table if not exists schema_version (version INTEGER);
+            delete from schema_version;"""
+        )
+        connection.execute("insert into schema_version values (?)", [version])
+
+    def migrate(self, connection: duckdb.DuckDBPyConnection):
+        """Upgrade a store of a previous schema version, once"""
+        version = self.schema_version(connection)
+        if version >= SCHEMA_VERSION:
+            return
+        if version < 2:
+            # The isins were indexed
+            connection.execute("drop index if exists operations_isin")
+        self.set_schema_version(connection, SCHEMA_VERSION)
+
+    def create(self):
+        """Create the operations table, with the operations of the csv file if any"""
+        csv_operations = None
+        if self.csv_path and Path(self.csv_path).is_file():
+            # Read before creating the database, which must not be left empty
+            csv_operations = pd.read_csv(self.csv_path).reindex(
+                columns=OPERATION_COLUMNS
+            )
+            csv_operations["date"] = pd.to_datetime(csv_operations["date"]).dt.date
+        with connect(self.path) as connection:
+            connection.execute(
+                """
+                create sequence if not exists operation_id;
+                create table if not exists operations (
+                id INTEGER PRIMARY KEY DEFAULT nextval('operation_id'),
+                name VARCHAR,
+                isin VARCHAR,
+                date DATE,
+                operation VARCHAR,
+                quantity DOUBLE,
+                value DOUBLE,
+                fees DOUBLE);
+                create index if not exists operations_date on operations (date);
+                """
+            )
+            self.set_schema_version(connection, SCHEMA_VERSION)
+            if csv_operations is not None:
+                # Same ids as the former row numbers of the csv operations
+                connection.execute(
+                    f"""
+                    insert into operations ({', '.join(OPERATION_COLUMNS)})
+                    select {', '.join(OPERATION_COLUMNS)} from csv_operations
+                    order by date, isin, name
+                    """
+                )
+        self._ready = True
+
+    @property
+    def exists(self) -> bool:
+        return Path(self.path).is_file()
+
+    def read(self, isin: str = None, start: str = None, end: str = None) -> pd.DataFrame:
+        """Operations ordered by date, optionally of one isin and between two dates
+        (included). Dates are returned as "%Y-%m-%d" strings."""
+        if not self.exists and not (self.csv_path and Path(self.csv_path).is_file()):
+            return pd.DataFrame(
+                {column: [] for column in ["id", *OPERATION_COLUMNS]}
+            )
+        conditions, parameters = [], []
+        for condition, parameter in [
+            ("isin = ?", isin),
+            ("date >= cast(? as DATE)", start),
+            ("date <= cast(? as DATE)", end),
+        ]:
+            if parameter is not None:
+                conditions.append(condition)
+                parameters.append(str(parameter))
+        with self._lock, self.connection() as connection:
+            return connection.execute(
+                f"""
+                select id, name, isin, strftime(date, '%Y-%m-%d') as date,
+                operation, quantity, value, fees
+                from operations
+                {f"where {' and '.join(conditions)}" if conditions else ""}
+                order by date, isin, name, id
+                """,
+                parameters,
+            ).df()
+
+    def add(self, operation: dict) -> int:
+        """Add an operation, return its id"""
+        with self._lock, self.connection() as connection:
+            return connection.execute(
+                f"""insert into operations ({', '.join(OPERATION_COLUMNS)})
+                values ({', '.join('?' * len(OPERATION_COLUMNS))})
+                returning id""",
+                [operation.get(column) for column in OPERATION_COLUMNS],
+            ).fetchone()[0]
+
+    def add_many(self, operations: pd.DataFrame, existing_until: int = None) -> int:
+        """Add operations in one transaction, return the number of added operations.
+        With existing_until, the operations equal to a stored operation whose id is
+        at most existing_until are skipped (e.g. already imported)."""
+        operations = operations.reindex(columns=OPERATION_COLUMNS)
+        skip = ""
+        if existing_until is not None:
+            skip = f"""where not exists (
+            select 1 from operations o where o.id <= {int(existing_until)}
+            and {' and '.join(
+                f'o.{c} is not distinct from n.{c}' for c in OPERATION_COLUMNS
+            )})"""
+        with self._lock, self.connection() as connection:
+            connection.register("new_operations", operations)
+            try:
+                return connection.execute(
+                    f"""insert into operations ({', '.join(OPERATION_COLUMNS)})
+                    select {', '.join(f'n.{c}' for c in OPERATION_COLUMNS)}
+                    from new_operations n {skip}"""
+                ).fetchone()[0]
+            finally:
+                connection.unregister("new_operations")
+
+    def last_id(self) -> int:
+        """Greatest id of the stored operations, 0 without operation"""
+        with self._lock, self.connection() as connection:
+            return connection.execute(
+                "select coalesce(max(id), 0) from operations"
+            ).fetchone()[0]
+
+    def remove(self, operation_id: int):
+        with self._lock, self.connection() as connection:
+            connection.execute(
+                "delete from operations where id = ?", [operation_id]
+            )
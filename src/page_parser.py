@@ -0,0 +1,241 @@
+import json
+import re
+from datetime import datetime
+from typing import Callable, Union
+
+from attrs import define
+
+# Heading of the info list -> key of the asset data
+MAP_ATTRIBUTES = {
+    "indice de référence": "referenceIndex",
+    "catégorie morningstar": "morningstarCategory",
+    "amChartData": "AssetsComposition",
+}
+INFO_LIST = re.compile(r'<ul[^>]*class="[^"]*\bc-list-info__list\b')
+DIVIDEND_HEADING = "dernier dividende"
+
+
+@define
+class ParserBackend:
+    """Parser of the blocks of an asset page.
+    faceplate returns the raw texts of a faceplate block: init (data-ist-init
+    attribute or None), name, isin, latest, variation, currency and real_time
+    (None without a real time block).
+    info_items returns the (heading, [values]) of the items of an info list block."""
+
+    faceplate: Callable[[str], dict]
+    info_items: Callable[[str], list]
+
+
+def _has_class(class_: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_} ')"
+
+
+def _lxml_faceplate(block: str) -> dict:
+    # The parser libraries are imported by the backend parsing a page
+    import lxml.html
+
+    root = lxml.html.fragment_fromstring(block)
+
+    def texts(tag: str, class_: str) -> list:
+        return [
+            e.text_content() for e in root.iterfind(f".//{tag}") if class_ in e.classes
+        ]
+
+    real_time = texts("div", "c-faceplate__real-time")
+    return {
+        "init": root.get("data-ist-init"),
+        "name": root.xpath('.//a[contains(@title, "Cours")]')[0].text_content(),
+        "isin": texts("h2", "c-faceplate__isin")[0],
+        "latest": texts("span", "c-instrument--last")[0],
+        "variation": texts("span", "c-instrument--variation")[0],
+        "currency": texts("span", "c-faceplate__price-currency")[-1],
+        "real_time": real_time[0] if real_time else None,
+    }
+
+
+def _lxml_info_items(block: str) -> list:
+    import lxml.html
+
+    root = lxml.html.fragment_fromstring(block)
+    return [
+        (heading.text_content(), [e.text_content() for e in heading.itersiblings()])
+        for heading in root.xpath(f".//p[{_has_class('c-list-info__heading')}]")
+    ]
+
+
+def _bs4_faceplate(block: str) -> dict:
+    from bs4 import BeautifulSoup
+
+    root = BeautifulSoup(block, "html.parser").div
+    real_time = root.find("div", class_="c-faceplate__real-time")
+    return {
+        "init": root.get("data-ist-init"),
+        "name": root.select('a[title*="Cours"]')[0].get_text(),
+        "isin": root.find("h2", class_="c-faceplate__isin").get_text(),
+        "latest": root.find("span", class_="c-instrument--last").get_text(),
+        "variation": root.find("span", class_="c-instrument--variation").get_text(),
+        "currency": root.find_all("span", class_="c-faceplate__price-currency")[
+            -1
+        ].get_text(),
+        "real_time": real_time.get_text() if real_time else None,
+    }
+
+
+def _bs4_info_items(block: str) -> list:
+    from bs4 import BeautifulSoup
+
+    root = BeautifulSoup(block, "html.parser")
+    return [
+        (
+            heading.get_text(),
+            [e.get_text() for e in heading.find_next_siblings()],
+        )
+        for heading in root.find_all("p", class_="c-list-info__heading")
+    ]
+
+
+BACKENDS = {
+    "lxml": ParserBackend(_lxml_faceplate, _lxml_info_items),
+    "bs4": ParserBackend(_bs4_faceplate, _bs4_info_items),
+}
+DEFAULT_BACKEND = "lxml"
+
+
+def get_backend(backend: Union[str, ParserBackend]) -> ParserBackend:
+    if isinstance(backend, ParserBackend):
+        return backend
+    try:
+        return BACKENDS[backend]
+    except KeyError:
+        raise ValueError(
+            f"Unknown parser backend {backend}, use one of {list(BACKENDS)}"
+        )
+
+
+def element_at(html: str, start: int, tag: str) -> str:
+    """Source of the element opened at start, up to its matching closing tag"""
+    depth = 0
+    for match in re.compile(rf"<(/?){tag}\b", re.IGNORECASE).finditer(html, start):
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            return html[start : html.find(">", match.end()) + 1]
+    return html[start:]
+
+
+def faceplate_block(html: str, symbol: str) -> str:
+    """Source of the faceplate of the symbol, None if the page has none"""
+    match = re.search(rf'data-faceplate-symbol="[^"]*{re.escape(symbol)}', html)
+    if match is None:
+        return None
+    return element_at(html, html.rfind("<div", 0, match.start()), "div")
+
+
+def info_list_blocks(html: str) -> list:
+    return [element_at(html, m.start(), "ul") for m in INFO_LIST.finditer(html)]
+
+
+def info_items(html: str, backend: Union[str, ParserBackend] = DEFAULT_BACKEND) -> list:
+    """(heading, [values]) of the info lists of a page, stripped, without the
+    empty or unknown ("?") values"""
+    backend = get_backend(backend)
+    return [
+        (
+            heading.strip(),
+            [v.strip() for v in values if v.strip() and "?" not in v],
+        )
+        for block in info_list_blocks(html)
+        for heading, values in backend.info_items(block)
+    ]
+
+
+def parse_asset_page(
+    html: str, url: str, backend: Union[str, ParserBackend] = DEFAULT_BACKEND
+) -> dict:
+    """Data of the asset of a boursorama page, from its faceplate and,
+    for the pages of the bourse section, its info lists.
+    Only these blocks are parsed, the rest of the page is skipped."""
+    backend = get_backend(backend)
+    url_split = url.split("/")
+    symbol = url_split[-2]
+    block = faceplate_block(html, symbol)
+    if block is None:
+        raise ValueError(f"No faceplate of {symbol} in {url}")
+    faceplate = backend.faceplate(block)
+    data = {}
+    if faceplate["init"]:
+        try:
+            data = json.loads(faceplate["init"])
+        except json.JSONDecodeError as e:
+            print(e)
+    if len(data) == 0:
+        data["symbol"] = symbol
+        data["tradeDate"] = datetime.strptime(
+            re.search(r"[0-3][0-9]/[01][0-9]/[0-9]{4}", faceplate["real_time"]).group(),
+            "%d/%m/%Y",
+        )
+    else:
+        data["tradeDate"] = datetime.strptime(data["tradeDate"], "%Y-%m-%d")
+    data["variation"] = faceplate["variation"]
+    data["latest"] = faceplate["latest"].replace(" ", "")
+    data["isin"] = faceplate["isin"].strip().split(" ")[0]
+    data["asset"] = (
+        url_split[url_split.index("cours") - 1] if "bourse" in url else "stock"
+    )
+    data["name"] = faceplate["name"].strip()
+    data["url"] = url
+    data["currency"] = faceplate["currency"].strip()
+    # Init entries with null values
+    for v in MAP_ATTRIBUTES.values():
+        data[v] = None
+    if "bourse" in url:
+        for heading, values in info_items(html, backend):
+            attr = MAP_ATTRIBUTES.get(heading.lower(), heading)
+            for v in values:
+                if data.get(attr, None) is None:
+                    data[attr] = v
+                elif isinstance(data[attr], str):
+                    data[attr] = [data[attr]] + [v]
+                else:
+                    data[attr].append(v)
+    return {k: (v.strip() if isinstance(v, str) else v) for k, v in data.items()}
+
+
+def parse_last_dividend(
+    html: str, backend: Union[str, ParserBackend] = DEFAULT_BACKEND
+) -> dict:
+    """Amount and date of the last dividend from the info lists of a page,
+    an empty dict when the page does not give both. The date is kept as a string
+    when it is not a date (e.g. "-")."""
+    items = [
+        (heading, values)
+        for heading, values in info_items(html, backend)
+        if DIVIDEND_HEADING in heading.lower()
+    ]
+    if len(items) < 2:
+        return {}
+    values = [value for _, item_values in items for value in item_values]
+    last_dividend = {}
+    if values:
+        last_dividend["amount"] = values[0]
+    for value in values[1:]:
+        try:
+            last_dividend["date"] = datetime.strptime(value, "%d.%m.%y")
+        except ValueError as e:
+            print(e)
+            last_dividend["date"] = value
+    return last_dividend
+
+
+def parse_composition(html: str) -> list:
+    """Composition of an asset (amChartData of its portfolio chart), None if the
+    page has no portfolio chart"""
+    start = html.find('id="portfolio"')
+    key = html.find('"amChartData":', start)
+    if start < 0 or key < 0:
+        print("No portfolio chart data")
+        return None
+    chart_data, _ = json.JSONDecoder().raw_decode(
+        html, html.index("[", key + len('"amChartData":'))
+    )
+    return chart_data
@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Union
+
+# Periods relative to the as-of date, the previous calendar year is named
+# after its year, e.g. "2023"
+ROLLING_PERIODS = {
+    "1week": timedelta(weeks=1),
+    "1month": timedelta(30),
+    "3months": timedelta(91),
+    "6months": timedelta(184),
+}
+YEARS_PERIODS = {"1year": 1, "3years": 3, "5years": 5}
+
+
+def last_year(as_of: date = None) -> str:
+    """Name of the period of the previous calendar year"""
+    return f"{(as_of or date.today()).year - 1}"
+
+
+def period_names(as_of: date = None) -> list:
+    """Names of the usual periods at the as-of date (today by default)"""
+    return [
+        "inception",
+        last_year(as_of),
+        "ytd",
+        *ROLLING_PERIODS,
+        *YEARS_PERIODS,
+    ]
+
+
+def years_before(day: date, years: int) -> date:
+    """Same day, years before. 29 February becomes 28 February."""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
+@lru_cache(maxsize=1024)
+def _period_bounds(period: Union[str, tuple], as_of: date) -> tuple:
+    if isinstance(period, tuple):
+        start, end = period
+        return (
+            date.fromisoformat(str(start)) if start else None,
+            date.fromisoformat(str(end)) if end else None,
+        )
+    if period == "inception":
+        return None, None
+    if period == "ytd":
+        return date(as_of.year, 1, 1), date(as_of.year, 12, 31)
+    if period in ROLLING_PERIODS:
+        return as_of - ROLLING_PERIODS[period], as_of
+    if period in YEARS_PERIODS:
+        return years_before(as_of, YEARS_PERIODS[period]), as_of
+    if period.isdecimal() and len(period) == 4:
+        # calendar year
+        return date(int(period), 1, 1), date(int(period), 12, 31)
+    if ":" in period:
+        # custom range "YYYY-MM-DD:YYYY-MM-DD", a bound can be omitted
+        return _period_bounds(tuple(period.split(":", 1)), as_of)
+    raise ValueError(f"{period}: unknown period")
+
+
+def period_bounds(period: Union[str, tuple], as_of: date = None) -> tuple:
+    """First and last days (included) of a period at the as-of date, today by default.
+    A bound is None when the period is not bounded.
+    The period is one of period_names(), a year e.g. "2021",
+    or a custom range: "2021-03-01:2022-02-28" or (start, end)."""
+    return _period_bounds(period, as_of or date.today())
+
+
+def period_filter(period: Union[str, tuple], as_of: date = None) -> str:
+    """SQL filter on the date column selecting a period"""
+    start, end = period_bounds(period, as_of)
+    conditions = []
+    if start:
+        conditions.append(f"date >= '{start}'")
+    if end:
+        conditions.append(f"date < '{end + timedelta(days=1)}'")
+    return f"where {' and '.join(conditions)}" if conditions else ""
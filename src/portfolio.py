@@ -1,221 +1,475 @@
 from datetime import date
-from math import floor
 from pathlib import Path
 from typing import Union
 
 import duckdb
+import numpy as np
 import pandas as pd
-import srsly
 from attrs import define, field
-from icecream import ic
-from pyxirr import xirr, xnpv
 from src.data_extraction import (
-    DATE_FORMAT,
-    TODAY,
-    Asset,
-    compute_perf,
-    get_current_asset_data,
-    map_period_to_filter,
+    EPOCH,
+    Quotations,
+    load_assets,
+    perf_matrix,
 )
+from src.metadata_cache import MetadataCache, default_metadata_cache
+from src.operations_import import ImportReport, import_operations
+from src.operations_store import OperationsStore
+from src.periods import last_year, period_bounds, period_filter
+from src.positions import compute_positions, position_totals
+from src.valuation import (
+    ValuationMatrix,
+    price_column,
+    quantity_matrix,
+    valuation_matrix,
+)
+from src.xirr import batch_xirr
 
 
 @define
 class Portfolio:
     name: str
+    max_workers: int = 8
     jsonl_ptf_path: str = field(init=False)
     csv_ptf_path: str = field(init=False)
-    dict_of_assets: dict = field(init=False)
-    operations_df: pd.DataFrame = field(init=False)
+    db_ptf_path: str = field(init=False)
+    # Assets and operations are loaded from the portfolio files when not given
+    dict_of_assets: dict = None
+    operations_df: pd.DataFrame = None
+    load_timings: dict = field(factory=dict, init=False)
+    # Asset data cached between runs, the followed assets are scraped only
+    # when their cached fields are stale
+    metadata_cache: MetadataCache = default_metadata_cache
+    # Operations are saved in the store only when they were loaded from it
+    operations_store: OperationsStore = field(default=None, init=False)
+    # Reason of the IRR that could not be solved, by (isin or "portfolio", period)
+    irr_failures: dict = field(factory=dict, init=False)
     _assets_summary: pd.DataFrame = None
+    # One summary line by isin, sold assets included
+    _asset_lines: pd.DataFrame = None
+    _valuation: ValuationMatrix = None
+    # Long format of the valuation, built from it when read
     _asset_values: pd.DataFrame = None
     _portfolio_summary: pd.DataFrame = None
 
     def __attrs_post_init__(self):
         self.jsonl_ptf_path = f"data/jsonl/{self.name}.jsonl"
         self.csv_ptf_path = f"data/operations/{self.name}.csv"
-        self.dict_of_assets = (
-            {
-                a["isin"]: Asset.from_boursorama(get_current_asset_data(a["url"]))
-                for a in srsly.read_jsonl(self.jsonl_ptf_path)
-            }
-            if Path(self.jsonl_ptf_path).is_file()
-            else {}
-        )
-        self.operations_df = self.load_operations()
-        # duckdb cannot request directly on class attribute
-        distinct_isins = self.operations_df["isin"].unique()
-        self.dict_of_assets.update(
-            {
-                isin: Asset.from_boursorama(get_current_asset_data(isin))
-                for isin in distinct_isins
-            }
+        self.db_ptf_path = f"data/operations/{self.name}.duckdb"
+        if self.operations_df is None:
+            self.operations_df = self.load_operations()
+        if self.dict_of_assets is not None:
+            return
+        self.dict_of_assets, self.load_timings = load_assets(
+            self.asset_queries(), self.max_workers, self.metadata_cache
         )
 
+    def asset_queries(self) -> dict:
+        """Query of each asset of the portfolio, by isin (see load_assets).
+        Followed assets are scraped from their url, the other assets
+        of the operations from their isin. Each asset is scraped once."""
+        queries = {}
+        if Path(self.jsonl_ptf_path).is_file():
+            import srsly
+
+            followed = list(srsly.read_jsonl(self.jsonl_ptf_path))
+            queries = {a["isin"]: a["url"] for a in followed}
+            if self.metadata_cache is not None:
+                # The saved data is as old as the jsonl file
+                self.metadata_cache.seed(
+                    followed, Path(self.jsonl_ptf_path).stat().st_mtime
+                )
+        for isin in self.operations_df["isin"].unique():
+            queries.setdefault(isin, isin)
+        return queries
+
     def load_operations(self) -> pd.DataFrame:
-        """Initialize or read a csv file to get a
-        dataframe containing the operations"""
-        db_exists = Path(self.csv_ptf_path).is_file()
+        """Read the operations of the portfolio, the operations of a former csv
+        file are imported in its store the first time"""
+        if self.operations_store is None:
+            self.operations_store = OperationsStore(self.db_ptf_path, self.csv_ptf_path)
+        return self.operations_store.read()
+
+    @property
+    def assets_summary(self) -> pd.DataFrame:
+        """"""
+        if self._assets_summary is None and len(self.operations_df) > 0 :
+            if self._asset_lines is None:
+                self._asset_lines = self.summarize_assets(self.operations_df)
+            self._assets_summary = self.owned_assets(self._asset_lines)
+        return self._assets_summary
 
-        if not db_exists:
+    def summarize_assets(
+        self, operations: pd.DataFrame, guess: Union[float, np.ndarray] = 0.1
+    ) -> pd.DataFrame:
+        """One summary line by isin of the operations, sold assets included.
+        guess: starting point of the IRR since inception, e.g. a previous value"""
+        year = last_year()
+        df = operations.sort_values("date", kind="stable")
+        # Quantities and dividends of all the assets at once
+        positions = compute_positions(df)
+        df["cumulative_quantity"] = positions["cumulative_quantity"]
+        totals = position_totals(positions).reindex(df["isin"].unique(), fill_value=0)
+        assets = []
+        perf_columns = {
+            "ytd": "Perf ytd",
+            year: f"Perf {year}",
+            "1month": "Perf 1m",
+            "6months": "Perf 6m",
+            "1year": "Perf 1y",
+            "3years": "Perf 3y",
+            "5years": "Perf 5y",
+        }
+        # Performances of all the assets over all the periods at once
+        perfs = perf_matrix(
+            [self.dict_of_assets[isin] for isin in df["isin"].unique()],
+            list(perf_columns),
+        ).rename(columns=perf_columns)
+        # Cashflows of all the assets and periods at once
+        periods = ["ytd", year, "inception"]
+        cashflows = self.compute_cashflows(
+            df,
+            {
+                isin: self.dict_of_assets[isin].quotations
+                for isin in df["isin"].unique()
+            },
+            periods,
+        )
+        irrs = self.compute_irrs(cashflows, guess).reindex(df["isin"].unique())
+        # Invested amount: every cashflow since inception but the valuation, the
+        # last row of an isin without operation (none without quotations)
+        inception = cashflows.loc[cashflows["period"] == "inception"]
+        valuation_rows = inception["operation"].isna() & ~inception[
+            "isin"
+        ].duplicated(keep="last")
+        invested = -(
+            inception.loc[~valuation_rows]
+            .groupby("isin", sort=False)["cashflow"]
+            .sum()
+            .round(2)
+        )
+        for isin, isin_df in df.groupby("isin", sort=False):
+            isin_df = isin_df.reset_index(drop=True)
+            quantity = totals.at[isin, "quantity"]
+            total_dividends = totals.at[isin, "total dividends"]
 
-            operations = pd.DataFrame(
-                {
-                    column_name: []
-                    for column_name in [
-                        "name",
-                        "isin",
-                        "date",
-                        "operation",
-                        "quantity",
-                        "value",
-                        "fees",
-                    ]
-                }
+            summary = {
+                "name": self.dict_of_assets[isin].name,
+                "isin": isin,
+                "asset": self.dict_of_assets[isin].asset,
+                "quantity": quantity,
+                "daily variation": self.dict_of_assets[isin].variation,
+                "currency": self.dict_of_assets[isin].currency,
+                "latest": self.dict_of_assets[isin].latest,
+                "total dividends": total_dividends,
+                **irrs.loc[isin],
+                "Total invested amount": invested.get(isin, 0),
+                **perfs.loc[isin],
+                "operations": isin_df,
+            }
+            summary["valuation"] = summary["quantity"] * summary["latest"]
+            summary["Capital gain"] = (
+                summary["valuation"] - summary["Total invested amount"]
             )
-
-            operations = pd.DataFrame(
-                {
-                    column_name: []
-                    for column_name in [
-                        "name",
-                        "isin",
-                        "date",
-                        "operation",
-                        "quantity",
-                        "value",
-                        "fees",
-                    ]
-                }
+            summary["Capital gain (%)"] = (
+                100
+                * (summary["valuation"] - summary["Total invested amount"])
+                / summary["Total invested amount"]
             )
+
+            assets.append(summary)
+        return pd.DataFrame(assets)
+
+    def owned_assets(self, asset_lines: pd.DataFrame) -> pd.DataFrame:
+        """Summary of the assets we currently own, with their proportion"""
+        assets_summary = asset_lines.copy()
+        assets_summary["proportion (%)"] = round(
+            100 * assets_summary["valuation"] / assets_summary["valuation"].sum(),
+            2,
+        )
+        # Keep only assets we currently own
+        assets_summary = assets_summary.loc[assets_summary["valuation"] > 0]
+        # Reorder columns
+        cols = list(assets_summary.columns)
+        cols = cols[23:] + cols[0:12] + cols[20:23] + cols[12:20]
+        return assets_summary[cols]
+
+    def add_operation(self, operation: dict) -> int:
+        """Add an operation (name, isin, date, operation, quantity, value, fees)
+        and update the summaries of its asset only. Return the id of the operation."""
+        if self.operations_store is not None:
+            operation_id = self.operations_store.add(operation)
         else:
-            operations = pd.read_csv(self.csv_ptf_path)
-            operations["date"] = pd.to_datetime(operations["date"]).dt.strftime(
-                DATE_FORMAT
+            operation_id = (
+                int(self.operations_df["id"].max()) + 1
+                if "id" in self.operations_df and len(self.operations_df) > 0
+                else 1
             )
-            operations = duckdb.sql(
-                """
-                select row_number() over(order by date, isin, name) as id,
-                * from operations ORDER BY id, date, name, isin DESC """
-            ).df()
-        return operations
+        self.operations_df = pd.concat(
+            [self.operations_df, pd.DataFrame([{"id": operation_id, **operation}])],
+            ignore_index=True,
+        )
+        self.update_asset(operation["isin"])
+        return operation_id
 
-    @property
-    def assets_summary(self) -> pd.DataFrame:
-        """"""
-        if self._assets_summary is None and len(self.operations_df) > 0 :
-            df = self.operations_df.copy()
-            assets = []
-            for isin in df["isin"].unique():
-                isin_df = duckdb.sql(
-                    f"""
-                select * from df where isin = '{isin}'
-                order by date"""
-                ).df()
-                quantity, total_dividends, isin_df["cumulative_quantity"] = (
-                    self.get_asset_quantity(isin_df)
-                )
+    def import_operations(self, source, **options) -> ImportReport:
+        """Import the operations of a broker export (csv or parquet) in the store,
+        see src.operations_import.import_operations for the options.
+        The assets of new isins are loaded and the summaries are computed again."""
+        if self.operations_store is None:
+            self.operations_store = OperationsStore(self.db_ptf_path, self.csv_ptf_path)
+        report = import_operations(source, self.operations_store, **options)
+        if report.imported == 0:
+            return report
+        self.operations_df = self.operations_store.read()
+        new_isins = set(self.operations_df["isin"].unique()) - set(self.dict_of_assets)
+        if new_isins:
+            assets, timings = load_assets(
+                {isin: isin for isin in new_isins},
+                self.max_workers,
+                self.metadata_cache,
+            )
+            self.dict_of_assets.update(assets)
+            self.load_timings.update(timings)
+        self._asset_lines = None
+        self._assets_summary = None
+        self._valuation = None
+        self._asset_values = None
+        self._portfolio_summary = None
+        return report
 
-                cashflows_dict = {
-                    period: self.get_cashflow_df(
-                        isin_df,
-                        self.dict_of_assets[isin].quotations[period],
-                        period,
-                        isin,
-                    )
-                    for period in ["ytd", f"{TODAY.year-1}", "inception"]
-                }
+    def remove_operation(self, operation_id: int):
+        """Remove an operation by id and update the summaries of its asset only"""
+        if self.operations_store is not None:
+            self.operations_store.remove(operation_id)
+        removed = self.operations_df["id"] == operation_id
+        isins = self.operations_df.loc[removed, "isin"].unique()
+        self.operations_df = self.operations_df.loc[~removed].reset_index(drop=True)
+        for isin in isins:
+            self.update_asset(isin)
 
-                summary = {
-                    "name": self.dict_of_assets[isin].name,
-                    "isin": isin,
-                    "asset": self.dict_of_assets[isin].asset,
-                    "quantity": quantity,
-                    "daily variation": self.dict_of_assets[isin].variation,
-                    "currency": self.dict_of_assets[isin].currency,
-                    "latest": self.dict_of_assets[isin].latest,
-                    "total dividends": total_dividends,
-                    "IRR ytd": self.compute_xirr_pv(
-                        cashflows_dict["ytd"], period="ytd"
-                    ),
-                    f"IRR {TODAY.year-1}": self.compute_xirr_pv(
-                        cashflows_dict[f"{TODAY.year-1}"], period=f"{TODAY.year-1}"
-                    ),
-                    "IRR since 1st buy": self.compute_xirr_pv(
-                        cashflows_dict["inception"], period="inception"
-                    ),
-                    "Total invested amount": self.compute_xirr_pv(
-                        cashflows_dict["inception"], period="inception", invested=True
-                    ),
-                    "Perf ytd": compute_perf(
-                        self.dict_of_assets[isin].quotations["ytd"]
-                    ),
-                    f"Perf {TODAY.year-1}": compute_perf(
-                        self.dict_of_assets[isin].quotations[f"{TODAY.year-1}"]
-                    ),
-                    "Perf 1m": compute_perf(
-                        self.dict_of_assets[isin].quotations["1month"]
-                    ),
-                    "Perf 6m": compute_perf(
-                        self.dict_of_assets[isin].quotations["6months"]
-                    ),
-                    "Perf 1y": compute_perf(
-                        self.dict_of_assets[isin].quotations["1year"]
-                    ),
-                    "Perf 3y": compute_perf(
-                        self.dict_of_assets[isin].quotations["3years"]
-                    ),
-                    "Perf 5y": compute_perf(
-                        self.dict_of_assets[isin].quotations["5years"]
-                    ),
-                    "operations": isin_df,
+    def update_asset(self, isin: str):
+        """Recompute the summary line and the values of one asset after a change
+        of its operations, the other assets are kept"""
+        if isin not in self.dict_of_assets:
+            assets, timings = load_assets(
+                {isin: isin}, self.max_workers, self.metadata_cache
+            )
+            self.dict_of_assets.update(assets)
+            self.load_timings.update(timings)
+        self._portfolio_summary = None
+        # The failures of the asset are those of its new operations
+        for key in [key for key in self.irr_failures if key[0] == isin]:
+            del self.irr_failures[key]
+        if self._asset_lines is None:
+            # Nothing computed yet
+            return
+        lines = self._asset_lines
+        previous = lines.loc[lines["isin"] == isin]
+        operations = self.operations_df.loc[self.operations_df["isin"] == isin]
+        line = (
+            self.summarize_assets(
+                operations,
+                # Start from the previous IRR
+                guess=(
+                    previous["IRR since 1st buy"].iloc[0] / 100
+                    if len(previous)
+                    else 0.1
+                ),
+            )
+            if len(operations)
+            else lines.iloc[:0]
+        )
+        lines = pd.concat([lines.loc[lines["isin"] != isin], line], ignore_index=True)
+        # Same order as a full computation: by date of the first operation
+        first_dates = lines["operations"].map(lambda df: df["date"].iloc[0])
+        self._asset_lines = lines.iloc[
+            np.argsort(first_dates.to_numpy(), kind="stable")
+        ].reset_index(drop=True)
+        self._assets_summary = (
+            self.owned_assets(self._asset_lines) if len(self._asset_lines) else None
+        )
+        if self._valuation is not None:
+            self.update_asset_values(isin)
+
+    def refresh_quotes(self) -> list:
+        """Update the latest price, daily variation and trade date of the assets
+        from the metadata cache, kept fresh by the quote refresher, and the
+        valuations of the assets whose quote changed. Returns their isins."""
+        if self.metadata_cache is None:
+            return []
+        changed = []
+        for isin, quote in self.metadata_cache.quotes(self.dict_of_assets).items():
+            asset = self.dict_of_assets[isin]
+            if all(getattr(asset, name) == value for name, value in quote.items()):
+                continue
+            for name, value in quote.items():
+                setattr(asset, name, value)
+            changed.append(isin)
+        if not changed or self._asset_lines is None:
+            return changed
+        # The IRRs and performances use the closes of the quotations: only the
+        # columns of the latest price are updated
+        lines = self._asset_lines.copy()
+        rows = lines["isin"].isin(changed)
+        assets = lines.loc[rows, "isin"].map(self.dict_of_assets)
+        lines.loc[rows, "latest"] = assets.map(lambda asset: asset.latest)
+        lines.loc[rows, "daily variation"] = assets.map(lambda asset: asset.variation)
+        lines["valuation"] = lines["quantity"] * lines["latest"]
+        lines["Capital gain"] = lines["valuation"] - lines["Total invested amount"]
+        lines["Capital gain (%)"] = (
+            100 * lines["Capital gain"] / lines["Total invested amount"]
+        )
+        self._asset_lines = lines
+        self._assets_summary = self.owned_assets(lines)
+        if self._portfolio_summary is not None:
+            # A new frame: the previous one may be displayed
+            summary = self._portfolio_summary.assign(
+                **{
+                    "valuation": self._assets_summary["valuation"].sum(),
+                    "Capital gain": self._assets_summary["Capital gain"].sum(),
                 }
-                summary["valuation"] = summary["quantity"] * summary["latest"]
-                summary["Capital gain"] = (
-                    summary["valuation"] - summary["Total invested amount"]
-                )
-                summary["Capital gain (%)"] = (
-                    100
-                    * (summary["valuation"] - summary["Total invested amount"])
-                    / summary["Total invested amount"]
+            )
+            summary["Capital gain (%)"] = (
+                100
+                * (summary["valuation"] - summary["Total invested amount"])
+                / summary["Total invested amount"]
+            )
+            self._portfolio_summary = summary
+        if self._valuation is not None:
+            self._asset_values = None
+            if int(self._valuation.days[-1]) == (date.today() - EPOCH).days:
+                # Today is valued at the latest prices, like the summaries
+                self._valuation = self._valuation.with_last_prices(
+                    {isin: self.dict_of_assets[isin].latest for isin in changed}
                 )
+            else:
+                # Built on a previous day
+                self._valuation = None
+        return changed
 
-                assets.append(summary)
+    def get_asset_quantity(self, df: pd.DataFrame, limit_day: date = None):
+        """Get the total number of parts of an asset and the total dividends earned
+        until limit_day (today by default)"""
+        positions = compute_positions(df.assign(isin=""), limit_day)
+        tracking = positions["cumulative_quantity"].tolist()
+        return (
+            tracking[-1] if tracking else 0,
+            positions["dividend"].sum(),
+            tracking,
+        )
 
-            self._assets_summary = pd.DataFrame(assets)
-            self._assets_summary["proportion (%)"] = round(
-                100
-                * self._assets_summary["valuation"]
-                / self._assets_summary["valuation"].sum(),
-                2,
+    def compute_cashflows(
+        self, operations: pd.DataFrame, quotations: dict, periods: list
+    ) -> pd.DataFrame:
+        """Cashflows of every asset and period, in one query partitioned by isin.
+        operations: operations with their cumulative_quantity
+        quotations: Quotations, or quotations (date, c) dataframes, by isin
+        For each asset and period, the position held before the first day of the
+        period (or of the quotations) is bought at its close, the operations of the
+        period are cashflows, and the position held at the last day of the period
+        (today at the latest) is sold at its close. The quotations may have trading
+        days only: the close of a day is the close of its last quotation.
+        The operation cashflows are computed once, periods are slices of them."""
+        # Periods end today at the latest
+        today = date.today()
+        bounds = pd.DataFrame(
+            [
+                (period, start or date.min, min(end or today, today))
+                for period in periods
+                for start, end in [period_bounds(period)]
+            ],
+            columns=["period", "start_date", "end_date"],
+        )
+        # First and last day of each period within the quotations of each asset,
+        # and their closes: the close of the last quotation on or before the day
+        starts = bounds["start_date"].to_numpy(dtype="datetime64[D]")
+        ends = bounds["end_date"].to_numpy(dtype="datetime64[D]")
+        columns = {
+            "isin": [np.array([], dtype=object)],
+            "period": [np.array([], dtype=object)],
+            "first_date": [np.array([], dtype="datetime64[us]")],
+            "first_value": [np.array([], dtype="float64")],
+            "last_date": [np.array([], dtype="datetime64[us]")],
+            "last_value": [np.array([], dtype="float64")],
+        }
+        for isin, quotes in quotations.items():
+            if isinstance(quotes, Quotations):
+                # The arrays of the quotations, without dataframe
+                days, closes = quotes.days.astype("datetime64[D]"), quotes.closes
+            else:
+                days = quotes["date"].to_numpy(dtype="datetime64[D]")
+                closes = quotes["c"].to_numpy(dtype="float64")
+            if len(days) == 0:
+                continue
+            first_dates = np.maximum(starts, days[0])
+            found = first_dates <= ends
+            columns["isin"].append(np.repeat(isin, found.sum()))
+            columns["period"].append(bounds["period"].to_numpy()[found])
+            columns["first_date"].append(first_dates[found].astype("datetime64[us]"))
+            columns["first_value"].append(
+                closes[np.searchsorted(days, first_dates[found], side="right") - 1]
             )
-            # Keep only assets we currently own
-            self._assets_summary = self._assets_summary.loc[
-                self._assets_summary["valuation"] > 0
-            ]
-            # Reorder columns
-            cols = list(self._assets_summary.columns)
-            cols = cols[23:] + cols[0:12] + cols[20:23] + cols[12:20]
-            self._assets_summary = self._assets_summary[cols]
-        return self._assets_summary
+            columns["last_date"].append(ends[found].astype("datetime64[us]"))
+            columns["last_value"].append(
+                closes[np.searchsorted(days, ends[found], side="right") - 1]
+            )
+        period_quotes = pd.DataFrame(
+            {column: np.concatenate(values) for column, values in columns.items()}
+        )
+        operations = operations.assign(seq=np.arange(len(operations)))
+        return duckdb.sql(
+            """
+            with ops as (
+            select isin, cast(date as DATE) as date, seq, operation,
+            (CASE WHEN operation = 'Dividend' THEN cumulative_quantity
+            ELSE quantity END) as quantity,
+            value, cumulative_quantity,
+            (CASE
+            WHEN operation = 'Buy' THEN -quantity*value
+            WHEN operation = 'Sell' THEN quantity*value
+            WHEN operation = 'Dividend' THEN cumulative_quantity*value
+            ELSE 0
+            END) as cashflow
+            from operations),
+
+            daily_positions as (
+            select isin, date, arg_max(cumulative_quantity, seq) as cumulative_quantity
+            from ops group by isin, date),
 
-    def get_asset_quantity(self, df: pd.DataFrame, limit_day: date = TODAY):
-        """Get the total number of parts of an asset and the total dividends earned"""
-        quantity = 0
-        total_dividends = 0
-        tracking = []
-        for op in df.itertuples(index=False, name="Row"):
-            if op.date > str(limit_day):
-                break
-            elif op.operation == "Buy":
-                quantity += op.quantity
-            elif op.operation == "Sell":
-                quantity -= op.quantity
-            elif op.operation == "Split":
-                quantity = floor(op.value * quantity)
-            elif op.operation == "Dividend":
-                total_dividends += quantity * op.value
-            tracking.append(quantity)
-        return quantity, total_dividends, tracking
+            pq as (
+            select isin, period, cast(first_date as DATE) as first_date, first_value,
+            cast(last_date as DATE) as last_date, last_value
+            from period_quotes),
+
+            opening as (
+            select pq.*, p.cumulative_quantity as quantity
+            from pq asof left join daily_positions p
+            on pq.isin = p.isin and pq.first_date > p.date),
+
+            closing as (
+            select pq.*, p.cumulative_quantity as quantity
+            from pq asof left join daily_positions p
+            on pq.isin = p.isin and pq.last_date >= p.date)
+
+            select isin, period, date, operation, quantity, value, cashflow from (
+            select isin, period, first_date as date, NULL as operation,
+            quantity, first_value as value,
+            -COALESCE(quantity, 0)*first_value as cashflow, 0 as kind, 0 as seq
+            from opening
+            union all
+            select o.isin, b.period, o.date, o.operation, o.quantity, o.value,
+            o.cashflow, 1 as kind, o.seq
+            from ops o join bounds b
+            on o.date >= b.start_date and o.date <= b.end_date
+            union all
+            select isin, period, last_date as date, NULL as operation,
+            quantity, last_value as value,
+            quantity*last_value as cashflow, 2 as kind, 0 as seq
+            from closing)
+            order by isin, period, date, kind, seq
+            """
+        ).df()
 
     def get_cashflow_df(
         self,
@@ -225,44 +479,12 @@ class Portfolio:
         isin: Union[str, None] = None,
     ) -> pd.DataFrame:
         if isin:
-            cashflows_df = duckdb.sql(
-                f"""
-                with first_last_quotations as (
-                select * from (select
-                date,
-                c as value,
-                row_number() over(order by date) as rn,
-                count(*) over() as total_count
-                from quotations
-                order by date)
-                full join operations
-                using (date, value)
-                where rn = 1 or rn = total_count or rn is null
-                order by date),
-
-                lag_df as (select *,
-                COALESCE(quantity, lag(quantity) over(order by date)) as quantity_,
-                COALESCE(cumulative_quantity,
-                lag(cumulative_quantity) over(order by date)) as cumulative_quantity_
-                from first_last_quotations flq
-
-                order by date)
-
-                select date, operation, quantity_ as quantity, value,
-                (CASE
-                WHEN operation = 'Buy' THEN -quantity_*value
-                WHEN operation = 'Split' THEN 0
-                WHEN operation IS NULL and rn=1 THEN -COALESCE(cumulative_quantity_,
-                0)*value
-                WHEN operation IS NULL and rn!=1 THEN COALESCE(cumulative_quantity_,
-                lag(cumulative_quantity_) over(order by date))*value
-                ELSE quantity_*value
-                END) as cashflow
-                from lag_df
-                {map_period_to_filter.get(period, '')}
-
-                """
-            ).df()
+            cashflows_df = (
+                self.compute_cashflows(
+                    operations.assign(isin=isin), {isin: quotations}, [period]
+                )
+                .drop(columns=["isin", "period"])
+            )
         else:
             # Whole portfolio
             cashflows_df = duckdb.sql(
@@ -277,7 +499,7 @@ class Portfolio:
                     row_number() over(order by date) as rn,
                     count(*) over() as total_count
                     from quotations
-                    {map_period_to_filter.get(period, '')}
+                    {period_filter(period)}
                     group by date)
                     where rn = 1 or rn = total_count or rn is null
                     order by date),
@@ -294,13 +516,75 @@ class Portfolio:
                     select date, cashflow from cashflows
                     full outer join first_last_quotations
                     using (date, cashflow)
-                    {map_period_to_filter.get(period, '')}
+                    {period_filter(period)}
                     order by date
                     """
             ).df()
 
         return cashflows_df
 
+    def irr_cashflows(
+        self,
+        dates: np.ndarray,
+        cashflows: np.ndarray,
+        period: str = "inception",
+        test=False,
+    ) -> tuple:
+        """Dates and amounts of the cashflows used to compute an IRR.
+        For ytd, the valuation is dated at the end of the year."""
+        dates = np.array(dates, dtype="datetime64[D]")
+        if period == "ytd" and len(dates):
+            current_year = 2024 if test else date.today().year
+            dates[-1] = np.datetime64(f"{current_year}-12-31")
+        return dates, np.asarray(cashflows, dtype="float64")
+
+    def compute_irrs(self, cashflows: pd.DataFrame, guess: float = 0.1) -> pd.DataFrame:
+        """IRR (%) ytd, last year and since inception by isin, from the cashflows
+        of compute_cashflows, solved in two batches. The rates since inception are
+        the starting points of the other periods.
+        Failures are NaN and their reason is recorded in irr_failures."""
+        year = last_year()
+        periods = ["inception", "ytd", year]
+        isins = cashflows["isin"].unique()
+        dates = cashflows["date"].to_numpy(dtype="datetime64[D]")
+        amounts = cashflows["cashflow"].to_numpy(dtype="float64")
+        # Positions of the rows of each (isin, period)
+        rows = cashflows.groupby(["isin", "period"], sort=False).indices
+        no_rows = np.array([], dtype=np.int64)
+
+        def series(period: str) -> list:
+            return [
+                self.irr_cashflows(
+                    dates[rows.get((isin, period), no_rows)],
+                    amounts[rows.get((isin, period), no_rows)],
+                    period,
+                )
+                for isin in isins
+            ]
+
+        inception = batch_xirr(series("inception"), guess)
+        others = batch_xirr(
+            series("ytd") + series(year), np.tile(inception.rate, len(periods) - 1)
+        )
+        rates = np.concatenate([inception.rate, others.rate]).reshape(len(periods), -1)
+        reasons = np.concatenate([inception.reason, others.reason]).reshape(
+            len(periods), -1
+        )
+        for period, period_reasons in zip(periods, reasons):
+            for isin, reason in zip(isins, period_reasons):
+                if reason:
+                    self.irr_failures[(isin, period)] = reason
+                else:
+                    self.irr_failures.pop((isin, period), None)
+        return pd.DataFrame(
+            {
+                "IRR ytd": 100 * rates[1],
+                f"IRR {year}": 100 * rates[2],
+                "IRR since 1st buy": 100 * rates[0],
+            },
+            index=isins,
+        )
+
     def compute_xirr_pv(
         self,
         cashflows_df: pd.DataFrame,
@@ -308,87 +592,93 @@ class Portfolio:
         invested: bool = False,
         test=False,
     ):
-        try:
-            if invested:
-                invested_amount = round(-(cashflows_df["cashflow"].iloc[:-1].sum()), 2)
-                return invested_amount
-            else:
-                if period == "ytd":
-                    current_year = 2024 if test else TODAY.year
-                    cashflows_df.at[len(cashflows_df.index) - 1, "date"] = date(
-                        year=current_year, month=12, day=31
+        """IRR (%) of cashflows, NaN when it cannot be solved,
+        or the invested amount if invested"""
+        if invested:
+            invested_amount = round(-(cashflows_df["cashflow"].iloc[:-1].sum()), 2)
+            return invested_amount
+        return (
+            100
+            * batch_xirr(
+                [
+                    self.irr_cashflows(
+                        cashflows_df["date"], cashflows_df["cashflow"], period, test
                     )
-            irr = xirr(cashflows_df["date"], cashflows_df["cashflow"]) * 100
-            return irr
-        except Exception as e:
-            print(e)
-            return 0
+                ]
+            ).rate[0]
+        )
 
     @property
-    def asset_values(self):
-        """"""
-        if self._asset_values is None and len(self.operations_df)>0:
-            isins = self.operations_df["isin"].unique()
-            all_quotations_df = []
-            for isin in isins:
-                isin_df = self.dict_of_assets[isin].quotations["inception"].copy()
-                all_quotations_df.append(
-                    duckdb.sql(
-                        f""" select *, '{self.dict_of_assets[isin].name}' as name from isin_df
-                """
-                    ).df()
-                )
-
-            all_quotations_df = pd.concat(all_quotations_df)
-            # can't join on operation_df, because we need cumulative quantities.
+    def valuation(self) -> ValuationMatrix:
+        """Prices and quantities of the owned assets on every day since the first
+        operation of these assets"""
+        if self._valuation is None and len(self.operations_df) > 0:
+            # can't use operation_df, because we need cumulative quantities.
             cum_quantities_df = pd.concat(
                 [df for df in self.assets_summary["operations"]]
             )
-            all_quotations_df["date"] = pd.to_datetime(
-                all_quotations_df["date"]
-            ).dt.date
-
-            # Fill null value with last non null value for each asset
-            self._asset_values = duckdb.sql(
-                """
-                with grouped as (
-                select date, name, c,
-                cumulative_quantity,
-                count(cumulative_quantity) over(partition by name order by date) as grouper
-                from all_quotations_df aqdf
-                left join cum_quantities_df cqdf
-                using(date, name)
-                where date >= (select min(date) from cum_quantities_df)
-                order by date
-                )
-                select * from (select date, name,
-                max(cumulative_quantity)
-                over(partition by name, grouper
-                order by date)*c as value
-                from grouped
-                order by date)
-                """
-            ).df()
-            self._asset_values["date"] = pd.to_datetime(
-                self._asset_values["date"]
-            ).dt.date
+            self._valuation = valuation_matrix(
+                cum_quantities_df,
+                {
+                    isin: self.dict_of_assets[isin].quotations
+                    for isin in cum_quantities_df["isin"].unique()
+                },
+                date.fromisoformat(str(cum_quantities_df["date"].min())[:10]),
+            )
+        return self._valuation
+
+    @property
+    def nav(self) -> pd.DataFrame:
+        """Daily net asset value (date, value) of the owned assets"""
+        return self.valuation.nav() if self.valuation is not None else None
+
+    @property
+    def asset_values(self):
+        """Daily value (date, name, value) of each owned asset, for the charts"""
+        if self._asset_values is None and self.valuation is not None:
+            self._asset_values = self.valuation.long(
+                [self.dict_of_assets[isin].name for isin in self.valuation.isins]
+            )
         return self._asset_values
 
+    def update_asset_values(self, isin: str):
+        """Replace the prices and quantities of one asset in the valuation matrix.
+        The others are kept unless the first date of the owned assets changes."""
+        self._asset_values = None
+        owned = self.assets_summary if self._assets_summary is not None else None
+        if owned is None:
+            self._valuation = None
+            return
+        start_date = min(df["date"].min() for df in owned["operations"])
+        if (date.fromisoformat(str(start_date)[:10]) - EPOCH).days != int(
+            self._valuation.days[0]
+        ):
+            # Every asset is valued from the new first date
+            self._valuation = None
+            return
+        if isin in set(owned["isin"]):
+            operations = owned.loc[owned["isin"] == isin, "operations"].iloc[0]
+            days = self._valuation.days
+            self._valuation.replace(
+                isin,
+                price_column(self.dict_of_assets[isin].quotations, days),
+                quantity_matrix(operations, days, [isin])[:, 0],
+            )
+        else:
+            self._valuation.drop(isin)
+
     @property
     def portfolio_summary(self):
         """"""
         if self._portfolio_summary is None and len(self.operations_df) > 0:
+            year = last_year()
             cum_quantities_df = pd.concat(
                 [df for df in self.assets_summary["operations"]]
             )
-            cashflows_dict = {
-                period: self.get_cashflow_df(
-                    cum_quantities_df,
-                    self.asset_values,
-                    period,
-                )
-                for period in ["ytd", f"{TODAY.year-1}", "inception"]
-            }
+            cashflows = pd.concat(
+                self.get_cashflow_df(cum_quantities_df, self.nav, period).assign(isin="portfolio", period=period)
+                for period in ["ytd", year, "inception"]
+            )
             ptf_summary = {
                 "Lines number": len(self.assets_summary),
                 "valuation": self.assets_summary["valuation"].sum(),
@@ -397,13 +687,11 @@ class Portfolio:
                 "Total invested amount": self.assets_summary[
                     "Total invested amount"
                 ].sum(),
-                "IRR ytd": self.compute_xirr_pv(cashflows_dict["ytd"], period="ytd"),
-                f"IRR {TODAY.year-1}": self.compute_xirr_pv(
-                    cashflows_dict[f"{TODAY.year-1}"], period=f"{TODAY.year-1}"
-                ),
-                "IRR since 1st buy": self.compute_xirr_pv(
-                    cashflows_dict["inception"], period="inception"
-                ),
+                **self.compute_irrs(
+                    cashflows,
+                    # Start from the average IRR of the assets
+                    guess=self.assets_summary["IRR since 1st buy"].mean() / 100,
+                ).loc["portfolio"],
             }
             ptf_summary["Capital gain (%)"] = (
                 100
@@ -0,0 +1,76 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+def compute_positions(operations: pd.DataFrame, limit_day: date = None) -> pd.DataFrame:
+    """Quantity held after each operation (cumulative_quantity) and dividend earned
+    by each operation, for all the assets at once.
+    Operations after limit_day (today by default) are ignored. The result is grouped
+    by isin, in the order of the operations, and keeps the index of the operations.
+    A split multiplies the quantity by its value, rounded down."""
+    limit_day = limit_day or date.today()
+    days = pd.to_datetime(operations["date"]).to_numpy(dtype="datetime64[D]")
+    operations = operations.loc[days <= np.datetime64(limit_day, "D")]
+    codes = pd.factorize(operations["isin"])[0]
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    operation = operations["operation"].to_numpy()[order]
+    quantity = operations["quantity"].to_numpy(dtype="float64")[order]
+    value = operations["value"].to_numpy(dtype="float64")[order]
+
+    # Quantity added by each operation, splits are applied below
+    step = np.where(
+        operation == "Buy", quantity, np.where(operation == "Sell", -quantity, 0.0)
+    )
+    is_split = operation == "Split"
+    # Rank of the segment between two splits, within each isin
+    split_count = np.cumsum(is_split)
+    group_starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    group_sizes = np.diff(np.r_[group_starts, len(codes)])
+    segment = split_count - np.repeat(
+        split_count[group_starts] - is_split[group_starts], group_sizes
+    )
+
+    cumulative_quantity = np.empty(len(codes))
+    last_quantity = np.zeros(codes.max() + 1 if len(codes) else 0)
+    # Segments are chained: the quantity at a split depends on the previous segment.
+    # All the assets are processed at once for each segment rank.
+    for rank in range(segment.max() + 1 if len(codes) else 0):
+        rows = np.flatnonzero(segment == rank)
+        rows_codes = codes[rows]
+        rows_step = step[rows]
+        splits = is_split[rows]
+        rows_step[splits] = np.floor(
+            value[rows][splits] * last_quantity[rows_codes[splits]]
+        )
+        # Sequential sums, like adding the quantities one operation at a time
+        cumulative = pd.Series(rows_step).groupby(rows_codes).cumsum().to_numpy()
+        cumulative_quantity[rows] = cumulative
+        ends = np.flatnonzero(np.r_[rows_codes[1:] != rows_codes[:-1], True])
+        last_quantity[rows_codes[ends]] = cumulative[ends]
+
+    return pd.DataFrame(
+        {
+            "isin": operations["isin"].to_numpy()[order],
+            "date": operations["date"].to_numpy()[order],
+            "operation": operation,
+            "cumulative_quantity": cumulative_quantity,
+            "dividend": np.where(
+                operation == "Dividend", cumulative_quantity * value, 0.0
+            ),
+        },
+        index=operations.index[order],
+    )
+
+
+def position_totals(positions: pd.DataFrame) -> pd.DataFrame:
+    """Quantity held and total dividends earned by isin, from compute_positions"""
+    grouped = positions.groupby("isin", sort=False)
+    return pd.DataFrame(
+        {
+            "quantity": grouped["cumulative_quantity"].last(),
+            "total dividends": grouped["dividend"].sum(),
+        }
+    )
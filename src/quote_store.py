@@ -0,0 +1,87 @@
+from contextlib import contextmanager
+from threading import Lock
+from typing import Iterator, Union
+
+import duckdb
+import pandas as pd
+from attrs import define, field
+
+from src.duckdb_files import connect
+
+QUOTE_COLUMNS = ["d", "o", "h", "l", "c", "v"]
+
+
+@define
+class QuoteStore:
+    """On-disk store of the end-of-day quotations returned by boursorama.
+    Quotations are stored in a duckdb file, keyed by the boursorama symbol
+    and the day number (d: number of days since 1970-01-01)."""
+
+    path: str = "data/quotes.duckdb"
+    # The quotes table was created by this store
+    _created: bool = field(default=False, init=False)
+    _lock: Lock = field(factory=Lock, init=False)
+
+    @contextmanager
+    def connection(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Connection to the file, closed after each operation so that other
+        processes can use the store"""
+        with connect(self.path) as connection:
+            if not self._created:
+                connection.execute(
+                    """
+                    create table if not exists quotes (
+                    symbol VARCHAR,
+                    d INTEGER,
+                    o DOUBLE,
+                    h DOUBLE,
+                    l DOUBLE,
+                    c DOUBLE,
+                    v DOUBLE,
+                    PRIMARY KEY (symbol, d))"""
+                )
+                self._created = True
+            yield connection
+
+    def last_day(self, symbol: str) -> Union[int, None]:
+        """Return the last stored day number of a symbol, None if it is unknown"""
+        with self._lock, self.connection() as connection:
+            return connection.execute(
+                "select max(d) from quotes where symbol = ?", [symbol]
+            ).fetchone()[0]
+
+    def read(self, symbol: str) -> pd.DataFrame:
+        """Return the stored quotations of a symbol, ordered by day"""
+        with self._lock, self.connection() as connection:
+            return connection.execute(
+                f"""select {', '.join(QUOTE_COLUMNS)} from quotes
+                where symbol = ? order by d""",
+                [symbol],
+            ).df()
+
+    def write(self, symbol: str, quotes: pd.DataFrame):
+        """Insert the quotations of a symbol, replacing the already stored days"""
+        quotes = quotes.reindex(columns=QUOTE_COLUMNS)
+        with self._lock, self.connection() as connection:
+            connection.register("quotes_df", quotes)
+            connection.begin()
+            # duckdb cannot delete and insert a same key in one transaction:
+            # update the stored days, then insert the new ones
+            connection.execute(
+                f"""update quotes set
+                {', '.join(f'{c} = q.{c}' for c in QUOTE_COLUMNS[1:])}
+                from quotes_df q
+                where quotes.symbol = ? and quotes.d = q.d""",
+                [symbol],
+            )
+            connection.execute(
+                f"""insert into quotes
+                select ? as symbol, {', '.join(QUOTE_COLUMNS)} from quotes_df
+                where d not in (select d from quotes where symbol = ?)""",
+                [symbol, symbol],
+            )
+            connection.commit()
+            connection.unregister("quotes_df")
+
+
+default_quote_store = QuoteStore()
@@ -0,0 +1,214 @@
+"""Background refresh of the quotes of the assets of all the portfolios.
+Run from the project root: python -m src.refresher --interval 600 --hot-interval 60
+The duckdb files of the caches are connected during each operation only, so this
+refresher can run beside the app (which runs its own refresher) or a report."""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+from typing import Iterable
+
+from attrs import define, field
+
+from src.data_extraction import get_historical_data, scrape_asset_data
+from src.metadata_cache import MetadataCache, default_metadata_cache
+from src.multi_portfolio import asset_queries, portfolio_names
+from src.portfolio import Portfolio
+from src.quote_store import QuoteStore, default_quote_store
+
+
+def portfolio_queries(
+    names: list = None, metadata_cache: MetadataCache = default_metadata_cache
+) -> dict:
+    """Query of each asset of the portfolios (all those of data/operations by
+    default), by isin, read from their files without loading the assets"""
+    names = portfolio_names() if names is None else names
+    return asset_queries(
+        Portfolio(name, dict_of_assets={}, metadata_cache=metadata_cache)
+        for name in names
+    )
+
+
+@define
+class QuoteRefresher:
+    """Keep the latest price, daily variation (metadata cache) and end-of-day
+    history (quote store) of assets fresh, so that the assets are loaded from the
+    local caches without waiting for the network.
+    Hot assets (e.g. those of the portfolio displayed by the app) are refreshed
+    every hot_interval seconds, the others every interval seconds, their history
+    every history_interval seconds. refresh_due refreshes the assets that are due,
+    start runs it every tick seconds in a background thread."""
+
+    # Query of each asset (see load_assets) by isin,
+    # the assets of all the portfolios when not given
+    queries: dict = None
+    interval: float = 600
+    hot_interval: float = 60
+    history_interval: float = 3600
+    # Assets always hot, an asset marked hot stays hot hot_period seconds
+    hot_isins: set = field(factory=set)
+    hot_period: float = 3600
+    tick: float = 5
+    max_workers: int = 4
+    metadata_cache: MetadataCache = default_metadata_cache
+    quote_store: QuoteStore = default_quote_store
+    # Number of refreshed quotes and histories, and of failed refreshes
+    counts: dict = field(
+        factory=lambda: {"quotes": 0, "histories": 0, "errors": 0}, init=False
+    )
+    # Time when an isin was marked hot, and next refresh times by isin
+    _hot: dict = field(factory=dict, init=False)
+    _quotes_due: dict = field(factory=dict, init=False)
+    _history_due: dict = field(factory=dict, init=False)
+    _lock: Lock = field(factory=Lock, init=False)
+    _stop: Event = field(factory=Event, init=False)
+    _thread: Thread = field(default=None, init=False)
+
+    def __attrs_post_init__(self):
+        if self.queries is None:
+            self.queries = portfolio_queries(metadata_cache=self.metadata_cache)
+
+    def add(self, queries: dict):
+        """Refresh these assets too, from their next tick"""
+        with self._lock:
+            for isin, query in queries.items():
+                self.queries.setdefault(isin, query)
+
+    def mark_hot(self, isins: Iterable[str], now: float = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            for isin in isins:
+                self._hot[isin] = now
+                # Refreshed at its next tick if it was waiting for a cold interval
+                due = self._quotes_due.get(isin)
+                if due is not None and due > now + self.hot_interval:
+                    self._quotes_due[isin] = now + self.hot_interval
+
+    def is_hot(self, isin: str, now: float = None) -> bool:
+        if isin in self.hot_isins:
+            return True
+        now = time.time() if now is None else now
+        return now - self._hot.get(isin, -self.hot_period) < self.hot_period
+
+    def due(self, now: float = None) -> tuple[list, list]:
+        """isins whose quote is due, and isins whose history is due"""
+        now = time.time() if now is None else now
+        with self._lock:
+            quotes = [i for i in self.queries if self._quotes_due.get(i, now) <= now]
+            histories = [
+                i for i in self.queries if self._history_due.get(i, now) <= now
+            ]
+        return quotes, histories
+
+    def refresh_quote(self, isin: str):
+        """Scrape the asset into the metadata cache and the AssetCache of the
+        process, see scrape_asset_data"""
+        data, _ = self.metadata_cache.get(isin)
+        query = data["url"] if data else self.queries[isin]
+        self.metadata_cache.put(isin, scrape_asset_data(query))
+
+    def refresh_history(self, isin: str):
+        """Request the days missing from the quote store"""
+        data, _ = self.metadata_cache.get(isin)
+        if data is None:
+            raise ValueError(f"{isin}: no cached symbol to refresh its history")
+        get_historical_data(data["symbol"], self.quote_store)
+
+    def refresh_due(self, now: float = None) -> tuple[list, list]:
+        """Refresh the quotes, then the histories, which are due.
+        A failed refresh is retried at the next interval of the asset.
+        Returns the refreshed isins of the quotes and of the histories."""
+        now = time.time() if now is None else now
+        quotes, histories = self.due(now)
+        with self._lock:
+            for isin in quotes:
+                interval = self.hot_interval if self.is_hot(isin, now) else self.interval
+                self._quotes_due[isin] = now + interval
+            for isin in histories:
+                self._history_due[isin] = now + self.history_interval
+
+        def run(refresh, isin: str, count: str) -> bool:
+            try:
+                refresh(isin)
+            except Exception as e:
+                print(f"{isin}: {e}")
+                with self._lock:
+                    self.counts["errors"] += 1
+                return False
+            with self._lock:
+                self.counts[count] += 1
+            return True
+
+        refreshed = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for isins, refresh, count in [
+                (quotes, self.refresh_quote, "quotes"),
+                (histories, self.refresh_history, "histories"),
+            ]:
+                results = list(
+                    pool.map(lambda isin: run(refresh, isin, count), isins)
+                )
+                refreshed.append([i for i, ok in zip(isins, results) if ok])
+        return tuple(refreshed)
+
+    def run(self):
+        """Refresh the due assets every tick until stopped"""
+        while not self._stop.is_set():
+            self.refresh_due()
+            self._stop.wait(self.tick)
+
+    def start(self):
+        """Refresh in a daemon thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self.run, name="quote-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--portfolios",
+        nargs="*",
+        help="names of the portfolios, all those of data/operations by default",
+    )
+    parser.add_argument("--interval", type=float, default=600)
+    parser.add_argument("--hot-interval", type=float, default=60)
+    parser.add_argument("--history-interval", type=float, default=3600)
+    parser.add_argument("--hot", nargs="*", default=[], help="isins of hot assets")
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument(
+        "--once", action="store_true", help="refresh every asset once, then exit"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None):
+    args = parse_args(argv)
+    refresher = QuoteRefresher(
+        portfolio_queries(args.portfolios or None),
+        interval=args.interval,
+        hot_interval=args.hot_interval,
+        history_interval=args.history_interval,
+        hot_isins=set(args.hot),
+        max_workers=args.max_workers,
+    )
+    if args.once:
+        refresher.refresh_due()
+    else:
+        try:
+            refresher.run()
+        except KeyboardInterrupt:
+            pass
+    print(f"{len(refresher.queries)} assets: {refresher.counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Reports of the portfolios without the streamlit app, e.g. from a cron job.
+Run from the project root: python -m src.report --output reports"""
+import argparse
+import sys
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+from src import http_client
+from src.cache import AssetCache, NoCache, set_cache_backend
+from src.duckdb_files import LOCK_TIMEOUT, is_lock_error
+from src.multi_portfolio import MultiPortfolio, portfolio_names
+
+FORMATS = ("csv", "parquet")
+CACHES = {"memory": AssetCache, "none": NoCache}
+
+
+def write_table(df: pd.DataFrame, path: Path, file_format: str = "csv") -> Path:
+    """Write a table as csv or parquet, path without extension"""
+    path = path.with_suffix(f".{file_format}")
+    if file_format == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+def portfolio_tables(portfolio) -> dict:
+    """Tables reported for one computed portfolio, by file name"""
+    if portfolio.assets_summary is None:
+        return {}
+    irr_failures = pd.DataFrame(
+        [
+            {"isin": isin, "period": str(period), "reason": reason}
+            for (isin, period), reason in portfolio.irr_failures.items()
+        ],
+        columns=["isin", "period", "reason"],
+    )
+    return {
+        # The operations of each line are not a table column
+        "assets_summary": portfolio.assets_summary.drop(columns="operations"),
+        "portfolio_summary": portfolio.portfolio_summary,
+        "irr_failures": irr_failures,
+        "nav": portfolio.nav,
+    }
+
+
+def write_reports(
+    multi: MultiPortfolio, output_dir: str = "reports", file_format: str = "csv"
+) -> list:
+    """Write the summaries of each portfolio in output_dir/<portfolio name>/ and
+    the summaries, consolidated assets and net asset value of all the portfolios
+    in output_dir. Returns the written paths."""
+    if file_format not in FORMATS:
+        raise ValueError(f"{file_format}: unknown format, choose among {FORMATS}")
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    consolidated = multi.consolidated
+    if "portfolios" in consolidated:
+        consolidated = consolidated.assign(
+            portfolios=consolidated["portfolios"].str.join(",")
+        )
+    tables = {
+        output / "portfolio_summaries": multi.portfolio_summaries.reset_index(),
+        output / "consolidated": consolidated,
+    }
+    if (nav := multi.nav) is not None:
+        tables[output / "nav"] = nav
+    for name, portfolio in multi.portfolios.items():
+        for table, df in portfolio_tables(portfolio).items():
+            tables[output / name / table] = df
+    paths = []
+    for path, df in tables.items():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        paths.append(write_table(df, path, file_format))
+    return paths
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--portfolios",
+        nargs="*",
+        help="names of the portfolios, all those of data/operations by default",
+    )
+    parser.add_argument("--output", default="reports", help="output directory")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument(
+        "--processes", type=int, help="processes computing the summaries"
+    )
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument(
+        "--cache", choices=list(CACHES), default="memory", help="asset data cache"
+    )
+    parser.add_argument(
+        "--http-mode",
+        choices=http_client.MODES,
+        help="live, record or replay (BOURSORAMA_HTTP_MODE by default)",
+    )
+    parser.add_argument("--fixtures", help="fixtures directory of record/replay")
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None):
+    args = parse_args(argv)
+    set_cache_backend(CACHES[args.cache]())
+    if args.http_mode is not None:
+        http_client.client.set_mode(args.http_mode, args.fixtures)
+    try:
+        multi = MultiPortfolio(
+            names=args.portfolios or portfolio_names(),
+            max_workers=args.max_workers,
+            processes=args.processes,
+        )
+        paths = write_reports(multi, args.output, args.format)
+    except duckdb.IOException as e:
+        if not is_lock_error(e):
+            raise
+        print(
+            f"{e}\nA duckdb file of data/ is used by another process (the app or "
+            f"the refresher) for more than {LOCK_TIMEOUT}s: run the report again later."
+        )
+        return 1
+    print(f"{len(paths)} reports written in {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
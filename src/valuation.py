@@ -0,0 +1,127 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from attrs import define, evolve
+
+from src.data_extraction import EPOCH, Quotations, day_dates, day_numbers
+
+
+@define
+class ValuationMatrix:
+    """Prices and held quantities of assets on every calendar day, as dense
+    (days × isins) float64 matrices aligned on the same days and isins.
+    days are int32 day numbers (days since 1970-01-01). A price is NaN before the
+    first quotation of its asset, a quantity NaN before its first operation."""
+
+    days: np.ndarray
+    isins: list
+    prices: np.ndarray
+    quantities: np.ndarray
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.prices * self.quantities
+
+    def nav(self) -> pd.DataFrame:
+        """Net asset value (date, value) of the assets on each day with a price.
+        The value is NaN on the days before the first held quantity."""
+        values = self.values
+        quoted = ~np.isnan(self.prices).all(axis=1)
+        held = ~np.isnan(values).all(axis=1)
+        nav = np.where(held, np.nansum(values, axis=1), np.nan)
+        return pd.DataFrame(
+            {"date": day_dates(self.days[quoted]), "value": nav[quoted]}
+        )
+
+    def long(self, names: list = None) -> pd.DataFrame:
+        """Values (date, name, value) of each asset on each day with a price,
+        ordered by date then isin, for the charts. names default to the isins."""
+        rows, columns = np.nonzero(~np.isnan(self.prices))
+        names = np.asarray(self.isins if names is None else names, dtype=object)
+        # date objects, like the dates of the operations
+        dates = self.days.astype("datetime64[D]").astype(object)
+        return pd.DataFrame(
+            {
+                "date": dates[rows],
+                "name": names[columns],
+                "value": self.values[rows, columns],
+            }
+        )
+
+    def replace(self, isin: str, prices: np.ndarray, quantities: np.ndarray):
+        """Replace the prices and quantities of an isin, added if new"""
+        if isin in self.isins:
+            column = self.isins.index(isin)
+            self.prices[:, column] = prices
+            self.quantities[:, column] = quantities
+        else:
+            self.isins = [*self.isins, isin]
+            self.prices = np.column_stack([self.prices, prices])
+            self.quantities = np.column_stack([self.quantities, quantities])
+
+    def with_last_prices(self, prices: dict) -> "ValuationMatrix":
+        """Copy whose prices of the last day are those given by isin (e.g. the
+        latest quotes of today), the other prices are kept"""
+        new_prices = self.prices.copy()
+        for isin, price in prices.items():
+            if isin in self.isins:
+                new_prices[-1, self.isins.index(isin)] = price
+        return evolve(self, prices=new_prices)
+
+    def drop(self, isin: str):
+        if isin in self.isins:
+            column = self.isins.index(isin)
+            self.isins = [i for i in self.isins if i != isin]
+            self.prices = np.delete(self.prices, column, axis=1)
+            self.quantities = np.delete(self.quantities, column, axis=1)
+
+
+def price_column(quotations: Quotations, days: np.ndarray) -> np.ndarray:
+    """Close of each day, the close of the previous quotation on the days
+    without quotation, NaN before the first quotation"""
+    previous = np.searchsorted(quotations.days, days, side="right") - 1
+    closes = np.append(quotations.closes, np.nan)
+    # Position -1 (before the first quotation) takes the appended NaN
+    return closes[previous]
+
+
+def quantity_matrix(operations: pd.DataFrame, days: np.ndarray, isins: list) -> np.ndarray:
+    """Quantity held by isin on each day (cumulative_quantity after the last
+    operation of the day or before), NaN before the first operation"""
+    quantities = np.full((len(days), len(isins)), np.nan)
+    rows = np.searchsorted(
+        days, day_numbers(pd.to_datetime(operations["date"]).to_numpy())
+    )
+    columns = pd.Index(isins).get_indexer(operations["isin"])
+    kept = (rows < len(days)) & (columns >= 0)
+    rows, columns = rows[kept], columns[kept]
+    cumulative = operations["cumulative_quantity"].to_numpy(dtype="float64")[kept]
+    # Last operation of each (day, isin): the operations are ordered by date
+    order = np.lexsort((np.arange(len(rows)), rows, columns))
+    last = np.r_[
+        (rows[order][1:] != rows[order][:-1]) | (columns[order][1:] != columns[order][:-1]),
+        True,
+    ]
+    quantities[rows[order][last], columns[order][last]] = cumulative[order][last]
+    # Forward fill each column from its last operation
+    filled = np.where(np.isnan(quantities), 0, np.arange(len(days))[:, None])
+    np.maximum.accumulate(filled, axis=0, out=filled)
+    return quantities[filled, np.arange(len(isins))]
+
+
+def valuation_matrix(
+    operations: pd.DataFrame, quotations: dict, start: date, end: date = None
+) -> ValuationMatrix:
+    """Valuation matrix of the operations (with their cumulative_quantity, see
+    compute_positions) on every day from start to end (today by default).
+    quotations are the Quotations of each isin of the operations."""
+    end = end or date.today()
+    days = np.arange((start - EPOCH).days, (end - EPOCH).days + 1, dtype=np.int32)
+    isins = list(pd.unique(operations["isin"]))
+    prices = np.empty((len(days), len(isins)))
+    for column, isin in enumerate(isins):
+        prices[:, column] = price_column(quotations[isin], days)
+    return ValuationMatrix(
+        days, isins, prices, quantity_matrix(operations, days, isins)
+    )
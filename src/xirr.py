@@ -0,0 +1,149 @@
+from datetime import date
+from typing import Iterable, Union
+
+import numpy as np
+from attrs import define
+
+# Act/365 day count, like pyxirr
+DAYS_IN_YEAR = 365.0
+# Log rates are searched in [-MAX_LOG_RATE, MAX_LOG_RATE], i.e. rates from -99.99% to
+# e^10 - 1 (about 2.2e6 %)
+MAX_LOG_RATE = 10.0
+BRACKET_POINTS = 81
+
+
+@define
+class XirrResult:
+    """Annual rates of return (0.05 for 5%) of a batch of cashflow series.
+    rate is NaN when a series has no solution or the solver did not converge,
+    see converged and reason ("", "no sign change" or "not converged")."""
+
+    rate: np.ndarray
+    converged: np.ndarray
+    iterations: np.ndarray
+    reason: np.ndarray
+
+
+def xirr_day_offsets(dates: Iterable) -> np.ndarray:
+    """Day numbers of dates, strings or datetime64, relative to an arbitrary origin:
+    only their differences are meaningful (unlike data_extraction.day_numbers,
+    days since 1970-01-01)"""
+    if hasattr(dates, "to_numpy"):
+        dates = dates.to_numpy()
+    elif not isinstance(dates, np.ndarray):
+        dates = list(dates)
+    if len(dates) and isinstance(dates[0], date):
+        # Much faster than the conversion of date objects to datetime64
+        return np.fromiter((day.toordinal() for day in dates), np.int64, len(dates))
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def pad_cashflows(series: Iterable[tuple]) -> tuple:
+    """Years since the first date and cashflows of the series (dates, cashflows),
+    as 2D arrays padded with zero cashflows"""
+    series = list(series)
+    width = max((len(cashflows) for _, cashflows in series), default=0)
+    years = np.zeros((len(series), width))
+    amounts = np.zeros((len(series), width))
+    for row, (dates, cashflows) in enumerate(series):
+        days = xirr_day_offsets(dates)
+        if len(days) == 0:
+            continue
+        years[row, : len(days)] = (days - days.min()) / DAYS_IN_YEAR
+        amounts[row, : len(days)] = cashflows
+    return years, amounts
+
+
+def _npv(log_rates: np.ndarray, years: np.ndarray, amounts: np.ndarray) -> tuple:
+    """Net present values at the rates e^log_rates - 1 and their derivatives"""
+    discounted = amounts * np.exp(-log_rates[:, None] * years)
+    return discounted.sum(axis=1), -(discounted * years).sum(axis=1)
+
+
+def batch_xirr(
+    series: Iterable[tuple],
+    guess: Union[float, np.ndarray] = 0.1,
+    tol: float = 1e-10,
+    max_iterations: int = 50,
+) -> XirrResult:
+    """Solve the internal rates of return of many series (dates, cashflows) at once.
+    All the series are solved together by Newton iterations on the log rate,
+    starting from guess (one rate, or one rate per series, e.g. the solutions of
+    related series). The series where Newton fails are bracketed on a grid of
+    rates, by the sign change closest to their starting point, and solved by
+    bisection."""
+    years, amounts = pad_cashflows(series)
+    n_series = len(amounts)
+    # Relative tolerance on the net present value
+    scale = np.abs(amounts).max(axis=1, initial=0)
+    scale[scale == 0] = 1
+    amounts = amounts / scale[:, None]
+    has_both_signs = (amounts > 0).any(axis=1) & (amounts < 0).any(axis=1)
+
+    guess = np.broadcast_to(np.asarray(guess, dtype="float64"), n_series)
+    guess = np.where(np.isfinite(guess) & (guess > -1), guess, 0.1)
+    log_rates = np.clip(np.log1p(guess), -MAX_LOG_RATE, MAX_LOG_RATE)
+    # Starting points, the brackets of the fallback are searched around them
+    starts = log_rates.copy()
+    converged = np.zeros(n_series, dtype=bool)
+    iterations = np.zeros(n_series, dtype=np.int64)
+    active = has_both_signs.copy()
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+        value, derivative = _npv(log_rates[active], years[active], amounts[active])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = value / derivative
+        new_log_rates = log_rates[active] - step
+        valid = np.isfinite(new_log_rates) & (np.abs(new_log_rates) <= MAX_LOG_RATE)
+        rows = np.flatnonzero(active)
+        log_rates[rows[valid]] = new_log_rates[valid]
+        iterations[rows] += 1
+        done = valid & (np.abs(step) < tol) & (np.abs(value) < np.sqrt(tol))
+        converged[rows[done]] = True
+        active[rows[done | ~valid]] = False
+
+    # Fallback: sign change on a grid of rates closest to the starting point (a
+    # series may have several roots), then bisection
+    failed = np.flatnonzero(has_both_signs & ~converged)
+    if len(failed):
+        grid = np.linspace(-MAX_LOG_RATE, MAX_LOG_RATE, BRACKET_POINTS)
+        signs = np.sign(
+            [
+                _npv(np.full(len(failed), point), years[failed], amounts[failed])[0]
+                for point in grid
+            ]
+        )
+        # Distance from the starting point to each interval of the grid
+        start = starts[failed]
+        distance = np.maximum(
+            np.maximum(grid[:-1, None] - start, start - grid[1:, None]), 0
+        )
+        distance[signs[:-1] == signs[1:]] = np.inf
+        closest = distance.argmin(axis=0)
+        bracketed = np.isfinite(distance.min(axis=0))
+        rows = failed[bracketed]
+        low, high = grid[closest[bracketed]], grid[closest[bracketed] + 1]
+        low_value = _npv(low, years[rows], amounts[rows])[0]
+        while len(rows) and (high - low).max() > tol:
+            middle = (low + high) / 2
+            value = _npv(middle, years[rows], amounts[rows])[0]
+            same_sign = np.sign(value) == np.sign(low_value)
+            low = np.where(same_sign, middle, low)
+            low_value = np.where(same_sign, value, low_value)
+            high = np.where(same_sign, high, middle)
+            iterations[rows] += 1
+        log_rates[rows] = (low + high) / 2
+        converged[rows] = True
+
+    reason = np.where(
+        converged, "", np.where(has_both_signs, "not converged", "no sign change")
+    )
+    return XirrResult(
+        np.where(converged, np.expm1(log_rates), np.nan), converged, iterations, reason
+    )
+
+
+def xirr(dates: Iterable[date], cashflows: Iterable[float], guess: float = 0.1) -> float:
+    """Internal rate of return of one series, NaN when it cannot be solved"""
+    return batch_xirr([(list(dates), list(cashflows))], guess).rate[0]
@@ -1,13 +1,72 @@
 import os
+import subprocess
 import sys
+import tempfile
+import threading
 import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from unittest import mock
 
+import duckdb
+import numpy as np
 import pandas as pd
+import pyxirr
+import requests
+import srsly
+from attrs import evolve
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-from src.data_extraction import Asset, get_current_asset_data
+from src.cache import (
+    AssetCache,
+    MemoryCache,
+    NoCache,
+    cached,
+    get_cache_backend,
+    lookup_arguments,
+    set_cache_backend,
+)
+from src.data_extraction import (
+    EPOCH,
+    Asset,
+    Quotations,
+    compute_perf,
+    get_current_asset_data,
+    get_historical_data,
+    load_assets,
+    load_details,
+    perf_matrix,
+    quotations_by_period,
+)
+from src.http_client import (
+    FIXTURES_DIR,
+    HttpClient,
+    RateLimiter,
+    client,
+    fixture_path,
+)
+from src.metadata_cache import ASSET_FIELDS, LAZY_FIELDS, MetadataCache
+from src.multi_portfolio import MultiPortfolio
+from src.operations_import import import_operations
+from src.operations_store import OperationsStore
+from src.page_parser import (
+    BACKENDS,
+    parse_asset_page,
+    parse_composition,
+    parse_last_dividend,
+)
+from src.periods import period_bounds, period_filter, period_names
 from src.portfolio import Portfolio
+from src.positions import compute_positions, position_totals
+from src.quote_store import QuoteStore
+from src.refresher import QuoteRefresher
+from src.report import main as report_main
+from src.report import write_reports
+from src.valuation import valuation_matrix
+from src.xirr import batch_xirr
+
+TODAY = date.today()
 
 
 # Scrapping
@@ -30,7 +89,8 @@ class TestAsset(unittest.TestCase):
                 self.assertGreaterEqual(AirLiquide.latest, 0)
                 self.assertIsNone(AirLiquide.referenceIndex)
                 self.assertIsNone(AirLiquide.morningstarCategory)
-            time.sleep(1)
+            if client.mode != "replay":
+                time.sleep(1)
 
     def test_tracker(self):
         """Tracker: cw8"""
@@ -50,7 +110,8 @@ class TestAsset(unittest.TestCase):
                 self.assertEqual(
                     cw8.morningstarCategory, "Actions International Gdes Cap. Mixte"
                 )
-            time.sleep(1)
+            if client.mode != "replay":
+                time.sleep(1)
 
     def test_opcvm(self):
         """OPCVM: Réserve Ecureuil C"""
@@ -69,7 +130,1136 @@ class TestAsset(unittest.TestCase):
                 self.assertGreaterEqual(ecureuil.latest, 0)
                 self.assertEqual(ecureuil.morningstarCategory, "Swap EONIA PEA")
                 self.assertIsNone(ecureuil.referenceIndex)
-            time.sleep(1)
+            if client.mode != "replay":
+                time.sleep(1)
+
+
+class TestLoadAssets(unittest.TestCase):
+    """Concurrent loading of the assets, without network"""
+
+    @staticmethod
+    def fake_asset_data(query: str) -> dict:
+        isin = query.rstrip("/").split("/")[-1]
+        return {
+            "asset": "stock",
+            "isin": isin,
+            "symbol": isin,
+            "currency": "EUR",
+            "name": isin,
+            "latest": 1,
+            "variation": 0,
+            "tradeDate": None,
+            "url": query,
+            "referenceIndex": None,
+            "morningstarCategory": None,
+            "assetsComposition": [],
+            "lastDividende": {},
+        }
+
+    def test_each_asset_scraped_once(self):
+        queries = {f"ISIN{i}": f"https://example.com/cours/ISIN{i}/" for i in range(5)}
+        with mock.patch(
+            "src.data_extraction.get_current_asset_data",
+            side_effect=self.fake_asset_data,
+        ) as scraper:
+            assets, timings = load_assets(queries, max_workers=3)
+        self.assertEqual(scraper.call_count, 5)
+        self.assertEqual(list(assets), list(queries))
+        self.assertEqual(set(timings), set(queries))
+        self.assertTrue(all(t >= 0 for t in timings.values()))
+        self.assertEqual(assets["ISIN3"].isin, "ISIN3")
+
+    def test_no_asset(self):
+        self.assertEqual(load_assets({}), ({}, {}))
+
+
+class TestMetadataCache(unittest.TestCase):
+    """Asset data cached on disk with a time to live by field"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = MetadataCache(os.path.join(self.tmp.name, "metadata.duckdb"))
+        self.data = TestLoadAssets.fake_asset_data("https://example.com/cours/ISIN0/")
+        self.data["tradeDate"] = datetime(2024, 1, 2, 17, 35)
+        self.data["lastDividende"] = {"date": datetime(2023, 5, 1), "amount": 1.5}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        self.assertEqual(
+            self.cache.get("ISIN0"), (None, set(ASSET_FIELDS) - set(LAZY_FIELDS))
+        )
+        self.cache.put("ISIN0", self.data, updated=1000)
+        data, stale = self.cache.get("ISIN0", now=1000 + 60)
+        self.assertEqual(data, self.data)
+        self.assertEqual(stale, set())
+
+    def test_stale_fields(self):
+        self.cache.put("ISIN0", self.data, updated=0)
+        hour, day = 3600, 86400
+        self.assertEqual(
+            self.cache.get("ISIN0", now=hour)[1], {"latest", "variation", "tradeDate"}
+        )
+        # A stale lazy field is left out, to be loaded again when read
+        data, stale = self.cache.get("ISIN0", now=2 * day)
+        self.assertEqual(stale, {"latest", "variation", "tradeDate"})
+        self.assertNotIn("lastDividende", data)
+        self.assertIn("assetsComposition", data)
+        self.cache.put("ISIN0", {"latest": 2}, updated=2 * day)
+        data, stale = self.cache.get("ISIN0", now=2 * day)
+        self.assertEqual(data["latest"], 2)
+        self.assertEqual(stale, {"variation", "tradeDate"})
+
+    def test_seed_keeps_cached_fields(self):
+        self.cache.put("ISIN0", self.data, updated=2000)
+        saved = {**self.data, "latest": 0, "tradeDate": 1704067200}
+        self.cache.seed([saved], updated=1000)
+        self.assertEqual(self.cache.get("ISIN0")[0]["latest"], 1)
+        # A file saved after the cached data, from older data
+        saved = {**saved, "assetsComposition": None, "lastDividende": None}
+        self.cache.seed([saved], updated=3000)
+        data, _ = self.cache.get("ISIN0", now=2000)
+        self.assertEqual(data["latest"], 1)
+        self.assertEqual(data["lastDividende"], self.data["lastDividende"])
+        self.cache.seed([{**saved, "isin": "ISIN1"}], updated=1000)
+        self.assertEqual(
+            self.cache.get("ISIN1")[0]["tradeDate"], datetime(2024, 1, 1)
+        )
+
+    def test_load_assets_uses_fresh_data(self):
+        queries = {f"ISIN{i}": f"https://example.com/cours/ISIN{i}/" for i in range(3)}
+        self.cache.put("ISIN0", self.data)
+        self.cache.put("ISIN1", {**self.data, "isin": "ISIN1"}, updated=0)
+        # The stale assets are scraped, not read from the cache of the lookups
+        with mock.patch(
+            "src.data_extraction.get_current_asset_data.__wrapped__",
+            side_effect=TestLoadAssets.fake_asset_data,
+        ) as scraper:
+            assets, _ = load_assets(queries, max_workers=2, cache=self.cache)
+        # ISIN1 is stale and scraped from its cached url, ISIN2 is not cached
+        self.assertEqual(
+            sorted(call.args[0] for call in scraper.call_args_list),
+            [self.data["url"], queries["ISIN2"]],
+        )
+        self.assertEqual(assets["ISIN0"].tradeDate, self.data["tradeDate"])
+        self.assertEqual(self.cache.get("ISIN2")[1], set())
+
+    def test_lazy_details_cached(self):
+        data = {k: v for k, v in self.data.items() if k not in LAZY_FIELDS}
+        self.cache.put("ISIN0", data)
+        details = {
+            "assetsComposition": [{"name": "Actions", "value": 100}],
+            "lastDividende": {},
+        }
+        with mock.patch(
+            "src.data_extraction.get_asset_details", return_value=details
+        ) as get_details:
+            assets, _ = load_assets({"ISIN0": "ISIN0"}, cache=self.cache)
+            self.assertEqual(get_details.call_count, 0)
+            self.assertEqual(assets["ISIN0"].assetsComposition[0]["name"], "Actions")
+            self.assertEqual(assets["ISIN0"].lastDividende, {})
+        self.assertEqual(get_details.call_count, 1)
+        self.assertEqual(
+            self.cache.get("ISIN0")[0]["assetsComposition"],
+            details["assetsComposition"],
+        )
+
+    def test_details_prefetched(self):
+        """The details of the assets not loaded yet are requested concurrently"""
+        data = {k: v for k, v in self.data.items() if k not in LAZY_FIELDS}
+        assets = [
+            Asset.from_boursorama({**data, "isin": f"ISIN{i}"}) for i in range(4)
+        ]
+        assets[0] = Asset.from_boursorama(self.data)
+        threads = set()
+
+        def get_details(url: str, asset: str) -> dict:
+            threads.add(threading.get_ident())
+            time.sleep(0.05)
+            return {"assetsComposition": [], "lastDividende": {}}
+
+        with mock.patch(
+            "src.data_extraction.get_asset_details", side_effect=get_details
+        ) as details:
+            load_details(assets, max_workers=3)
+            self.assertEqual(details.call_count, 3)
+            self.assertEqual([asset.assetsComposition for asset in assets[1:]], [[]] * 3)
+        self.assertEqual(len(threads), 3)
+        self.assertEqual(assets[0].lastDividende, self.data["lastDividende"])
+
+
+class TestQuoteStore(unittest.TestCase):
+    """Historical quotes are stored and only the missing days are requested"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = QuoteStore(os.path.join(self.tmp_dir.name, "quotes.duckdb"))
+        self.today = (TODAY - EPOCH).days
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def fake_response(days: range) -> mock.Mock:
+        response = mock.Mock()
+        response.json.return_value = {
+            "d": {"QuoteTab": [{"d": d, "c": float(d), "v": 1} for d in days]}
+        }
+        return response
+
+    def test_delta_fetch(self):
+        with mock.patch("src.http_client.get") as get:
+            get.return_value = self.fake_response(range(self.today - 10, self.today - 2))
+            df = get_historical_data("1rPAI", self.store)
+            self.assertIn("length=7300", get.call_args.args[0])
+            # Trading days only, the calendar days are filled on demand until today
+            self.assertEqual(len(df), 8)
+            self.assertEqual(df["c"].iloc[-1], self.today - 3)
+            daily = quotations_by_period(df).daily()
+            self.assertEqual(len(daily), 11)
+            self.assertEqual(daily["c"].tolist()[-4:], [self.today - 3] * 4)
+
+            get.return_value = self.fake_response(range(self.today - 3, self.today + 1))
+            df = get_historical_data("1rPAI", self.store)
+            self.assertIn("length=4&", get.call_args.args[0])
+            self.assertEqual(df["c"].iloc[-1], self.today)
+            self.assertEqual(self.store.last_day("1rPAI"), self.today)
+
+            # Warm start: nothing to download
+            get.reset_mock()
+            df = get_historical_data("1rPAI", self.store)
+            get.assert_not_called()
+            self.assertEqual(len(df), 11)
+
+    def test_other_process(self):
+        """The file is locked by a process only during its operations"""
+        quotes = pd.DataFrame({"d": [1, 2], "c": [1.0, 2.0]})
+        holder = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "import sys, time, duckdb\n"
+                f"with duckdb.connect({self.store.path!r}):\n"
+                "    print('locked', flush=True)\n"
+                "    time.sleep(0.5)",
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        self.assertEqual(holder.stdout.readline().strip(), "locked")
+        # Waits for the other process
+        self.store.write("1rPAI", quotes)
+        holder.wait()
+        holder.stdout.close()
+        last_day = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "from src.quote_store import QuoteStore\n"
+                f"print(QuoteStore({self.store.path!r}).last_day('1rPAI'))",
+            ],
+            cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        self.assertEqual(last_day.strip(), "2")
+        self.assertEqual(self.store.last_day("1rPAI"), 2)
+
+
+class TestOperationsStore(unittest.TestCase):
+    """Operations are added and removed one by one, with stable ids"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp_dir.name, "ptf.csv")
+        pd.DataFrame(
+            [
+                ("Asset XS1", "XS1", "2021-03-01", "Buy", 1.0, 10.0, 0.0),
+                ("Asset XS0", "XS0", "2021-02-01", "Buy", 2.0, 5.0, 1.0),
+                ("Asset XS0", "XS0", "2021-01-01", "Buy", 3.0, 5.0, 1.0),
+            ],
+            columns=["name", "isin", "date", "operation", "quantity", "value", "fees"],
+        ).to_csv(self.csv_path, index=False)
+        self.store = OperationsStore(
+            os.path.join(self.tmp_dir.name, "ptf.duckdb"), self.csv_path
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_csv_import(self):
+        operations = self.store.read()
+        self.assertEqual(operations["id"].tolist(), [1, 2, 3])
+        self.assertEqual(
+            operations["date"].tolist(), ["2021-01-01", "2021-02-01", "2021-03-01"]
+        )
+
+    def test_add_remove(self):
+        operation_id = self.store.add(
+            {
+                "name": "Asset XS0",
+                "isin": "XS0",
+                "date": "2022-01-01",
+                "operation": "Dividend",
+                "value": 1.0,
+                "fees": 0.0,
+            }
+        )
+        self.assertEqual(operation_id, 4)
+        self.store.remove(1)
+        # Ids are kept after reopening
+        self.store = OperationsStore(self.store.path)
+        self.assertEqual(self.store.read()["id"].tolist(), [2, 3, 4])
+        self.assertEqual(
+            self.store.read(isin="XS0", start="2021-01-15", end="2021-12-31")[
+                "id"
+            ].tolist(),
+            [2],
+        )
+
+    def test_portfolio(self):
+        """Operations of a portfolio are saved in its store"""
+        with mock.patch("src.portfolio.load_assets", return_value=({}, {})):
+            ptf = Portfolio("ptf")
+            ptf.operations_store = self.store
+            ptf.operations_df = ptf.load_operations()
+            ptf.dict_of_assets = synthetic_portfolio().dict_of_assets
+            ptf.remove_operation(3)
+        self.assertEqual(self.store.read()["id"].tolist(), [1, 2])
+
+    def test_migration(self):
+        """The isin index of a store of version 1 is dropped once"""
+        path = os.path.join(self.tmp_dir.name, "v1.duckdb")
+        with duckdb.connect(path) as connection:
+            connection.execute(
+                """create table operations (id INTEGER, name VARCHAR, isin VARCHAR,
+                date DATE, operation VARCHAR, quantity DOUBLE, value DOUBLE,
+                fees DOUBLE);
+                create index operations_isin on operations (isin);"""
+            )
+        store = OperationsStore(path)
+        self.assertEqual(len(store.read()), 0)
+        self.assertEqual(store.schema_version(), 2)
+        with store.connection() as connection:
+            indexes = connection.execute(
+                "select index_name from duckdb_indexes()"
+            ).fetchall()
+        self.assertEqual(indexes, [])
+        self.assertEqual(self.store.read()["id"].tolist(), [1, 2, 3])
+        self.assertEqual(self.store.schema_version(), 2)
+
+    def test_empty(self):
+        store = OperationsStore(os.path.join(self.tmp_dir.name, "empty.duckdb"))
+        self.assertEqual(len(store.read()), 0)
+        self.assertFalse(os.path.exists(store.path))
+
+
+class TestOperationsImport(unittest.TestCase):
+    """Broker exports are imported in chunks in the operations store"""
+
+    EXPORT = (
+        "Date;Libellé;Code ISIN;Sens;Quantité;Cours;Frais\n"
+        "05/01/2023;Air Liquide;FR0000120073;Achat;3;153,40;1,99\n"
+        '06/02/2023;Air Liquide;fr0000120073;ACHAT;2;"1 160,5";\n'
+        "10/05/2023;;FR0000120073;Dividende;;2,90;\n"
+        "12/06/2023;Air Liquide;FR0000120073;Division;;11:10;\n"
+        "13/06/2023;Unknown;XX123;Achat;1;10;0\n"
+        "32/06/2023;Air Liquide;FR0000120073;Achat;1;10;0\n"
+        "14/06/2023;Air Liquide;FR0000120073;Transfert;1;10;0\n"
+        "15/06/2023;Air Liquide;FR0000120073;Vente;0;10;0\n"
+    )
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp_dir.name, "export.csv")
+        with open(self.csv_path, "w", encoding="utf-8") as f:
+            f.write(self.EXPORT)
+        self.store = OperationsStore(os.path.join(self.tmp_dir.name, "ptf.duckdb"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_csv(self):
+        """French headers, decimal commas and day-first dates, in chunks of 3 rows"""
+        report = import_operations(
+            self.csv_path, self.store, date_format="%d/%m/%Y", chunksize=3
+        )
+        self.assertEqual((report.imported, report.rejected), (4, 4))
+        self.assertEqual(
+            report.reasons,
+            {
+                "invalid isin": 1,
+                "invalid date": 1,
+                "unknown operation": 1,
+                "invalid quantity": 1,
+            },
+        )
+        self.assertEqual(report.rejected_rows.index.tolist(), [6, 7, 8, 9])
+        operations = self.store.read()
+        self.assertEqual(
+            operations["operation"].tolist(), ["Buy", "Buy", "Dividend", "Split"]
+        )
+        self.assertEqual(set(operations["isin"]), {"FR0000120073"})
+        self.assertEqual(operations["name"].iloc[2], "FR0000120073")
+        self.assertEqual(operations["value"].tolist(), [153.4, 1160.5, 2.9, 1.1])
+        self.assertEqual(operations["fees"].tolist(), [1.99, 0.0, 0.0, 0.0])
+        self.assertEqual(operations["date"].iloc[0], "2023-01-05")
+
+    def test_import_again(self):
+        """Operations already in the store are skipped"""
+        import_operations(self.csv_path, self.store, date_format="%d/%m/%Y")
+        report = import_operations(self.csv_path, self.store, date_format="%d/%m/%Y")
+        self.assertEqual((report.imported, report.skipped), (0, 4))
+        self.assertEqual(len(self.store.read()), 4)
+
+    def test_parquet(self):
+        operations = pd.DataFrame(
+            {
+                "isin": ["FR0000120073", "FR0000120271"],
+                "date": pd.to_datetime(["2023-01-05", "2023-01-06"]),
+                "operation": ["Buy", "Sell"],
+                "quantity": [3.0, 1.0],
+                "price": [153.4, 60.0],
+            }
+        )
+        parquet_path = os.path.join(self.tmp_dir.name, "export.parquet")
+        operations.to_parquet(parquet_path)
+        report = import_operations(parquet_path, self.store, chunksize=1)
+        self.assertEqual(report.imported, 2)
+        self.assertEqual(self.store.read()["value"].tolist(), [153.4, 60.0])
+
+    def test_parquet_without_pyarrow(self):
+        parquet_path = os.path.join(self.tmp_dir.name, "export.parquet")
+        with mock.patch.dict(sys.modules, {"pyarrow": None, "pyarrow.parquet": None}):
+            with self.assertRaisesRegex(ImportError, "pyarrow is required"):
+                import_operations(parquet_path, self.store)
+
+    def test_missing_column(self):
+        with self.assertRaises(ValueError):
+            import_operations(
+                self.csv_path, self.store, column_map={"Code ISIN": "ignored"}
+            )
+
+    def test_portfolio(self):
+        """Imported operations are read again and their summaries recomputed"""
+        with mock.patch("src.portfolio.load_assets", return_value=({}, {})):
+            ptf = Portfolio("ptf")
+            ptf.operations_store = self.store
+            ptf.operations_df = ptf.load_operations()
+            ptf._portfolio_summary = pd.DataFrame()
+            report = ptf.import_operations(self.csv_path, date_format="%d/%m/%Y")
+        self.assertEqual(report.imported, 4)
+        self.assertEqual(len(ptf.operations_df), 4)
+        self.assertIsNone(ptf._portfolio_summary)
+
+
+class TestReplay(unittest.TestCase):
+    """Scraping on the recorded responses of boursorama"""
+
+    def setUp(self):
+        self.mode = client.mode
+        client.set_mode("replay")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = QuoteStore(os.path.join(self.tmp_dir.name, "quotes.duckdb"))
+
+    def tearDown(self):
+        client.set_mode(self.mode)
+        self.tmp_dir.cleanup()
+
+    def test_current_asset_data(self):
+        cw8 = Asset.from_boursorama(get_current_asset_data.__wrapped__("CW8"))
+        self.assertEqual(cw8.isin, "LU1681043599")
+        self.assertEqual(cw8.url, "https://www.boursorama.com/bourse/trackers/cours/1rTCW8/")
+        self.assertEqual(cw8.referenceIndex, "MSCI World")
+        self.assertEqual(cw8.assetsComposition[0], {"name": "Actions", "value": 99.82})
+
+    def test_single_session(self):
+        """Concurrent first requests share one session"""
+        http = HttpClient(mode="replay")
+        new_session = HttpClient.new_session
+
+        def slow_session(self):
+            time.sleep(0.05)
+            return new_session(self)
+
+        with mock.patch.object(
+            HttpClient, "new_session", autospec=True, side_effect=slow_session
+        ) as built:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                sessions = list(pool.map(lambda _: http.session, range(8)))
+        self.assertEqual(built.call_count, 1)
+        self.assertTrue(all(session is sessions[0] for session in sessions))
+
+    def test_details_loaded_when_read(self):
+        with mock.patch(
+            "src.http_client.get", wraps=client.get
+        ) as get:
+            # Stocks have no composition page
+            stock = get_current_asset_data.__wrapped__("AI")
+            self.assertEqual(get.call_count, 1)
+            self.assertEqual(stock["lastDividende"]["amount"], "2,95 EUR")
+            opcvm = Asset.from_boursorama(
+                get_current_asset_data.__wrapped__(
+                    "https://www.boursorama.com/bourse/opcvm/cours/MP-184677/"
+                )
+            )
+            self.assertEqual(get.call_count, 2)
+            self.assertIsNone(opcvm.to_dict()["assetsComposition"])
+            self.assertEqual(opcvm.lastDividende["amount"], "0,00 EUR")
+            self.assertEqual(opcvm.assetsComposition[0]["name"], "Monétaire")
+            self.assertEqual(get.call_count, 3)
+        self.assertEqual(
+            Asset.from_boursorama(opcvm.to_dict()).to_dict(), opcvm.to_dict()
+        )
+
+    def test_historical_data(self):
+        df = get_historical_data("1rPAI", self.store)
+        self.assertFalse(df["c"].isna().any())
+        daily = quotations_by_period(df).daily()
+        self.assertEqual(daily["date"].iloc[-1].date(), TODAY)
+        self.assertFalse(daily["c"].isna().any())
+
+    def test_unknown_url(self):
+        with self.assertRaises(FileNotFoundError):
+            get_current_asset_data.__wrapped__("not recorded")
+
+
+class TestPageParser(unittest.TestCase):
+    """Parsing of the recorded boursorama pages by every backend"""
+
+    @staticmethod
+    def page(url: str) -> tuple:
+        fixture = srsly.read_json(fixture_path(FIXTURES_DIR, url))
+        return fixture["content"], fixture["final_url"]
+
+    def test_backends(self):
+        tracker = "https://www.boursorama.com/bourse/trackers/cours/1rTCW8/"
+        opcvm = "https://www.boursorama.com/bourse/opcvm/cours/MP-184677/"
+        stock = "https://www.boursorama.com/cours/1rPAI/"
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                data = parse_asset_page(*self.page(tracker), backend)
+                self.assertEqual(data["isin"], "LU1681043599")
+                self.assertEqual(data["name"], "AMUNDI MSCI WORLD UCITS ETF - EUR")
+                self.assertEqual(data["latest"], "480.5000")
+                self.assertEqual(data["tradeDate"], datetime(2024, 3, 8))
+                self.assertEqual(data["exchangeCode"], "Euronext Paris")
+                self.assertEqual(data["referenceIndex"], "MSCI World")
+                self.assertEqual(data["Frais courants"], "0,38%")
+                data = parse_asset_page(*self.page(opcvm), backend)
+                self.assertEqual(data["latest"], "23456.78")
+                self.assertEqual(data["tradeDate"], datetime(2024, 3, 7))
+                self.assertEqual(data["morningstarCategory"], "Swap EONIA PEA")
+                data = parse_asset_page(*self.page(stock), backend)
+                self.assertEqual((data["asset"], data["currency"]), ("stock", "EUR"))
+                # Info lists are only read on the bourse pages
+                self.assertNotIn("Secteur", data)
+                self.assertEqual(
+                    parse_last_dividend(self.page(stock)[0], backend),
+                    {"amount": "2,95 EUR", "date": datetime(2023, 5, 15)},
+                )
+                self.assertEqual(parse_last_dividend(self.page(tracker)[0], backend), {})
+
+    def test_composition(self):
+        html, _ = self.page(
+            "https://www.boursorama.com/bourse/trackers/cours/composition/1rTCW8/"
+        )
+        self.assertEqual(parse_composition(html)[1], {"name": "Liquidités", "value": 0.18})
+        html, _ = self.page("https://www.boursorama.com/cours/composition/1rPAI/")
+        self.assertIsNone(parse_composition(html))
+
+    def test_no_faceplate(self):
+        html, url = self.page("https://www.boursorama.com/cours/composition/1rPAI/")
+        with self.assertRaises(ValueError):
+            parse_asset_page(html, url)
+        with self.assertRaises(ValueError):
+            parse_asset_page(*self.page("https://www.boursorama.com/cours/1rPAI/"), "xml")
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_requests_are_spaced_per_host(self):
+        limiter = RateLimiter(min_interval=0.05)
+        start = time.monotonic()
+        for _ in range(3):
+            limiter.wait("www.boursorama.com")
+        limiter.wait("example.com")
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        self.assertLess(time.monotonic() - start, 0.15)
+
+
+class TestHttpClient(unittest.TestCase):
+    def test_retries_are_rate_limited(self):
+        """The retried requests wait for the rate limiter of their host too"""
+        statuses = [503, 429, 200]
+
+        class FlakyAdapter(requests.adapters.BaseAdapter):
+            def send(self, request, **kwargs):
+                response = requests.Response()
+                response.status_code = statuses.pop(0)
+                response.request = request
+                return response
+
+            def close(self):
+                pass
+
+        limiter = RateLimiter(min_interval=0)
+        http = HttpClient(mode="live", backoff_factor=0, rate_limiter=limiter)
+        http._session = requests.Session()
+        http._session.mount("https://", FlakyAdapter())
+        with mock.patch.object(
+            RateLimiter, "wait", autospec=True, side_effect=lambda self, host: None
+        ) as wait:
+            response = http.get("https://www.boursorama.com/cours/1rPAI/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(wait.call_count, 3)
+        self.assertEqual(wait.call_args.args[1], "www.boursorama.com")
+
+    def test_retry_after(self):
+        http = HttpClient(backoff_factor=0.5)
+        response = requests.Response()
+        response.headers["Retry-After"] = "7"
+        self.assertEqual(http.retry_delay(0, response), 7)
+        self.assertTrue(2 <= http.retry_delay(2) <= 2.5)
+
+
+def synthetic_asset(isin: str, closes: np.ndarray) -> Asset:
+    """Asset whose quotations are the daily closes of the last len(closes) days"""
+    quotes = pd.DataFrame(
+        {
+            "date": [TODAY - timedelta(days=len(closes) - 1 - i) for i in range(len(closes))],
+            "c": closes,
+        }
+    )
+    return Asset(
+        "stock", isin, isin, "EUR", f"Asset {isin}", closes[-1], "+0.00%", TODAY,
+        f"https://www.boursorama.com/cours/{isin}/", None, None,
+        [{"name": "stock", "value": 100}], {}, quotations_by_period(quotes),
+    )
+
+
+def synthetic_portfolio() -> Portfolio:
+    """Portfolio of 2 assets: buys, a sell, a dividend and a split"""
+    assets = {
+        "XS0": synthetic_asset("XS0", np.linspace(100, 150, 800)),
+        "XS1": synthetic_asset("XS1", np.linspace(50, 40, 800)),
+    }
+    day = lambda n: str(TODAY - timedelta(days=n))
+    operations = pd.DataFrame(
+        [
+            ("Asset XS0", "XS0", day(700), "Buy", 10.0, 100.0, 1.0),
+            ("Asset XS1", "XS1", day(600), "Buy", 20.0, 52.5, 1.0),
+            ("Asset XS0", "XS0", day(500), "Dividend", None, 2.0, 0.0),
+            ("Asset XS0", "XS0", day(400), "Sell", 5.0, 120.0, 1.0),
+            ("Asset XS1", "XS1", day(300), "Split", None, 2.0, 0.0),
+            ("Asset XS0", "XS0", day(200), "Buy", 10.0, 130.0, 1.0),
+        ],
+        columns=["name", "isin", "date", "operation", "quantity", "value", "fees"],
+    )
+    operations.insert(0, "id", range(1, len(operations) + 1))
+    return Portfolio("synthetic", dict_of_assets=assets, operations_df=operations)
+
+
+class TestQuotations(unittest.TestCase):
+    """Quotations of each period are views on the quotations of the asset"""
+
+    def test_periods(self):
+        historical_data_df = pd.DataFrame(
+            {
+                "date": [TODAY - timedelta(days=i) for i in range(2000, -1, -1)],
+                "c": np.arange(2001.0),
+            }
+        )
+        quotations = quotations_by_period(historical_data_df)
+        self.assertEqual(list(quotations), period_names())
+        for period in quotations:
+            with self.subTest(period=period):
+                expected = duckdb.sql(
+                    f"""select CAST(date AS DATE) date, c from historical_data_df
+                    {period_filter(period)} ORDER BY date"""
+                ).df()
+                self.assertTrue(quotations[period].equals(expected))
+                self.assertTrue(
+                    np.shares_memory(quotations[period]["c"].to_numpy(), quotations.closes)
+                )
+
+    def test_arrays(self):
+        """Contiguous read-only int32 days and float64 closes"""
+        historical_data_df = pd.DataFrame(
+            {"d": [19002, 19000, 19001], "c": [3, 1, 2], "date": [None] * 3}
+        )
+        quotations = quotations_by_period(historical_data_df)
+        self.assertEqual(quotations.days.dtype, np.int32)
+        self.assertEqual(quotations.closes.dtype, np.float64)
+        self.assertEqual(quotations.days.tolist(), [19000, 19001, 19002])
+        self.assertEqual(quotations.closes.tolist(), [1, 2, 3])
+        for array in [quotations.days, quotations.closes]:
+            self.assertTrue(array.flags.c_contiguous)
+            self.assertFalse(array.flags.writeable)
+        self.assertEqual(quotations.dates[0], np.datetime64("2022-01-08"))
+        # The given arrays are copied
+        closes = np.array([1.0, 2.0])
+        self.assertTrue(Quotations([0, 1], closes).closes is not closes)
+        self.assertTrue(closes.flags.writeable)
+
+
+class TestPerfMatrix(unittest.TestCase):
+    """Performances of several assets and periods at once"""
+
+    def test_matches_compute_perf(self):
+        rng = np.random.default_rng(0)
+        assets = [
+            synthetic_asset(f"XS{i}", rng.uniform(10, 100, n))
+            for i, n in enumerate([2000, 300, 1])
+        ]
+        perfs = perf_matrix(assets, formatted=True)
+        self.assertEqual(list(perfs.columns), period_names())
+        for asset in assets:
+            for period in period_names():
+                with self.subTest(isin=asset.isin, period=period):
+                    if len(asset.quotations[period]) == 0:
+                        self.assertEqual(perfs.loc[asset.isin, period], "nan%")
+                    else:
+                        self.assertEqual(
+                            perfs.loc[asset.isin, period],
+                            compute_perf(asset.quotations[period]),
+                        )
+
+    def test_trading_days(self):
+        """Performances start at the close on or before the start of the period"""
+        asset = synthetic_asset("XS0", np.linspace(100, 200, 800))
+        quotations = asset.quotations
+        weekdays = pd.DatetimeIndex(quotations.dates).dayofweek < 5
+        asset._quotations = Quotations(
+            quotations.dates[weekdays], quotations.closes[weekdays]
+        )
+        perfs = perf_matrix([asset], formatted=True)
+        for period in period_names():
+            with self.subTest(period=period):
+                daily = asset.quotations.daily(period)
+                self.assertEqual(
+                    perfs.loc["XS0", period],
+                    compute_perf(daily) if len(daily) else "nan%",
+                )
+
+    def test_numbers(self):
+        asset = synthetic_asset("XS0", np.linspace(100, 200, 800))
+        perfs = perf_matrix([asset], ["inception", "2000"])
+        self.assertAlmostEqual(perfs.loc["XS0", "inception"], 100.0)
+        self.assertTrue(np.isnan(perfs.loc["XS0", "2000"]))
+
+
+class TestPeriods(unittest.TestCase):
+    """Period bounds are computed at call time"""
+
+    def test_bounds(self):
+        as_of = date(2024, 2, 29)
+        self.assertEqual(period_names(as_of)[1], "2023")
+        self.assertEqual(period_bounds("inception", as_of), (None, None))
+        self.assertEqual(
+            period_bounds("2023", as_of), (date(2023, 1, 1), date(2023, 12, 31))
+        )
+        self.assertEqual(
+            period_bounds("ytd", as_of), (date(2024, 1, 1), date(2024, 12, 31))
+        )
+        self.assertEqual(period_bounds("1week", as_of), (date(2024, 2, 22), as_of))
+        self.assertEqual(period_bounds("1year", as_of), (date(2023, 2, 28), as_of))
+        self.assertEqual(
+            period_bounds("2021-03-01:2022-02-28", as_of),
+            (date(2021, 3, 1), date(2022, 2, 28)),
+        )
+        self.assertEqual(period_bounds(("2021-03-01", None)), (date(2021, 3, 1), None))
+        self.assertEqual(
+            period_filter("2023", as_of),
+            "where date >= '2023-01-01' and date < '2024-01-01'",
+        )
+        with self.assertRaises(ValueError):
+            period_bounds("forever")
+
+    def test_as_of_today(self):
+        with mock.patch("src.periods.date") as fake_date:
+            fake_date.today.return_value = date(2030, 6, 1)
+            fake_date.side_effect = date
+            self.assertEqual(period_names()[1], "2029")
+            self.assertEqual(period_bounds("1month")[1], date(2030, 6, 1))
+
+
+class TestValuation(unittest.TestCase):
+    """Prices and quantities of the assets as dates × isins matrices"""
+
+    def test_matrix(self):
+        quotations = Quotations(
+            np.array([10, 12, 13]) + (TODAY - EPOCH).days - 20,
+            np.array([1.0, 2.0, 3.0]),
+        )
+        operations = pd.DataFrame(
+            {
+                "isin": ["XS0", "XS0", "XS0"],
+                "date": [str(TODAY - timedelta(days=d)) for d in [9, 7, 7]],
+                "cumulative_quantity": [10.0, 15.0, 5.0],
+            }
+        )
+        matrix = valuation_matrix(
+            operations, {"XS0": quotations}, TODAY - timedelta(days=12)
+        )
+        self.assertEqual(len(matrix.days), 13)
+        # Close of the previous quotation on the days without quotation
+        np.testing.assert_array_equal(
+            matrix.prices[:5, 0], [np.nan, np.nan, 1.0, 1.0, 2.0]
+        )
+        # Quantity after the last operation of the day
+        np.testing.assert_array_equal(
+            matrix.quantities[2:7, 0], [np.nan, 10.0, 10.0, 5.0, 5.0]
+        )
+        nav = matrix.nav()
+        self.assertEqual(len(nav), 11)
+        self.assertTrue(np.isnan(nav["value"].iloc[0]))
+        self.assertEqual(nav["value"].iloc[-1], 15.0)
+
+    def test_long_format(self):
+        """The values of the assets add up to the net asset value"""
+        ptf = synthetic_portfolio()
+        asset_values = ptf.asset_values
+        self.assertEqual(list(asset_values.columns), ["date", "name", "value"])
+        self.assertFalse(asset_values.duplicated(["date", "name"]).any())
+        totals = asset_values.groupby("date")["value"].sum(min_count=1)
+        np.testing.assert_allclose(
+            ptf.nav["value"].to_numpy(), totals.to_numpy(), equal_nan=True
+        )
+
+
+class TestMultiPortfolio(unittest.TestCase):
+    """Portfolios sharing their assets, computed in a pool of processes"""
+
+    def setUp(self):
+        ptf = synthetic_portfolio()
+        self.assets = ptf.dict_of_assets
+        self.operations = {
+            "both": ptf.operations_df,
+            "xs1": ptf.operations_df.loc[ptf.operations_df["isin"] == "XS1"],
+        }
+
+    def test_assets_loaded_once(self):
+        with mock.patch(
+            "src.multi_portfolio.load_assets", return_value=(self.assets, {})
+        ) as loader:
+            multi = MultiPortfolio(operations=self.operations, metadata_cache=None)
+        loader.assert_called_once()
+        self.assertEqual(set(loader.call_args[0][0]), {"XS0", "XS1"})
+        self.assertIs(
+            multi.portfolios["both"].dict_of_assets,
+            multi.portfolios["xs1"].dict_of_assets,
+        )
+
+    def test_process_pool(self):
+        """Same summaries as the portfolios computed one by one"""
+        multi = MultiPortfolio(
+            dict_of_assets=self.assets, operations=self.operations, processes=2
+        )
+        summaries = multi.portfolio_summaries
+        for name, operations in self.operations.items():
+            ptf = Portfolio(name, dict_of_assets=self.assets, operations_df=operations)
+            pd.testing.assert_frame_equal(
+                summaries.loc[[name]].reset_index(drop=True), ptf.portfolio_summary
+            )
+        consolidated = multi.consolidated.set_index("isin")
+        self.assertEqual(consolidated.at["XS1", "quantity"], 80.0)
+        self.assertEqual(consolidated.at["XS1", "portfolios"], ["both", "xs1"])
+        self.assertEqual(
+            multi.nav["value"].iloc[-1], consolidated["valuation"].sum()
+        )
+
+
+class TestCache(unittest.TestCase):
+    """Cache backends of the cached functions"""
+
+    def setUp(self):
+        self.previous = get_cache_backend()
+        self.calls = []
+
+        @cached
+        def square(x):
+            self.calls.append(x)
+            return [x * x]
+
+        self.square = square
+
+    def tearDown(self):
+        set_cache_backend(self.previous)
+
+    def test_memory_cache(self):
+        set_cache_backend(MemoryCache())
+        self.assertEqual(self.square(3), [9])
+        # A copy of the cached result
+        self.square(3).append(0)
+        self.assertEqual(self.square(3), [9])
+        self.assertEqual(self.calls, [3])
+
+    def test_set_backend(self):
+        set_cache_backend(MemoryCache())
+        self.square(3)
+        set_cache_backend(NoCache())
+        self.square(3)
+        self.square(3)
+        self.assertEqual(self.calls, [3, 3, 3])
+
+    def lookup(self, cache: AssetCache):
+        """Fake scraper of the assets, wrapped by the cache"""
+        names = {"mc": "FR0000121014", "lvmh": "FR0000121014", "ai": "FR0000120073"}
+
+        def get_asset_data(query: str, parser: str = "lxml") -> dict:
+            self.calls.append(query)
+            isin = names.get(query.lower(), query.upper())
+            return {
+                "isin": isin,
+                "url": f"https://example.com/cours/{isin}/",
+                "parser": parser,
+            }
+
+        return cache.wrap(get_asset_data)
+
+    def test_asset_aliases(self):
+        cache = AssetCache()
+        lookup = self.lookup(cache)
+        queries = ["MC", "mc ", "lvmh", "fr0000121014"]
+        for query in [*queries, "https://example.com/cours/FR0000121014"]:
+            self.assertEqual(lookup(query)["isin"], "FR0000121014")
+        # The names are scraped to find their isin, then are aliases of it
+        self.assertEqual(self.calls, ["MC", "lvmh"])
+        self.assertEqual(
+            cache.stats,
+            {"entries": 1, "aliases": 3, "hits": 3, "misses": 2, "evictions": 0},
+        )
+
+    def test_asset_arguments(self):
+        """The lookups with other arguments are cached apart"""
+        cache = AssetCache()
+        lookup = self.lookup(cache)
+        self.assertEqual(lookup("MC")["parser"], "lxml")
+        self.assertEqual(lookup("MC", parser="bs4")["parser"], "bs4")
+        self.assertEqual(lookup("FR0000121014", parser="bs4")["parser"], "bs4")
+        self.assertEqual(lookup("mc")["parser"], "lxml")
+        self.assertEqual(self.calls, ["MC", "MC"])
+        bs4 = lookup_arguments((), {"parser": "bs4"})
+        self.assertEqual(cache.get("mc", arguments=bs4)["parser"], "bs4")
+
+    def test_asset_lru_and_ttl(self):
+        cache = AssetCache(max_entries=2, ttl=60)
+        lookup = self.lookup(cache)
+        lookup("MC")
+        lookup("AI")
+        lookup("MC")
+        lookup("XS0000000001")
+        # AI was the least recently used
+        self.assertIsNone(cache.get("ai"))
+        self.assertIsNotNone(cache.get("mc"))
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNone(cache.get("MC", now=time.time() + 61))
+
+    def test_concurrent_asset_lookups(self):
+        cache = AssetCache()
+        started = threading.Event()
+
+        def slow_lookup(query: str) -> dict:
+            started.set()
+            time.sleep(0.1)
+            self.calls.append(query)
+            return {"isin": "FR0000121014", "url": None}
+
+        lookup = cache.wrap(slow_lookup)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            first = pool.submit(lookup, "MC")
+            started.wait()
+            results = list(pool.map(lookup, ["mc", "MC", "Mc"]))
+        self.assertEqual(first.result(), results[0])
+        self.assertEqual(self.calls, ["MC"])
+
+
+class TestReport(unittest.TestCase):
+    """Reports of the portfolios written without the streamlit app"""
+
+    def test_write_reports(self):
+        ptf = synthetic_portfolio()
+        multi = MultiPortfolio(
+            dict_of_assets=ptf.dict_of_assets,
+            operations={"ptf": ptf.operations_df},
+            processes=1,
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = write_reports(multi, tmpdir)
+            self.assertEqual(
+                sorted(str(path.relative_to(tmpdir)) for path in paths),
+                [
+                    "consolidated.csv",
+                    "nav.csv",
+                    "portfolio_summaries.csv",
+                    "ptf/assets_summary.csv",
+                    "ptf/irr_failures.csv",
+                    "ptf/nav.csv",
+                    "ptf/portfolio_summary.csv",
+                ],
+            )
+            summary = pd.read_csv(os.path.join(tmpdir, "ptf", "portfolio_summary.csv"))
+            self.assertAlmostEqual(
+                summary.at[0, "valuation"], ptf.portfolio_summary.at[0, "valuation"]
+            )
+            consolidated = pd.read_csv(os.path.join(tmpdir, "consolidated.csv"))
+            self.assertEqual(set(consolidated["portfolios"]), {"ptf"})
+
+    def test_locked_files(self):
+        """A report waiting too long for the app prints why it stopped"""
+        locked = duckdb.IOException('IO Error: Could not set lock on file "quotes"')
+        with mock.patch("src.report.MultiPortfolio", side_effect=locked), mock.patch(
+            "builtins.print"
+        ) as printed:
+            self.assertEqual(report_main(["--portfolios", "ptf"]), 1)
+        self.assertIn("used by another process", printed.call_args.args[0])
+
+
+class TestStartup(unittest.TestCase):
+    def test_lazy_imports(self):
+        """The parsing, http and app libraries are not imported with the portfolio"""
+        heavy = ["streamlit", "requests", "bs4", "lxml", "icecream"]
+        loaded = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                f"import sys, src.portfolio; print([m for m in {heavy} if m in sys.modules])",
+            ],
+            cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        self.assertEqual(loaded.strip(), "[]")
+
+
+class TestRefresher(unittest.TestCase):
+    """Quotes refreshed in the background into the local caches"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = MetadataCache(os.path.join(self.tmp.name, "metadata.duckdb"))
+        self.refresher = QuoteRefresher(
+            {"ISIN0": "ISIN0", "ISIN1": "ISIN1"},
+            interval=600,
+            hot_interval=60,
+            history_interval=3600,
+            metadata_cache=self.cache,
+            quote_store=QuoteStore(os.path.join(self.tmp.name, "quotes.duckdb")),
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def refresh(self, now: float) -> tuple:
+        with mock.patch(
+            "src.data_extraction.get_current_asset_data.__wrapped__",
+            side_effect=TestLoadAssets.fake_asset_data,
+        ), mock.patch("src.refresher.get_historical_data") as history:
+            refreshed = self.refresher.refresh_due(now)
+        self.histories = [call.args[0] for call in history.call_args_list]
+        return refreshed
+
+    def test_schedule(self):
+        self.refresher.mark_hot(["ISIN0"], now=0)
+        self.assertEqual(self.refresh(0), (["ISIN0", "ISIN1"], ["ISIN0", "ISIN1"]))
+        # Histories are requested with the symbols of the refreshed quotes
+        self.assertEqual(sorted(self.histories), ["ISIN0", "ISIN1"])
+        self.assertEqual(self.cache.get("ISIN1", now=0)[1], set())
+        # The hot asset is refreshed more often
+        self.assertEqual(self.refresh(60), (["ISIN0"], []))
+        self.assertEqual(self.refresh(600), (["ISIN0", "ISIN1"], []))
+        self.assertEqual(self.refresher.counts, {"quotes": 5, "histories": 2, "errors": 0})
+
+    def test_asset_cache_updated(self):
+        """The refreshed quotes are read by the lookups of the process"""
+        previous = get_cache_backend()
+        set_cache_backend(AssetCache())
+        try:
+            self.refresh(0)
+            self.assertEqual(get_cache_backend().stats["entries"], 2)
+        finally:
+            set_cache_backend(previous)
+
+    def test_failures_retried(self):
+        with mock.patch(
+            "src.data_extraction.get_current_asset_data.__wrapped__",
+            side_effect=ValueError("unreachable"),
+        ), mock.patch("sys.stdout"):
+            self.assertEqual(self.refresher.refresh_due(0), ([], []))
+        # The histories have no cached symbol yet
+        self.assertEqual(self.refresher.counts["errors"], 4)
+        self.assertEqual(self.refresh(600), (["ISIN0", "ISIN1"], []))
+        self.assertEqual(self.refresh(3600), (["ISIN0", "ISIN1"], ["ISIN0", "ISIN1"]))
+
+
+class TestPositions(unittest.TestCase):
+    """Quantities and dividends of all the assets at once"""
+
+    def test_positions(self):
+        operations = pd.DataFrame(
+            [
+                ("XS0", "2020-01-01", "Buy", 10.0, 100.0),
+                ("XS1", "2020-01-02", "Buy", 7.0, 10.0),
+                ("XS0", "2020-02-01", "Dividend", None, 2.0),
+                ("XS0", "2020-03-01", "Split", None, 1.5),
+                ("XS1", "2020-03-02", "Split", None, 1.1),
+                ("XS0", "2020-04-01", "Sell", 4.0, 80.0),
+                ("XS1", "2020-04-02", "Split", None, 3.0),
+                ("XS1", "2020-05-02", "Dividend", None, 1.0),
+                ("XS0", str(TODAY + timedelta(days=1)), "Buy", 1.0, 80.0),
+            ],
+            columns=["isin", "date", "operation", "quantity", "value"],
+        )
+        positions = compute_positions(operations)
+        self.assertEqual(positions.index.tolist(), [0, 2, 3, 5, 1, 4, 6, 7])
+        self.assertEqual(
+            positions["cumulative_quantity"].tolist(), [10, 10, 15, 11, 7, 7, 21, 21]
+        )
+        totals = position_totals(positions)
+        self.assertEqual(totals["quantity"].tolist(), [11, 21])
+        self.assertEqual(totals["total dividends"].tolist(), [20, 21])
+
+        ptf = synthetic_portfolio()
+        self.assertEqual(
+            ptf.get_asset_quantity(operations[operations["isin"] == "XS0"]),
+            (11, 20, [10, 10, 15, 11]),
+        )
+
+
+class TestXirr(unittest.TestCase):
+    """IRR of many cashflow series at once"""
+
+    def test_batch(self):
+        rng = np.random.default_rng(0)
+        series = []
+        for n in rng.integers(2, 40, 50):
+            days = np.sort(rng.choice(3000, n, replace=False))
+            cashflows = -rng.uniform(10, 1000, n)
+            cashflows[-1] = rng.uniform(0.5, 2) * -cashflows[:-1].sum()
+            series.append(([date(2015, 1, 1) + timedelta(int(d)) for d in days], cashflows))
+        series.append(([date(2020, 1, 1), date(2021, 1, 1)], [-100, -110]))
+        result = batch_xirr(series)
+        for (dates, cashflows), rate in zip(series[:-1], result.rate):
+            self.assertAlmostEqual(rate, pyxirr.xirr(dates, cashflows), places=8)
+        self.assertTrue(result.converged[:-1].all())
+        self.assertTrue(np.isnan(result.rate[-1]))
+        self.assertEqual(result.reason[-1], "no sign change")
+        # Warm start from the solutions
+        warm = batch_xirr(series, guess=result.rate)
+        self.assertTrue((warm.iterations[:-1] <= 2).all())
+        np.testing.assert_allclose(warm.rate, result.rate)
+
+    def test_several_roots(self):
+        """The bisection fallback keeps the root closest to the guess"""
+        # Roots -50% and 20%
+        dates = [date(2020, 1, 1) + timedelta(days) for days in (0, 365, 730)]
+        series = [(dates, [-100, 170, -60])] * 2
+        # No Newton iteration: every series is solved by the fallback
+        result = batch_xirr(series, guess=np.array([0.15, -0.4]), max_iterations=0)
+        np.testing.assert_allclose(result.rate, [0.2, -0.5])
 
 
 class TestPortfolio(unittest.TestCase):
@@ -115,6 +1305,189 @@ class TestPortfolio(unittest.TestCase):
             True,
         )
 
+    def test_given_assets_and_operations(self):
+        """Portfolio built from given assets and operations, without network"""
+        ptf = synthetic_portfolio()
+        self.assertEqual(ptf.assets_summary["isin"].tolist(), ["XS0", "XS1"])
+        self.assertEqual(ptf.assets_summary["quantity"].tolist(), [15.0, 40.0])
+        self.assertEqual(ptf.assets_summary["total dividends"].tolist(), [20.0, 0.0])
+        self.assertAlmostEqual(
+            ptf.assets_summary["Total invested amount"].iloc[0], 1000 + 1300 - 5 * 120 - 20
+        )
+        self.assertEqual(ptf.portfolio_summary.at[0, "Lines number"], 2)
+        self.assertEqual(set(ptf.asset_values["name"]), {"Asset XS0", "Asset XS1"})
+
+    def test_refresh_quotes(self):
+        """The valuations follow the quotes refreshed in the metadata cache"""
+        ptf = synthetic_portfolio()
+        with tempfile.TemporaryDirectory() as tmp:
+            ptf.metadata_cache = MetadataCache(os.path.join(tmp, "metadata.duckdb"))
+            summary = ptf.assets_summary.set_index("isin")
+            portfolio_summary = ptf.portfolio_summary
+            valuation = portfolio_summary.at[0, "valuation"]
+            ptf.asset_values
+            latest = ptf.dict_of_assets["XS0"].latest
+            ptf.metadata_cache.put(
+                "XS0",
+                {"latest": 2 * latest, "variation": 1.5, "tradeDate": datetime(2024, 5, 2)},
+            )
+            self.assertEqual(ptf.refresh_quotes(), ["XS0"])
+            self.assertEqual(ptf.refresh_quotes(), [])
+        self.assertEqual(ptf.dict_of_assets["XS0"].variation, 1.5)
+        refreshed = ptf.assets_summary.set_index("isin")
+        self.assertAlmostEqual(
+            refreshed.at["XS0", "valuation"], 2 * summary.at["XS0", "valuation"]
+        )
+        self.assertEqual(refreshed.at["XS1", "valuation"], summary.at["XS1", "valuation"])
+        self.assertAlmostEqual(
+            ptf.portfolio_summary.at[0, "valuation"],
+            valuation + summary.at["XS0", "valuation"],
+        )
+        self.assertAlmostEqual(
+            ptf.portfolio_summary.at[0, "Capital gain"],
+            refreshed["Capital gain"].sum(),
+        )
+        # The frames returned before are kept
+        self.assertEqual(portfolio_summary.at[0, "valuation"], valuation)
+        # Today is valued at the latest prices in the charts too
+        self.assertAlmostEqual(
+            ptf.nav["value"].iloc[-1], ptf.portfolio_summary.at[0, "valuation"]
+        )
+        values = ptf.asset_values
+        self.assertAlmostEqual(
+            values.loc[values["name"] == "Asset XS0", "value"].iloc[-1],
+            refreshed.at["XS0", "valuation"],
+        )
+
+    def test_asset_without_quotations(self):
+        """The invested amount of an asset without quotations, hence without
+        valuation row, is the sum of its cashflows"""
+        ptf = synthetic_portfolio()
+        assets = {
+            **ptf.dict_of_assets,
+            "XS2": evolve(
+                ptf.dict_of_assets["XS1"],
+                isin="XS2",
+                quotations=quotations_by_period(
+                    pd.DataFrame({"date": pd.to_datetime([]), "c": []})
+                ),
+            ),
+        }
+        day = lambda n: str(TODAY - timedelta(days=n))
+        operations = pd.concat(
+            [
+                ptf.operations_df,
+                pd.DataFrame(
+                    [
+                        (7, "Asset XS2", "XS2", day(50), "Buy", 4.0, 10.0, 0.0),
+                        (8, "Asset XS2", "XS2", day(40), "Sell", 1.0, 12.0, 0.0),
+                    ],
+                    columns=ptf.operations_df.columns,
+                ),
+            ],
+            ignore_index=True,
+        )
+        lines = Portfolio(
+            "synthetic", dict_of_assets=assets, operations_df=operations
+        ).summarize_assets(operations)
+        invested = lines.set_index("isin")["Total invested amount"]
+        self.assertEqual(invested["XS2"], 4 * 10 - 12)
+        self.assertEqual(invested["XS0"], 1000 + 1300 - 5 * 120 - 20)
+
+    def test_cashflows(self):
+        """Cashflows of all the assets and periods in one query"""
+        ptf = synthetic_portfolio()
+        operations = ptf.assets_summary.set_index("isin").at["XS0", "operations"]
+        cashflows = ptf.compute_cashflows(
+            operations,
+            {"XS0": ptf.dict_of_assets["XS0"].quotations["inception"]},
+            ["inception", "1year"],
+        )
+        inception = cashflows.loc[cashflows["period"] == "inception"]
+        self.assertEqual(
+            inception["cashflow"].round(2).tolist(),
+            [0, -1000, 20, 600, -1300, 15 * 150],
+        )
+        # The ops of the period are a slice of inception, between the position
+        # bought at the start of the period and sold at its end
+        one_year = cashflows.loc[cashflows["period"] == "1year"]
+        self.assertEqual(one_year["operation"].tolist(), [None, "Buy", None])
+        self.assertEqual(one_year["quantity"].tolist(), [5, 10, 15])
+        self.assertAlmostEqual(one_year["cashflow"].iloc[-1], 15 * 150)
+        # Same cashflows from the trading days only as from every calendar day
+        quotations = ptf.dict_of_assets["XS0"].quotations
+        weekdays = pd.DatetimeIndex(quotations.dates).dayofweek < 5
+        trading_days = Quotations(quotations.dates[weekdays], quotations.closes[weekdays])
+        pd.testing.assert_frame_equal(
+            ptf.compute_cashflows(
+                operations, {"XS0": trading_days["inception"]}, ["inception", "1year"]
+            ),
+            ptf.compute_cashflows(
+                operations, {"XS0": trading_days.daily()}, ["inception", "1year"]
+            ),
+        )
+
+    def test_add_remove_operation(self):
+        """Only the asset of the operation is recomputed, with the same results
+        as a full computation"""
+        ptf = synthetic_portfolio()
+        ptf.portfolio_summary
+        xs1_line = ptf._asset_lines.loc[ptf._asset_lines["isin"] == "XS1"]
+        operation_id = ptf.add_operation(
+            {
+                "name": "Asset XS0",
+                "isin": "XS0",
+                "date": str(TODAY - timedelta(days=100)),
+                "operation": "Sell",
+                "quantity": 15.0,
+                "value": 140.0,
+                "fees": 1.0,
+            }
+        )
+        self.assertEqual(operation_id, 7)
+        # XS1 is not recomputed, XS0 is sold
+        self.assertIs(
+            ptf._asset_lines.loc[ptf._asset_lines["isin"] == "XS1", "operations"].iloc[0],
+            xs1_line["operations"].iloc[0],
+        )
+        self.assertEqual(ptf.assets_summary["isin"].tolist(), ["XS1"])
+        full = Portfolio(
+            "synthetic",
+            dict_of_assets=ptf.dict_of_assets,
+            operations_df=ptf.operations_df,
+        )
+        columns = [c for c in full.assets_summary.columns if c != "operations"]
+        pd.testing.assert_frame_equal(
+            ptf.assets_summary[columns], full.assets_summary[columns]
+        )
+        pd.testing.assert_frame_equal(ptf.portfolio_summary, full.portfolio_summary)
+        self.assertEqual(set(ptf.asset_values["name"]), {"Asset XS1"})
+
+        ptf.remove_operation(operation_id)
+        self.assertEqual(ptf.assets_summary["isin"].tolist(), ["XS0", "XS1"])
+        self.assertEqual(ptf.assets_summary["quantity"].tolist(), [15.0, 40.0])
+        self.assertEqual(set(ptf.asset_values["name"]), {"Asset XS0", "Asset XS1"})
+
+    def test_irr_failures_updated(self):
+        """The IRR failures of an asset are those of its current operations"""
+        ptf = synthetic_portfolio()
+        ptf.portfolio_summary
+        # Sold for nothing: no positive cashflow
+        operation_id = ptf.add_operation(
+            {
+                "name": "Asset XS1",
+                "isin": "XS1",
+                "date": str(TODAY - timedelta(days=10)),
+                "operation": "Sell",
+                "quantity": 40.0,
+                "value": 0.0,
+                "fees": 0.0,
+            }
+        )
+        self.assertEqual(ptf.irr_failures[("XS1", "inception")], "no sign change")
+        ptf.remove_operation(operation_id)
+        self.assertEqual([key for key in ptf.irr_failures if key[0] == "XS1"], [])
+
     def test_empty_ptf(self):
         """Test code with empty, non-existant portfolio"""
         empty_ptf = Portfolio("empty_unit_tests_ptf")